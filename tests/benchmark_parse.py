@@ -0,0 +1,57 @@
+"""微博列表页解析的基准测试
+
+用tests/testdata中的微博列表页测量构建selector和提取微博各自的耗时，
+不发出网络请求。运行: python -m tests.benchmark_parse [重复次数]
+"""
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+
+from lxml import etree
+
+from weibo_spider.page_archive import profile_page
+from weibo_spider.parser.page_parser import PageParser, WORKER_USER_CONFIG
+
+TESTDATA = Path(__file__).parent / 'testdata'
+
+
+def load_pages():
+    with open(TESTDATA / 'url_map.json') as f:
+        url_map = json.load(f)
+    pages = []
+    for url, path in url_map.items():
+        if profile_page(url) is not None:
+            with open(Path(__file__).parent.parent / path, 'rb') as f:
+                pages.append(f.read())
+    return pages
+
+
+def run(repeat):
+    # 页面中不是微博的div会记录异常日志，基准测试中不输出
+    logging.disable(logging.CRITICAL)
+    pages = load_pages()
+    html_time = extract_time = 0
+    weibo_count = 0
+    for _ in range(repeat):
+        for content in pages:
+            start = time.perf_counter()
+            selector = etree.HTML(content)
+            middle = time.perf_counter()
+            drafts = PageParser('', WORKER_USER_CONFIG, 0, 0,
+                                selector=selector,
+                                defer_fetch=True).extract_drafts()
+            end = time.perf_counter()
+            html_time += middle - start
+            extract_time += end - middle
+            weibo_count += len(drafts)
+    page_count = len(pages) * repeat
+    print(f'{len(pages)}个页面，重复{repeat}次，共{weibo_count}条微博')
+    print(f'构建selector: 每页{html_time / page_count * 1000:.3f}ms')
+    print(f'提取微博: 每页{extract_time / page_count * 1000:.3f}ms，'
+          f'每条{extract_time / max(weibo_count, 1) * 1000:.3f}ms')
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
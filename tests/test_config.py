@@ -1,6 +1,9 @@
+import asyncio
 import unittest
+from unittest.mock import AsyncMock, MagicMock
 from pydantic import ValidationError
 from weibo_spider.config import SpiderConfig
+from weibo_spider.http_client import HttpClient
 
 class TestSpiderConfig(unittest.TestCase):
     def setUp(self):
@@ -49,5 +52,92 @@ class TestSpiderConfig(unittest.TestCase):
         with self.assertRaises(ValidationError):
             SpiderConfig(**config)
 
+    def test_detail_concurrency(self):
+        config = self.base_config.copy()
+        self.assertEqual(SpiderConfig(**config).detail_concurrency, 5)
+        config['detail_concurrency'] = 0
+        with self.assertRaises(ValidationError):
+            SpiderConfig(**config)
+
+    def test_parse_workers(self):
+        config = self.base_config.copy()
+        self.assertEqual(SpiderConfig(**config).parse_workers, 0)
+        config['parse_workers'] = -1
+        with self.assertRaises(ValidationError):
+            SpiderConfig(**config)
+
+    def test_rate_limit(self):
+        config = self.base_config.copy()
+        config['rate_limit'] = {'weibo.cn': {'rate': 0.5, 'burst': 3}}
+        self.assertEqual(SpiderConfig(**config).rate_limit['weibo.cn']['burst'], 3)
+        config['rate_limit'] = {'weibo.cn': {'rate': 0}}
+        with self.assertRaises(ValidationError):
+            SpiderConfig(**config)
+
+    def test_http_config(self):
+        config = self.base_config.copy()
+        config['http_config'] = {'retries': 0, 'total_timeout': 30}
+        self.assertEqual(SpiderConfig(**config).http_config['retries'], 0)
+        config['http_config'] = {'timeout': 30}
+        with self.assertRaises(ValidationError):
+            SpiderConfig(**config)
+        config['http_config'] = {'connect_timeout': 0}
+        with self.assertRaises(ValidationError):
+            SpiderConfig(**config)
+        config['http_config'] = {'retries': 1.5}
+        with self.assertRaises(ValidationError):
+            SpiderConfig(**config)
+
+    def test_http_config_builds_client(self):
+        config = self.base_config.copy()
+        config['http_config'] = {'retries': 2, 'limit': 50,
+                                 'backoff_base': 0.5}
+        http_config = SpiderConfig(**config).http_config
+        self.assertIsInstance(http_config['retries'], int)
+
+        async def run():
+            async with HttpClient(http_config) as client:
+                response = MagicMock(status=200)
+                client.session.request = AsyncMock(return_value=response)
+                async with client.get('https://weibo.cn/') as resp:
+                    self.assertEqual(resp.status, 200)
+            return client
+
+        client = asyncio.run(run())
+        self.assertEqual(client.config['retries'], 2)
+        self.assertEqual(client.config['backoff_base'], 0.5)
+
+    def test_cache_config(self):
+        config = self.base_config.copy()
+        config['cache_config'] = {'mode': 'replay', 'ttl': {'profile': 60}}
+        self.assertEqual(SpiderConfig(**config).cache_config['mode'], 'replay')
+        config['cache_config'] = {'mode': 'always'}
+        with self.assertRaises(ValidationError):
+            SpiderConfig(**config)
+        config['cache_config'] = {'mode': 'record', 'ttl': {'home': 60}}
+        with self.assertRaises(ValidationError):
+            SpiderConfig(**config)
+
+    def test_archive_config(self):
+        config = self.base_config.copy()
+        config['archive_config'] = {'codec': 'lzma'}
+        self.assertEqual(SpiderConfig(**config).archive_config['codec'], 'lzma')
+        config['archive_config'] = {'codec': 'gzip'}
+        with self.assertRaises(ValidationError):
+            SpiderConfig(**config)
+
+    def test_proxy_config(self):
+        config = self.base_config.copy()
+        config['proxy_config'] = {'proxies': ['http://127.0.0.1:8080']}
+        self.assertEqual(SpiderConfig(**config).proxy_config['proxies'],
+                         ['http://127.0.0.1:8080'])
+        config['proxy_config'] = {'proxies': []}
+        with self.assertRaises(ValidationError):
+            SpiderConfig(**config)
+        config['proxy_config'] = {'proxies': ['http://127.0.0.1:8080'],
+                                  'max_concurrency': 0}
+        with self.assertRaises(ValidationError):
+            SpiderConfig(**config)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,79 @@
+import asyncio
+import unittest
+
+from weibo_spider.cookie_pool import CookiePool
+from weibo_spider.parser.util import fetch_page_async, handle_html_async
+from weibo_spider.rate_limiter import EMPTY, LOGIN, OK
+
+from .test_parser.util import MockSession
+
+
+class TestCookiePool(unittest.TestCase):
+    def test_spread_requests(self):
+        async def run():
+            pool = CookiePool(['a=1', 'b=2', 'c=3'])
+            accounts = [await pool.acquire() for _ in range(3)]
+            return {a.cookie for a in accounts}
+
+        self.assertEqual(asyncio.run(run()), {'a=1', 'b=2', 'c=3'})
+
+    def test_login_quarantine(self):
+        async def run():
+            pool = CookiePool(['a=1', 'b=2'])
+            account = await pool.acquire()
+            pool.record(account, LOGIN)
+            others = [await pool.acquire() for _ in range(3)]
+            for other in others:
+                pool.record(other, OK)
+            return account, others
+
+        account, others = asyncio.run(run())
+        self.assertEqual(account.health, 0)
+        self.assertTrue(all(o is not account for o in others))
+
+    def test_health_score(self):
+        async def run():
+            pool = CookiePool(['a=1'])
+            account = await pool.acquire()
+            for _ in range(8):
+                pool.record(account, EMPTY)
+            return account
+
+        account = asyncio.run(run())
+        self.assertLess(account.health, 0.3)
+        self.assertGreater(account.quarantined_until, 0)
+
+    def test_handle_html_with_pool(self):
+        async def run():
+            pool = CookiePool(['a=1', 'b=2'])
+            session = MockSession()
+            for _ in range(2):
+                await handle_html_async(
+                    pool, 'https://weibo.cn/1669879400/profile?page=1',
+                    session)
+            return pool, session
+
+        pool, session = asyncio.run(run())
+        self.assertEqual(
+            sorted(h['Cookie'] for h in session.requested_headers),
+            ['a=1', 'b=2'])
+        self.assertTrue(all(a.pending == 0 for a in pool.accounts))
+
+    def test_cancelled_fetch_releases_account(self):
+        async def run():
+            pool = CookiePool(['a=1', 'b=2'])
+            task = asyncio.ensure_future(fetch_page_async(
+                pool, 'https://weibo.cn/1669879400/profile?page=1',
+                MockSession(delay=1)))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            return pool
+
+        pool = asyncio.run(run())
+        self.assertEqual([a.pending for a in pool.accounts], [0, 0])
+        self.assertEqual([a.health for a in pool.accounts], [1.0, 1.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 import unittest
 from datetime import datetime
-from weibo_spider.datetime_util import str_to_time, is_valid_date
+from weibo_spider.datetime_util import (str_to_time, is_valid_date, split_date_range,
+                                        format_time, parse_publish_time)
 
 class TestDatetimeUtil(unittest.TestCase):
     def test_str_to_time(self):
@@ -21,3 +22,38 @@ class TestDatetimeUtil(unittest.TestCase):
         self.assertTrue(is_valid_date('2023-01-01 12:30'))
         self.assertFalse(is_valid_date('invalid-date'))
         self.assertFalse(is_valid_date('2023/01/01'))  # Wrong separator
+
+    def test_split_date_range(self):
+        self.assertEqual(
+            split_date_range('2023-01-01 08:00', '2023-01-10', 3),
+            [('2023-01-01 08:00', '2023-01-03'), ('2023-01-04', '2023-01-06'),
+             ('2023-01-07', '2023-01-10')])
+        # 窗口数不超过天数
+        self.assertEqual(split_date_range('2023-01-01', '2023-01-02', 5),
+                         [('2023-01-01', '2023-01-01'),
+                          ('2023-01-02', '2023-01-02')])
+        # since_date晚于end_date时没有时间窗口
+        self.assertEqual(split_date_range('2023-01-10', '2023-01-01', 3), [])
+
+    def test_str_to_time_non_padded(self):
+        self.assertEqual(str_to_time('2023-1-5'), datetime(2023, 1, 5))
+        with self.assertRaises(ValueError):
+            str_to_time('2023-13-01')
+
+    def test_parse_publish_time(self):
+        now = datetime(2024, 3, 15, 10, 20, 45)
+        self.assertEqual(parse_publish_time('刚刚 ', now),
+                         datetime(2024, 3, 15, 10, 20))
+        self.assertEqual(parse_publish_time('5分钟前 ', now),
+                         datetime(2024, 3, 15, 10, 15))
+        self.assertEqual(parse_publish_time('今天 08:05 ', now),
+                         datetime(2024, 3, 15, 8, 5))
+        self.assertEqual(parse_publish_time('02月28日 23:59 ', now),
+                         datetime(2024, 2, 28, 23, 59))
+        self.assertEqual(parse_publish_time('2021-07-01 12:30:10 ', now),
+                         datetime(2021, 7, 1, 12, 30))
+        self.assertIsNone(parse_publish_time('未知', now))
+
+    def test_format_time(self):
+        self.assertEqual(format_time(datetime(2024, 3, 5, 8, 7)),
+                         '2024-03-05 08:07')
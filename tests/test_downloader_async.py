@@ -4,8 +4,12 @@ from unittest.mock import MagicMock, AsyncMock, patch
 import os
 import shutil
 
+import aiohttp
+
+from weibo_spider.downloader.download_engine import DownloadEngine, DownloadJob
 from weibo_spider.downloader.downloader import Downloader
 from weibo_spider.downloader.img_downloader import ImgDownloader
+from weibo_spider.downloader.video_downloader import VideoDownloader
 
 class MockWeibo:
     def __init__(self):
@@ -14,6 +18,62 @@ class MockWeibo:
         self.media = {}
         self.original_pictures = 'http://example.com/pic.jpg'
 
+class MockContent:
+    """模拟aiohttp响应的content流，fail_at不为None时传输到该位置后断开"""
+    def __init__(self, data, fail_at=None):
+        self.data = data
+        self.fail_at = fail_at
+
+    async def iter_chunked(self, n):
+        end = len(self.data) if self.fail_at is None else self.fail_at
+        for i in range(0, end, n):
+            yield self.data[i:min(i + n, end)]
+        if self.fail_at is not None:
+            raise aiohttp.ClientPayloadError('连接断开')
+
+
+class RangeResponse:
+    def __init__(self, status, data, headers, fail_at=None):
+        self.status = status
+        self.headers = headers
+        self.content_length = len(data)
+        self.content = MockContent(data, fail_at)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return None
+
+
+class RangeSession:
+    """按Range返回body的session，support_range为False时忽略Range
+
+    fail_at不为None时，第一个长于fail_at的响应传输到该位置后断开。
+    """
+    def __init__(self, body, support_range=True, fail_at=None):
+        self.body = body
+        self.support_range = support_range
+        self.fail_at = fail_at
+        self.ranges = []
+
+    def get(self, url, headers=None, **kwargs):
+        range_header = (headers or {}).get('Range')
+        self.ranges.append(range_header)
+        status, data, response_headers = 200, self.body, {}
+        if range_header and self.support_range:
+            start, _, end = range_header[len('bytes='):].partition('-')
+            start = int(start)
+            end = int(end) if end else len(self.body) - 1
+            status, data = 206, self.body[start:end + 1]
+            response_headers = {
+                'Content-Range': f'bytes {start}-{end}/{len(self.body)}'}
+        fail_at = None
+        if self.fail_at is not None and len(data) > self.fail_at:
+            fail_at, self.fail_at = self.fail_at, None
+        return RangeResponse(status, data, response_headers, fail_at)
+
+
 class TestDownloaderAsync(unittest.TestCase):
     def setUp(self):
         self.test_dir = 'tests/tmp_downloader'
@@ -33,7 +93,9 @@ class TestDownloaderAsync(unittest.TestCase):
             mock_session = MagicMock()
             mock_response = AsyncMock()
             mock_response.status = 200
-            mock_response.read.return_value = b'fake_image_content'
+            mock_response.headers = {}
+            mock_response.content_length = None
+            mock_response.content = MockContent(b'fake_image_content')
             
             # Mock session.get to return an async context manager
             mock_context = AsyncMock()
@@ -57,5 +119,230 @@ class TestDownloaderAsync(unittest.TestCase):
 
         asyncio.run(run_test())
 
+    def test_engine_limits_and_media_order(self):
+        class SlowResponse:
+            def __init__(self, session, url):
+                self.session = session
+                self.url = url
+                self.status = 200
+                self.headers = {}
+                self.content_length = None
+
+            async def __aenter__(self):
+                host = self.url.split('/')[2]
+                self.session.in_flight[host] = self.session.in_flight.get(host, 0) + 1
+                self.session.max_total = max(self.session.max_total,
+                                             sum(self.session.in_flight.values()))
+                self.session.max_per_host = max(self.session.max_per_host,
+                                                self.session.in_flight[host])
+                # 前面的文件下载得更慢，完成顺序与任务顺序相反
+                await asyncio.sleep(0.05 if self.url.endswith('1.jpg') else 0.01)
+                self.session.in_flight[host] -= 1
+                return self
+
+            async def __aexit__(self, *args):
+                return None
+
+            @property
+            def content(self):
+                return MockContent(self.url.encode())
+
+        class SlowSession:
+            def __init__(self):
+                self.in_flight = {}
+                self.max_total = 0
+                self.max_per_host = 0
+
+            def get(self, url, **kwargs):
+                return SlowResponse(self, url)
+
+        async def run_test():
+            downloader = ImgDownloader(self.test_dir, [1, 1, 1])
+            downloader.key = 'original_pictures'
+            downloader.random_wait = False
+            downloader.engine = DownloadEngine(concurrency=4, limit_per_host=2)
+            weibos = []
+            for n in range(3):
+                weibo = MockWeibo()
+                weibo.id = f'1000{n}'
+                weibo.original_pictures = ','.join(
+                    f'http://wx{i % 3}.example.com/{n}_{i}.jpg' for i in range(1, 10))
+                weibos.append(weibo)
+            session = SlowSession()
+            await downloader.download_files(weibos, session)
+            self.assertEqual(session.max_total, 4)
+            self.assertLessEqual(session.max_per_host, 2)
+            for weibo in weibos:
+                urls = [m['url'] for m in weibo.media['original_pictures']]
+                self.assertEqual(urls, weibo.original_pictures.split(','))
+
+        asyncio.run(run_test())
+
+    def test_engine_limit_shared_by_runs(self):
+        async def run_test():
+            engine = DownloadEngine(concurrency=2, limit_per_host=10)
+            state = {'in_flight': 0, 'max': 0}
+
+            async def download(job):
+                state['in_flight'] += 1
+                state['max'] = max(state['max'], state['in_flight'])
+                await asyncio.sleep(0.01)
+                state['in_flight'] -= 1
+                return True
+
+            # 多个用户同时下载时，并发上限对所有run共同生效
+            runs = [engine.run([DownloadJob(f'http://example.com/{n}_{i}.jpg',
+                                            f'{n}_{i}.jpg')
+                                for i in range(4)], download)
+                    for n in range(4)]
+            results = await asyncio.gather(*runs)
+            self.assertEqual(state['max'], 2)
+            self.assertTrue(all(all(r) for r in results))
+
+        asyncio.run(run_test())
+
+    def test_resume_interrupted_download(self):
+        body = bytes(range(256)) * 1000
+        file_path = os.path.join(self.test_dir, 'video.mp4')
+        downloader = ImgDownloader(self.test_dir, [2, 1, 1])
+        downloader.random_wait = False
+        session = RangeSession(body, fail_at=100000)
+        self.assertTrue(asyncio.run(
+            downloader.download_one_file('http://example.com/v.mp4', file_path,
+                                         '1', session)))
+        # 断开后用Range从已下载的位置继续
+        self.assertEqual(session.ranges, [None, 'bytes=100000-'])
+        with open(file_path, 'rb') as f:
+            self.assertEqual(f.read(), body)
+        self.assertFalse(os.path.exists(file_path + '.part'))
+
+    def test_restart_when_range_unsupported(self):
+        body = b'0123456789' * 100
+        file_path = os.path.join(self.test_dir, 'pic.jpg')
+        with open(file_path + '.part', 'wb') as f:
+            f.write(b'stale')
+        downloader = ImgDownloader(self.test_dir, [1, 1, 1])
+        downloader.random_wait = False
+        session = RangeSession(body, support_range=False)
+        self.assertTrue(asyncio.run(
+            downloader.download_one_file('http://example.com/p.jpg', file_path,
+                                         '1', session)))
+        self.assertEqual(session.ranges, ['bytes=5-'])
+        with open(file_path, 'rb') as f:
+            self.assertEqual(f.read(), body)
+    def test_restart_when_content_range_mismatch(self):
+        body = b'0123456789' * 100
+
+        class ShiftedRangeSession(RangeSession):
+            """续传时返回的起始位置与请求的不一致"""
+            def get(self, url, headers=None, **kwargs):
+                if headers and headers.get('Range'):
+                    self.ranges.append(headers['Range'])
+                    return RangeResponse(
+                        206, self.body[10:],
+                        {'Content-Range': f'bytes 10-{len(self.body) - 1}/{len(self.body)}'})
+                return super().get(url, headers, **kwargs)
+
+        file_path = os.path.join(self.test_dir, 'pic.jpg')
+        with open(file_path + '.part', 'wb') as f:
+            f.write(b'01234')
+        downloader = ImgDownloader(self.test_dir, [1, 1, 1])
+        downloader.random_wait = False
+        session = ShiftedRangeSession(body)
+        self.assertTrue(asyncio.run(
+            downloader.download_one_file('http://example.com/p.jpg', file_path,
+                                         '1', session)))
+        self.assertEqual(session.ranges, ['bytes=5-', None])
+        with open(file_path, 'rb') as f:
+            self.assertEqual(f.read(), body)
+
+    def test_timeout_has_no_total_limit(self):
+        timeout = ImgDownloader(self.test_dir, [3, 5, 20])._timeout()
+        self.assertIsNone(timeout.total)
+        self.assertEqual(timeout.connect, 5)
+        self.assertEqual(timeout.sock_read, 20)
+
+    @patch('weibo_spider.downloader.video_downloader.MIN_SEGMENT_SIZE', 1000)
+    def test_segmented_video_download(self):
+        body = bytes(range(256)) * 40
+        file_path = os.path.join(self.test_dir, 'video.mp4')
+        downloader = VideoDownloader(self.test_dir, [1, 1, 1], segments=4)
+        downloader.random_wait = False
+        session = RangeSession(body, fail_at=1000)
+        self.assertTrue(asyncio.run(
+            downloader.download_one_file('http://example.com/v.mp4', file_path,
+                                         '1', session)))
+        # 先获取大小，再分4段下载，中断的分段从断开的位置继续
+        self.assertEqual(session.ranges[0], 'bytes=0-0')
+        self.assertEqual(sorted(session.ranges[1:]), sorted([
+            'bytes=0-2559', 'bytes=2560-5119', 'bytes=5120-7679',
+            'bytes=7680-10239', 'bytes=1000-2559']))
+        with open(file_path, 'rb') as f:
+            self.assertEqual(f.read(), body)
+        self.assertFalse(os.path.exists(file_path + '.seg'))
+
+    @patch('weibo_spider.downloader.video_downloader.MIN_SEGMENT_SIZE', 1000)
+    def test_segmented_download_resumes(self):
+        body = bytes(range(256)) * 40
+        url = 'http://example.com/v.mp4'
+        file_path = os.path.join(self.test_dir, 'video.mp4')
+        downloader = VideoDownloader(self.test_dir, [1, 1, 1], segments=4)
+        downloader.random_wait = False
+
+        class FailingSession(RangeSession):
+            """第3段返回404"""
+            def get(self, url, headers=None, **kwargs):
+                if headers and headers.get('Range') == 'bytes=5120-7679':
+                    self.ranges.append(headers['Range'])
+                    return RangeResponse(404, b'', {})
+                return super().get(url, headers, **kwargs)
+
+        self.assertFalse(asyncio.run(downloader.download_one_file(
+            url, file_path, '1', FailingSession(body))))
+        self.assertTrue(os.path.exists(file_path + '.seg'))
+        self.assertTrue(os.path.exists(file_path + '.seg.json'))
+        # 再次下载时只请求没有完成的分段
+        session = RangeSession(body)
+        self.assertTrue(asyncio.run(downloader.download_one_file(
+            url, file_path, '1', session)))
+        self.assertEqual(session.ranges, ['bytes=0-0', 'bytes=5120-7679'])
+        with open(file_path, 'rb') as f:
+            self.assertEqual(f.read(), body)
+        self.assertFalse(os.path.exists(file_path + '.seg'))
+        self.assertFalse(os.path.exists(file_path + '.seg.json'))
+
+    @patch('weibo_spider.downloader.video_downloader.MIN_SEGMENT_SIZE', 1000)
+    def test_segmented_download_reuses_part(self):
+        body = bytes(range(256)) * 40
+        file_path = os.path.join(self.test_dir, 'video.mp4')
+        with open(file_path + '.part', 'wb') as f:
+            f.write(body[:3000])
+        downloader = VideoDownloader(self.test_dir, [1, 1, 1], segments=4)
+        downloader.random_wait = False
+        session = RangeSession(body)
+        self.assertTrue(asyncio.run(downloader.download_one_file(
+            'http://example.com/v.mp4', file_path, '1', session)))
+        # 单个请求已下载的部分不再重新下载
+        self.assertEqual(sorted(session.ranges[1:]), [
+            'bytes=3000-5119', 'bytes=5120-7679', 'bytes=7680-10239'])
+        with open(file_path, 'rb') as f:
+            self.assertEqual(f.read(), body)
+        self.assertFalse(os.path.exists(file_path + '.part'))
+
+    @patch('weibo_spider.downloader.video_downloader.MIN_SEGMENT_SIZE', 1000)
+    def test_small_video_single_request(self):
+        body = b'0123456789' * 150
+        file_path = os.path.join(self.test_dir, 'video.mp4')
+        downloader = VideoDownloader(self.test_dir, [1, 1, 1], segments=4)
+        downloader.random_wait = False
+        session = RangeSession(body)
+        self.assertTrue(asyncio.run(
+            downloader.download_one_file('http://example.com/v.mp4', file_path,
+                                         '1', session)))
+        self.assertEqual(session.ranges, ['bytes=0-0', None])
+        with open(file_path, 'rb') as f:
+            self.assertEqual(f.read(), body)
+
+
 if __name__ == '__main__':
     unittest.main()
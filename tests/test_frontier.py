@@ -0,0 +1,43 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from weibo_spider.frontier import Frontier
+
+
+class TestFrontier(unittest.TestCase):
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = self.dir / '1669879400.frontier'
+
+    def test_save_and_load(self):
+        frontier = Frontier(self.path)
+        self.assertFalse(frontier.is_known(1))
+        frontier.observe(100)
+        frontier.observe(300)
+        frontier.observe(50, pinned=True)
+        # 保存前边界不变
+        self.assertFalse(frontier.is_known(100))
+        frontier.save()
+
+        frontier = Frontier(self.path)
+        self.assertEqual(frontier.newest_mid, 300)
+        self.assertTrue(frontier.is_known(300))
+        self.assertFalse(frontier.is_known(301))
+        self.assertTrue(frontier.is_pinned(50))
+
+    def test_abort_keeps_old_frontier(self):
+        frontier = Frontier(self.path)
+        frontier.observe(100)
+        frontier.save()
+        frontier = Frontier(self.path)
+        frontier.observe(200)
+        frontier.abort()
+        frontier.save()
+        self.assertEqual(Frontier(self.path).newest_mid, 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+import asyncio
+import unittest
+
+import aiohttp
+from aiohttp import web
+
+from weibo_spider.http_client import HttpClient, SingleFlight, backoff_delay
+from weibo_spider.parser.util import handle_html_async
+
+from .test_parser.util import MockSession
+
+FAST_RETRY = {'retries': 2, 'backoff_base': 0.001, 'backoff_max': 0.01}
+
+
+async def start_server(handler):
+    app = web.Application()
+    app.router.add_get('/', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f'http://127.0.0.1:{port}/'
+
+
+class TestHttpClient(unittest.TestCase):
+    def test_retry_server_error(self):
+        async def run():
+            calls = []
+
+            async def handler(request):
+                calls.append(request)
+                if len(calls) < 3:
+                    return web.Response(status=503)
+                return web.Response(text='ok')
+
+            runner, url = await start_server(handler)
+            try:
+                async with HttpClient(FAST_RETRY) as client:
+                    async with client.get(url) as resp:
+                        return resp.status, await resp.text(), len(calls)
+            finally:
+                await runner.cleanup()
+
+        self.assertEqual(asyncio.run(run()), (200, 'ok', 3))
+
+    def test_give_up_after_retries(self):
+        async def run():
+            calls = []
+
+            async def handler(request):
+                calls.append(request)
+                return web.Response(status=500)
+
+            runner, url = await start_server(handler)
+            try:
+                async with HttpClient(FAST_RETRY) as client:
+                    async with client.get(url, retries=1) as resp:
+                        return resp.status, len(calls)
+            finally:
+                await runner.cleanup()
+
+        self.assertEqual(asyncio.run(run()), (500, 2))
+
+    def test_timeout(self):
+        async def run():
+            async def handler(request):
+                await asyncio.sleep(1)
+                return web.Response(text='late')
+
+            runner, url = await start_server(handler)
+            try:
+                config = dict(FAST_RETRY, total_timeout=0.05)
+                async with HttpClient(config) as client:
+                    async with client.get(url):
+                        pass
+            finally:
+                await runner.cleanup()
+
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(run())
+
+    def test_connection_error(self):
+        async def run():
+            async with HttpClient(FAST_RETRY) as client:
+                async with client.get('http://127.0.0.1:1/'):
+                    pass
+
+        with self.assertRaises(aiohttp.ClientError):
+            asyncio.run(run())
+
+    def test_backoff_delay(self):
+        for attempt in range(10):
+            delay = backoff_delay(attempt, 1, 30)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(30, 2**attempt))
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_coalesce_concurrent_fetches(self):
+        url = 'https://weibo.cn/comment/J5cVGuUNq'
+
+        async def run():
+            session = MockSession(delay=0.01)
+            session.single_flight = SingleFlight(60)
+            selectors = await asyncio.gather(
+                *[handle_html_async('', url, session) for _ in range(3)])
+            selectors.append(await handle_html_async('', url, session))
+            return session, selectors
+
+        session, selectors = asyncio.run(run())
+        self.assertEqual(session.requested_urls, [url])
+        self.assertTrue(all(s is not None for s in selectors))
+
+    def test_failed_page_not_memoized(self):
+        url = 'https://weibo.cn/1669879400/profile?page=999'
+
+        async def run():
+            session = MockSession()
+            session.single_flight = SingleFlight(60)
+            await handle_html_async('', url, session)
+            await handle_html_async('', url, session)
+            return session
+
+        self.assertEqual(asyncio.run(run()).requested_urls, [url, url])
+
+    def test_cancel_last_waiter(self):
+        started = []
+
+        async def fetch():
+            started.append(1)
+            await asyncio.sleep(10)
+
+        async def run():
+            flight = SingleFlight(60)
+            callers = [asyncio.ensure_future(flight.do('url', fetch))
+                       for _ in range(2)]
+            await asyncio.sleep(0.01)
+            callers[0].cancel()
+            await asyncio.sleep(0.01)
+            # 还有调用者在等待时请求继续
+            self.assertEqual(len(flight.inflight), 1)
+            callers[1].cancel()
+            await asyncio.gather(*callers, return_exceptions=True)
+            pending = [t for t in asyncio.all_tasks()
+                       if t is not asyncio.current_task()]
+            return flight, pending
+
+        flight, pending = asyncio.run(run())
+        self.assertEqual(started, [1])
+        self.assertEqual(pending, [])
+        self.assertEqual(flight.inflight, {})
+        self.assertEqual(flight.waiters, {})
+
+    def test_ttl(self):
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            return 'page'
+
+        async def run():
+            flight = SingleFlight(0)
+            await flight.do('url', fetch)
+            await flight.do('url', fetch)
+
+        asyncio.run(run())
+        self.assertEqual(len(calls), 2)
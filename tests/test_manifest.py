@@ -0,0 +1,136 @@
+import asyncio
+import hashlib
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from weibo_spider.config import SpiderConfig
+from weibo_spider.downloader.img_downloader import ImgDownloader
+from weibo_spider.downloader.manifest import DownloadManifest
+from weibo_spider.downloader.media_store import MediaStore
+from weibo_spider.spider import Spider
+
+from .test_downloader_async import RangeResponse, RangeSession
+
+
+class NotFoundSession:
+    def __init__(self):
+        self.count = 0
+
+    def get(self, url, **kwargs):
+        self.count += 1
+        return RangeResponse(404, b'', {})
+
+
+class TestDownloadManifest(unittest.TestCase):
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = self.dir / '1669879400.downloads'
+        self.manifest = DownloadManifest(self.path)
+        self.addCleanup(lambda: self.manifest.close())
+
+    def download(self, url, file_path, session, media_store=None):
+        downloader = ImgDownloader(self.dir, [1, 1, 1])
+        downloader.random_wait = False
+        downloader.manifest = self.manifest
+        downloader.media_store = media_store
+        return asyncio.run(
+            downloader.download_one_file(url, file_path, '12345', session))
+
+    def reopen(self):
+        self.manifest.close()
+        self.manifest = DownloadManifest(self.path)
+
+    def test_record_and_skip(self):
+        file_path = self.dir / 'img' / '20231027_12345.jpg'
+        file_path.parent.mkdir()
+        self.assertTrue(self.download('http://example.com/a.jpg', file_path,
+                                      RangeSession(b'picture')))
+        self.reopen()
+        entry = self.manifest.entries['img/20231027_12345.jpg']
+        self.assertEqual(entry['status'], 'done')
+        self.assertEqual(entry['size'], 7)
+        self.assertEqual(entry['sha256'],
+                         hashlib.sha256(b'picture').hexdigest())
+        # 记录中已完成的文件不再请求
+        session = RangeSession(b'other')
+        self.assertTrue(self.download('http://example.com/a.jpg', file_path,
+                                      session))
+        self.assertEqual(session.ranges, [])
+
+    def test_failed_and_verify(self):
+        failed_path = self.dir / '1.jpg'
+        session = NotFoundSession()
+        self.assertFalse(self.download('http://example.com/1.jpg',
+                                       failed_path, session))
+        done_path = self.dir / '2.jpg'
+        self.download('http://example.com/2.jpg', done_path,
+                      RangeSession(b'complete'))
+        done_path.write_bytes(b'compl')
+        self.reopen()
+        self.assertEqual([e['path'] for e in self.manifest.failed()],
+                         ['1.jpg'])
+        # 内容不符的文件改记为失败并删除
+        self.assertEqual(self.manifest.verify(), 1)
+        self.assertFalse(done_path.exists())
+        self.assertEqual(sorted(e['path'] for e in self.manifest.failed()),
+                         ['1.jpg', '2.jpg'])
+        self.assertTrue(self.download('http://example.com/2.jpg', done_path,
+                                      RangeSession(b'complete')))
+        self.assertFalse(self.manifest.is_done(failed_path))
+        self.assertTrue(self.manifest.is_done(done_path))
+
+    def test_verify_with_media_store(self):
+        store = MediaStore(self.dir / '.media')
+        self.addCleanup(store.close)
+        url = 'http://example.com/v.mp4'
+        file_path = self.dir / 'v.mp4'
+        self.download(url, file_path, RangeSession(b'complete'), store)
+        entry = self.manifest.entries['v.mp4']
+        self.assertEqual(entry['sha256'],
+                         hashlib.sha256(b'complete').hexdigest())
+        # 硬链接的文件损坏时，存储中的文件也已损坏
+        file_path.write_bytes(b'compl')
+        self.assertEqual(self.manifest.verify(store), 1)
+        self.assertIsNone(store.lookup(url))
+        session = RangeSession(b'complete')
+        self.assertTrue(self.download(url, file_path, session, store))
+        self.assertEqual(session.ranges, [None])
+        self.assertEqual(file_path.read_bytes(), b'complete')
+        self.assertEqual(self.manifest.verify(store), 0)
+
+    def test_compact_on_close(self):
+        file_path = self.dir / '1.jpg'
+        for _ in range(5):
+            self.manifest.record_failed('http://example.com/1.jpg', file_path)
+        self.reopen()
+        with open(self.path, encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 1)
+
+    @patch('weibo_spider.spider.FLAGS')
+    def test_retry_failed_downloads(self, mock_flags):
+        mock_flags.user_id_list = None
+        mock_flags.u = None
+        mock_flags.cache_mode = None
+        mock_flags.output_dir = None
+        spider = Spider(SpiderConfig(
+            user_id_list=['1669879400'], write_mode=['csv'], cookie='cookie',
+            file_download_timeout=[1, 1, 1]))
+        file_path = self.dir / 'video' / '20231027_12345.mp4'
+        file_path.parent.mkdir()
+        self.manifest.record_failed('http://example.com/v.mp4', file_path,
+                                    '12345')
+        session = RangeSession(b'video')
+        asyncio.run(spider.retry_one_manifest(self.manifest, session))
+        self.assertEqual(file_path.read_bytes(), b'video')
+        self.assertEqual(self.manifest.failed(), [])
+        self.assertEqual(
+            self.manifest.entries['video/20231027_12345.mp4']['weibo_id'],
+            '12345')
+
+
+if __name__ == '__main__':
+    unittest.main()
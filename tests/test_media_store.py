@@ -0,0 +1,74 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from weibo_spider.downloader.img_downloader import ImgDownloader
+from weibo_spider.downloader.media_store import MediaStore, sinaimg_key
+
+from .test_downloader_async import RangeSession
+
+
+class TestMediaStore(unittest.TestCase):
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.store = MediaStore(self.dir / '.media')
+        self.addCleanup(lambda: self.store.close())
+
+    def download(self, url, file_path, body):
+        downloader = ImgDownloader(self.dir, [1, 1, 1])
+        downloader.random_wait = False
+        downloader.media_store = self.store
+        session = RangeSession(body)
+        self.assertTrue(asyncio.run(
+            downloader.download_one_file(url, file_path, '1', session)))
+        return session
+
+    def test_sinaimg_key(self):
+        self.assertEqual(
+            sinaimg_key('http://wx2.sinaimg.cn/large/76102133ly8fwr33wpn8fj20v90v9tbw.jpg'),
+            'large_76102133ly8fwr33wpn8fj20v90v9tbw.jpg')
+        self.assertEqual(
+            sinaimg_key('https://tvax1.sinaimg.cn/crop.0.0.1080.1080.180/'
+                        '76102133ly8ga961tpte6j20u00u0q65.jpg?KID=imgbed'),
+            'crop.0.0.1080.1080.180_76102133ly8ga961tpte6j20u00u0q65.jpg')
+        self.assertIsNone(sinaimg_key('http://f.video.weibocdn.com/o0/abc.mp4'))
+
+    def test_same_picture_downloaded_once(self):
+        first = self.dir / 'a' / '20231027_1_1.jpg'
+        second = self.dir / 'b' / '20231028_2_1.jpg'
+        first.parent.mkdir()
+        second.parent.mkdir()
+        self.download('http://wx1.sinaimg.cn/large/abc123.jpg', first, b'pic')
+        # 不同域名的同一张图片直接链接，不发出请求
+        session = self.download('http://wx3.sinaimg.cn/large/abc123.jpg',
+                                second, b'other')
+        self.assertEqual(session.ranges, [])
+        self.assertEqual(second.read_bytes(), b'pic')
+        self.assertTrue(os.path.samefile(first, second))
+        # 按图片key而不是尺寸分目录
+        self.assertTrue(os.path.samefile(
+            first, self.dir / '.media' / 'blobs' / 'ab' / 'large_abc123.jpg'))
+
+    def test_dedup_by_content_and_url(self):
+        first = self.dir / '1.mp4'
+        second = self.dir / '2.mp4'
+        third = self.dir / '3.mp4'
+        self.download('http://example.com/a.mp4', first, b'video')
+        self.download('http://example.com/b.mp4', second, b'video')
+        # 内容相同的文件只保存一份
+        self.assertTrue(os.path.samefile(first, second))
+        self.assertEqual(len(list((self.dir / '.media').rglob('*.mp4'))), 1)
+
+        self.store.close()
+        self.store = MediaStore(self.dir / '.media')
+        session = self.download('http://example.com/a.mp4', third, b'new')
+        self.assertEqual(session.ranges, [])
+        self.assertEqual(third.read_bytes(), b'video')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import asyncio
+import shutil
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from weibo_spider.config import SpiderConfig
+from weibo_spider.crawl_context import UserCrawlContext
+from weibo_spider.page_archive import (ArchiveSession, PageArchive,
+                                       _import_zstd, profile_page)
+from weibo_spider.parser.util import to_video_download_url_async
+from weibo_spider.spider import Spider
+
+from .test_parser.util import MockSession
+
+PAGE = b'<html><body>' + b'<div class="c">weibo</div>' * 50 + b'</body></html>'
+
+
+class TestPageArchive(unittest.TestCase):
+    def setUp(self):
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir)
+
+    def test_profile_page(self):
+        self.assertEqual(profile_page('https://weibo.cn/123/profile'),
+                         ('123', 0))
+        self.assertEqual(
+            profile_page('https://weibo.cn/123/profile?page=3'), ('123', 3))
+        self.assertEqual(
+            profile_page('https://weibo.cn/123/profile?starttime=20200101'
+                         '&endtime=20200201&advancedfilter=1&page=2'),
+            ('123', 2))
+        self.assertIsNone(profile_page('https://weibo.cn/comment/J5cVGuUNq'))
+
+    def test_video_missing_from_archive(self):
+        archive = PageArchive(self.archive_dir, 'zlib')
+        self.addCleanup(archive.close)
+        with self.assertLogs('spider.util', 'WARNING') as logs:
+            video_url = asyncio.run(to_video_download_url_async(
+                '', 'https://m.weibo.cn/s/video/show?object_id=1034:123',
+                ArchiveSession(archive)))
+        self.assertEqual(video_url, '')
+        self.assertIn('归档中没有', logs.output[0])
+        self.assertNotIn('权限', logs.output[0])
+
+    def _check_round_trip(self, codec):
+        archive = PageArchive(self.archive_dir, codec)
+        urls = [f'https://weibo.cn/123/profile?page={i}' for i in range(1, 4)]
+        for i, url in enumerate(urls):
+            archive.add(url, PAGE + str(i).encode())
+        archive.add('https://weibo.cn/comment/J5cVGuUNq', b'comment')
+        archive.close()
+
+        archive = PageArchive(self.archive_dir, codec)
+        self.assertEqual(archive.users(), ['123'])
+        self.assertEqual(archive.pages('123'), urls)
+        self.assertEqual(archive.read(urls[1]), PAGE + b'1')
+        self.assertEqual(archive.read('https://weibo.cn/comment/J5cVGuUNq'),
+                         b'comment')
+        self.assertIsNone(archive.read('https://weibo.cn/456/profile'))
+        self.assertLess(archive.data_path.stat().st_size, len(PAGE))
+        archive.close()
+
+    def test_zlib(self):
+        self._check_round_trip('zlib')
+
+    def test_lzma(self):
+        self._check_round_trip('lzma')
+
+    @unittest.skipUnless(_import_zstd(), 'zstandard未安装')
+    def test_zstd_dictionary(self):
+        with patch('weibo_spider.page_archive.DICT_SAMPLES', 20):
+            archive = PageArchive(self.archive_dir, 'zstd')
+            for i in range(30):
+                archive.add(f'https://weibo.cn/123/profile?page={i + 1}',
+                            PAGE + f'<p>{i}</p>'.encode() * 20)
+            self.assertIsNotNone(archive.dict_id)
+            archive.close()
+        archive = PageArchive(self.archive_dir, 'zstd')
+        self.assertEqual(archive.read('https://weibo.cn/123/profile?page=30'),
+                         PAGE + b'<p>29</p>' * 20)
+        archive.close()
+
+
+class TestReparse(unittest.TestCase):
+    def setUp(self):
+        patcher = patch('weibo_spider.spider.FLAGS')
+        mock_flags = patcher.start()
+        mock_flags.user_id_list = None
+        mock_flags.u = None
+        mock_flags.cache_mode = None
+        mock_flags.output_dir = None
+        self.addCleanup(patcher.stop)
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir)
+
+    def _make_spider(self):
+        return Spider(SpiderConfig(
+            user_id_list=['1669879400'], filter=1, since_date='2020-06-01',
+            random_wait_pages=[200, 200], write_mode=['csv'], cookie='cookie',
+            archive_config={'dir': self.archive_dir, 'codec': 'zlib'}))
+
+    def test_reparse_archived_pages(self):
+        spider = self._make_spider()
+        spider.session = MockSession()
+        spider.session.page_archive = spider._open_archive()
+
+        async def crawl():
+            ctx = UserCrawlContext(spider.user_config_list[0])
+            await spider.get_user_info(ctx)
+            weibos = []
+            async for batch in spider.get_weibo_info(ctx):
+                weibos.extend(batch)
+            return ctx.user, weibos
+
+        user, crawled = asyncio.run(crawl())
+        self.assertTrue(crawled)
+        spider.session.page_archive.close()
+
+        spider = self._make_spider()
+        spider.initialize_info = lambda ctx: None
+        spider.write_user = AsyncMock()
+        spider.write_weibo = AsyncMock()
+        asyncio.run(spider.reparse())
+
+        reparsed_user = spider.write_user.call_args[0][0].user
+        self.assertEqual(reparsed_user.nickname, user.nickname)
+        reparsed = [w for call in spider.write_weibo.call_args_list
+                    for w in call[0][1]]
+        self.assertTrue({w.id for w in crawled} <= {w.id for w in reparsed})
+        by_id = {w.id: w for w in reparsed}
+        for weibo in crawled:
+            self.assertEqual(by_id[weibo.id].content, weibo.content)
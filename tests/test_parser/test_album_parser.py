@@ -1,6 +1,7 @@
+import asyncio
 from unittest.mock import patch
 
-from .util import mock_request_get_content
+from .util import MockSession, mock_request_get_content
 from weibo_spider.parser.album_parser import AlbumParser
 
 
@@ -18,3 +19,15 @@ def test_album_parser():
         'http://wx4.sinaimg.cn/wap180/76102133ly8fvlyn5n52gj20v90v949a.jpg',
         'http://wx2.sinaimg.cn/wap180/76102133ly8fk0btnrn5zj20dp0e8q3t.jpg'
     ])
+
+
+def test_album_parser_async():
+    album_parser = AlbumParser(
+        cookie="",
+        album_url="https://weibo.cn/album/166564740000001980768563?rl=1",
+        defer_fetch=True)
+
+    pic_urls = asyncio.run(album_parser.extract_pic_urls_async(MockSession()))
+    assert (len(pic_urls) == 4)
+    assert (pic_urls[0] ==
+            'http://wx1.sinaimg.cn/wap180/76102133ly8ga961tpte6j20u00u0q65.jpg')
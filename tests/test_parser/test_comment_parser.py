@@ -1,6 +1,7 @@
+import asyncio
 from unittest.mock import patch
 
-from .util import mock_request_get_content
+from .util import MockSession, mock_request_get_content
 from weibo_spider.parser.comment_parser import CommentParser
 
 
@@ -25,3 +26,13 @@ def test_comment_parser():
         """热巴已经和我们@北京绿色阳光 站在一起，希望看完视频的你们，也能获得同样感受与动力。\n"""
         """We Stand for Wildlife. \n"""
         """明日朝阳68309的优酷视频""")
+
+
+def test_comment_parser_async():
+    comment_parser = CommentParser(cookie="",
+                                   weibo_id="J5cVGuUNq",
+                                   defer_fetch=True)
+
+    long_weibo = asyncio.run(comment_parser.get_long_weibo_async(MockSession()))
+    assert (long_weibo.startswith("""去年和亲善大使热巴@Dear-迪丽热巴 的特别回忆。"""))
+    assert (long_weibo.endswith("""明日朝阳68309的优酷视频"""))
@@ -1,6 +1,7 @@
+import asyncio
 from unittest.mock import patch
 
-from .util import mock_request_get_content
+from .util import MockSession, mock_request_get_content
 from weibo_spider.parser.index_parser import IndexParser
 
 
@@ -13,3 +14,14 @@ def test_index_parser():
             """微博数: 1159\n"""
             """关注数: 253\n"""
             """粉丝数: 70805574\n""")
+
+
+def test_index_parser_async():
+    session = MockSession()
+    index_parser = asyncio.run(
+        IndexParser(cookie="", user_uri="1669879400",
+                    defer_fetch=True).fetch_async(session))
+    assert (index_parser.get_page_num() == 117)
+    user = asyncio.run(index_parser.get_user_async(session))
+    assert (user.nickname == "Dear-迪丽热巴")
+    assert (user.followers == 70805574)
@@ -1,6 +1,7 @@
+import asyncio
 from unittest.mock import patch
 
-from .util import mock_request_get_content
+from .util import MockSession, mock_request_get_content
 from weibo_spider.parser.info_parser import InfoParser
 
 
@@ -10,3 +11,9 @@ def test_info_parser():
     user = info_parser.extract_user_info()
     # With info_parser, we can only get the nickname.
     assert (user.nickname == "Dear-迪丽热巴")
+
+
+def test_info_parser_async():
+    info_parser = InfoParser(cookie="", user_id="1669879400", defer_fetch=True)
+    user = asyncio.run(info_parser.extract_user_info_async(MockSession()))
+    assert (user.nickname == "Dear-迪丽热巴")
@@ -1,6 +1,7 @@
+import asyncio
 from unittest.mock import patch
 
-from .util import mock_request_get_content
+from .util import MockSession, mock_request_get_content
 from weibo_spider.parser.mblog_picAll_parser import MblogPicAllParser
 
 
@@ -13,3 +14,12 @@ def test_mblog_picAll_parser():
     assert (
         preview_picture_list[0] ==
         'http://ww3.sinaimg.cn/thumb180/63885668ly1gfn5qz5m1yj20u0140472.jpg')
+
+
+def test_mblog_picAll_parser_async():
+    mblog_picAll_parser = MblogPicAllParser(cookie="",
+                                            weibo_id="J5ZcSnCAg",
+                                            defer_fetch=True)
+    preview_picture_list = asyncio.run(
+        mblog_picAll_parser.extract_preview_picture_list_async(MockSession()))
+    assert (len(preview_picture_list) == 18)
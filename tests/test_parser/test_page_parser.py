@@ -1,8 +1,16 @@
+import asyncio
+import pickle
+from concurrent.futures import ProcessPoolExecutor
 from unittest.mock import patch
 
-from weibo_spider.parser.page_parser import PageParser
+from lxml import etree
 
-from .util import mock_request_get_content
+from weibo_spider.crawl_context import PageCrawlContext
+from weibo_spider.frontier import Frontier
+from weibo_spider.parser.page_parser import PageParser, extract_page_drafts
+from weibo_spider.seen_index import weibo_mid
+
+from .util import MockSession, mock_request_get_content
 
 
 @patch('requests.get', mock_request_get_content)
@@ -36,3 +44,133 @@ def test_page_parser():
             """转发数：1000000\n"""
             """评论数：1000000\n"""
             """url：https://weibo.cn/comment/J4EUStJKu\n""")
+
+
+def test_page_parser_async():
+    user_config = {
+        'user_uri': '1669879400',
+        'since_date': '2020-06-01',
+        'end_date': 'now'
+    }
+    session = MockSession()
+    page_parser = PageParser(cookie="",
+                             user_config=user_config,
+                             page=2,
+                             filter=True,
+                             defer_fetch=True)
+    asyncio.run(page_parser.fetch_async(session))
+    weibos, weibo_id_list, to_continue = asyncio.run(
+        page_parser.get_one_page_async([], session))
+    assert (weibo_id_list == ['J4PGk4yMw', 'J4EUStJKu'])
+    assert (len(weibos) == 2)
+    assert (weibos[1].publish_time == '2020-06-01 20:35')
+    assert (weibos[1].up_num == 419181)
+
+
+def test_page_parser_async_detail_concurrency():
+    user_config = {
+        'user_uri': '1669879400',
+        'since_date': '2010-01-01',
+        'end_date': 'now'
+    }
+    session = MockSession(delay=0.01)
+    page_parser = PageParser(cookie="",
+                             user_config=user_config,
+                             page=1,
+                             filter=False,
+                             defer_fetch=True,
+                             detail_concurrency=3)
+    asyncio.run(page_parser.fetch_async(session))
+    session.max_in_flight = 0
+    weibos, weibo_id_list, to_continue = asyncio.run(
+        page_parser.get_one_page_async([], session))
+    # 详情请求被并发执行，且不超过设定的并发上限
+    assert (session.max_in_flight == 3)
+    assert (weibo_id_list == [w.id for w in weibos])
+    assert (len(weibos) == 10)
+    assert ('https://weibo.cn/mblog/picAll/J6k49kbTc?rl=1'
+            in session.requested_urls)
+
+
+def test_page_parser_process_pool():
+    user_config = {
+        'user_uri': '1669879400',
+        'since_date': '2010-01-01',
+        'end_date': 'now'
+    }
+    url = 'https://weibo.cn/1669879400/profile?page=1'
+
+    async def get_page(executor):
+        session = MockSession()
+        async with session.get(url) as resp:
+            content = await resp.read()
+        page_parser = PageParser(cookie="",
+                                 user_config=user_config,
+                                 page=1,
+                                 filter=False,
+                                 defer_fetch=True,
+                                 content=content)
+        return await page_parser.get_one_page_async([], session, executor)
+
+    drafts = extract_page_drafts(
+        asyncio.run(MockSession().get(url).read()), False)
+    # 只有普通数据跨进程传递
+    assert (pickle.loads(pickle.dumps(drafts)) == drafts)
+    weibos, weibo_id_list, _ = asyncio.run(get_page(None))
+    with ProcessPoolExecutor(2) as executor:
+        pool_weibos, pool_id_list, _ = asyncio.run(get_page(executor))
+    assert (len(weibos) == 10)
+    assert (pool_id_list == weibo_id_list)
+    assert ([w.to_dict() for w in pool_weibos] ==
+            [w.to_dict() for w in weibos])
+
+
+def test_page_parser_empty_pages_per_crawl():
+    user_a = {'user_uri': 'a', 'since_date': '2020-06-01', 'end_date': 'now'}
+    user_b = {'user_uri': 'b', 'since_date': '2020-06-01', 'end_date': 'now'}
+    crawl_a = PageCrawlContext(user_a)
+    crawl_b = PageCrawlContext(user_b)
+    empty = etree.HTML('<html><body><div class="c">没有微博</div></body></html>')
+    # 两个用户交替爬取空页面，各自计数，互不重置
+    for page in range(1, 4):
+        for user_config, crawl in ((user_a, crawl_a), (user_b, crawl_b)):
+            page_parser = PageParser(cookie='',
+                                     user_config=user_config,
+                                     page=page,
+                                     filter=False,
+                                     selector=empty,
+                                     crawl=crawl)
+            _, _, to_continue = page_parser.get_one_page([])
+            assert (to_continue == (page < 3))
+    assert (crawl_a.stopped and crawl_b.stopped)
+    crawl_a.record_page(True)
+    assert (crawl_a.empty_count == 0 and crawl_b.empty_count == 3)
+
+
+def test_page_parser_incremental():
+    user_config = {
+        'user_uri': '1669879400',
+        'since_date': '2010-01-01',
+        'end_date': 'now'
+    }
+    content = asyncio.run(MockSession().get(
+        'https://weibo.cn/1669879400/profile?page=1').read())
+    drafts = extract_page_drafts(content, False)
+    # 把最旧的一条放到最前面，作为置顶微博
+    drafts = drafts[-1:] + drafts[:-1]
+    frontier = Frontier()
+    frontier.newest_mid = weibo_mid('J6k49kbTc')
+    crawl = PageCrawlContext(user_config, frontier=frontier)
+    page_parser = PageParser(cookie='',
+                             user_config=user_config,
+                             page=1,
+                             filter=False,
+                             defer_fetch=True,
+                             crawl=crawl)
+    kept = page_parser._select_drafts(drafts, [])
+    # 置顶微博不触发停止，遇到上次保存的最新微博时停止翻页
+    assert ([d.weibo.id for d in kept] ==
+            ['J4X9cvVA4', 'J74OAhxtL', 'J6INEAyUV', 'J6Divw6j7'])
+    assert crawl.stopped
+    assert frontier.pinned == {weibo_mid('J4X9cvVA4')}
+    assert frontier.crawled_mid == weibo_mid('J74OAhxtL')
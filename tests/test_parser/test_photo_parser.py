@@ -1,8 +1,9 @@
+import asyncio
 from unittest.mock import patch
 
 from weibo_spider.parser.photo_parser import PhotoParser
 
-from .util import mock_request_get_content
+from .util import MockSession, mock_request_get_content
 
 
 @patch('requests.get', mock_request_get_content)
@@ -12,3 +13,12 @@ def test_photo_parser():
     avatar_album_url = photo_parser.extract_avatar_album_url()
     assert (avatar_album_url ==
             "https://weibo.cn/album/166564740000001980768563?rl=1")
+
+
+def test_photo_parser_async():
+    photo_parser = PhotoParser(cookie="", user_id=1980768563, defer_fetch=True)
+
+    avatar_album_url = asyncio.run(
+        photo_parser.extract_avatar_album_url_async(MockSession()))
+    assert (avatar_album_url ==
+            "https://weibo.cn/album/166564740000001980768563?rl=1")
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import os
 from unittest.mock import Mock
@@ -5,7 +6,7 @@ from unittest.mock import Mock
 from weibo_spider.parser.util import TEST_DATA_DIR, URL_MAP_FILE
 
 
-def mock_request_get_content(url, headers):
+def mock_request_get_content(url, headers, **kwargs):
     with open(os.path.join(TEST_DATA_DIR, URL_MAP_FILE)) as f:
         url_map = json.loads(f.read())
     resp_file = url_map[url]
@@ -13,3 +14,51 @@ def mock_request_get_content(url, headers):
     with open(resp_file, "rb") as f:
         mock.content = f.read()
     return mock
+
+
+class MockResponse:
+    def __init__(self, url, session):
+        self.session = session
+        self.url = url
+        self.status = 200
+        with open(os.path.join(TEST_DATA_DIR, URL_MAP_FILE)) as f:
+            url_map = json.loads(f.read())
+        self.content = b''
+        if url in url_map:
+            with open(url_map[url], "rb") as f:
+                self.content = f.read()
+
+    async def __aenter__(self):
+        self.session.in_flight += 1
+        self.session.max_in_flight = max(self.session.max_in_flight,
+                                         self.session.in_flight)
+        if self.session.delay:
+            await asyncio.sleep(self.session.delay)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.session.in_flight -= 1
+        return None
+
+    async def read(self):
+        return self.content
+
+    async def json(self, content_type=None):
+        return json.loads(self.content)
+
+
+class MockSession:
+    """按url_map返回测试数据的aiohttp.ClientSession替身"""
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.requested_urls = []
+        self.requested_headers = []
+        self.requested_proxies = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def get(self, url, headers=None, **kwargs):
+        self.requested_urls.append(url)
+        self.requested_headers.append(headers)
+        self.requested_proxies.append(kwargs.get('proxy'))
+        return MockResponse(url, self)
@@ -0,0 +1,52 @@
+import asyncio
+import unittest
+
+from weibo_spider.cookie_pool import CookiePool
+from weibo_spider.parser.util import handle_html_async
+from weibo_spider.proxy_pool import ProxyPool
+from weibo_spider.rate_limiter import BANNED, NETWORK_ERROR, OK
+
+from .test_parser.util import MockSession
+
+PROXIES = ['http://127.0.0.1:8001', 'http://127.0.0.1:8002']
+
+
+class TestProxyPool(unittest.TestCase):
+    def test_sticky_assignment(self):
+        pool = ProxyPool(PROXIES)
+        a = pool.assign('a=1')
+        b = pool.assign('b=2')
+        self.assertIsNot(a, b)
+        self.assertIs(pool.assign('a=1'), a)
+        self.assertIs(pool.assign('b=2'), b)
+
+    def test_evict_and_reassign(self):
+        pool = ProxyPool(PROXIES, max_failures=2)
+        proxy = pool.assign('a=1')
+        pool.record(proxy, NETWORK_ERROR)
+        pool.record(proxy, OK)
+        pool.record(proxy, BANNED)
+        self.assertFalse(proxy.evicted)
+        pool.record(proxy, BANNED)
+        self.assertTrue(proxy.evicted)
+        other = pool.assign('a=1')
+        self.assertIsNot(other, proxy)
+        pool.record(other, NETWORK_ERROR)
+        pool.record(other, NETWORK_ERROR)
+        self.assertIsNone(pool.assign('a=1'))
+
+    def test_requests_use_assigned_proxy(self):
+        async def run():
+            proxy_pool = ProxyPool(PROXIES, max_concurrency=1)
+            cookie = CookiePool(['a=1'], proxy_pool=proxy_pool)
+            session = MockSession(delay=0.01)
+            await asyncio.gather(*[
+                handle_html_async(cookie, 'https://weibo.cn/1669879400', session)
+                for _ in range(3)
+            ])
+            return session, proxy_pool
+
+        session, proxy_pool = asyncio.run(run())
+        self.assertEqual(session.requested_proxies, [PROXIES[0]] * 3)
+        self.assertEqual(session.max_in_flight, 1)
+        self.assertGreater(proxy_pool.proxies[0].latency, 0)
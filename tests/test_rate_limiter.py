@@ -0,0 +1,177 @@
+import asyncio
+import time
+import unittest
+from types import SimpleNamespace
+
+from yarl import URL
+
+from weibo_spider.rate_limiter import (BANNED, EMPTY, LOGIN, OK,
+                                       SERVER_ERROR, THROTTLED,
+                                       AdaptiveTokenBucket,
+                                       RateLimiter, TokenBucket,
+                                       classify_response, defer_record)
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_token_bucket_rate(self):
+        async def run():
+            bucket = TokenBucket(rate=50, burst=2)
+            start = time.monotonic()
+            for _ in range(7):
+                await bucket.acquire()
+            return time.monotonic() - start
+
+        # 前2个令牌立即可用，其余5个按每秒50个发放
+        elapsed = asyncio.run(run())
+        self.assertGreaterEqual(elapsed, 0.09)
+        self.assertLess(elapsed, 0.5)
+
+    def test_domain_matching(self):
+        limiter = RateLimiter({
+            'weibo.cn': {'rate': 1, 'burst': 3},
+            'sinaimg.cn': {'rate': 10, 'burst': 20},
+        })
+        self.assertIs(limiter.get_bucket('weibo.cn'),
+                      limiter.buckets['weibo.cn'])
+        self.assertIs(limiter.get_bucket('m.weibo.cn'),
+                      limiter.buckets['weibo.cn'])
+        self.assertIs(limiter.get_bucket('wx1.sinaimg.cn'),
+                      limiter.buckets['sinaimg.cn'])
+        self.assertIsNone(limiter.get_bucket('example.com'))
+
+    def test_acquire_unlimited_host(self):
+        limiter = RateLimiter({'weibo.cn': {'rate': 0.001, 'burst': 1}})
+        asyncio.run(asyncio.wait_for(
+            limiter.acquire('https://example.com/a.jpg'), 1))
+
+    def test_classify_response(self):
+        self.assertEqual(classify_response(200, 'https://weibo.cn/1/profile'),
+                         OK)
+        self.assertEqual(
+            classify_response(200, 'https://passport.weibo.cn/signin/login'),
+            LOGIN)
+        self.assertEqual(classify_response(418, 'https://weibo.cn/'), BANNED)
+        self.assertEqual(classify_response(403, 'https://weibo.cn/'), BANNED)
+        self.assertEqual(classify_response(429, 'https://weibo.cn/'),
+                         THROTTLED)
+        self.assertEqual(classify_response(502, 'https://weibo.cn/'),
+                         SERVER_ERROR)
+
+    def test_aimd(self):
+        bucket = AdaptiveTokenBucket(rate=2, burst=1)
+        bucket.record(EMPTY)
+        self.assertEqual(bucket.rate, 1)
+        bucket.record(BANNED)
+        self.assertEqual(bucket.rate, 0.5)
+        bucket.record(OK)
+        self.assertEqual(bucket.rate, 0.6)
+        for _ in range(100):
+            bucket.record(OK)
+        self.assertEqual(bucket.rate, 2)
+        for _ in range(100):
+            bucket.record(EMPTY)
+        self.assertEqual(bucket.rate, bucket.min_rate)
+        # 空页只降速，不触发熔断
+        self.assertFalse(bucket.is_open)
+
+    def test_circuit_breaker(self):
+        async def run():
+            bucket = AdaptiveTokenBucket(rate=1000, burst=10)
+            bucket.cooldown = 0.05
+            for _ in range(3):
+                bucket.record(LOGIN)
+            self.assertTrue(bucket.is_open)
+            start = time.monotonic()
+            # 冷却结束后作为探测请求放行
+            self.assertTrue(await bucket.acquire())
+            self.assertGreaterEqual(time.monotonic() - start, 0.04)
+            self.assertTrue(bucket.probing)
+            # 探测未完成时其他请求需要等待
+            waiter = asyncio.ensure_future(bucket.acquire())
+            await asyncio.sleep(0.01)
+            self.assertFalse(waiter.done())
+            # 熔断前发出的请求迟到的结果不会关闭熔断器
+            bucket.record(OK)
+            self.assertTrue(bucket.probing)
+            bucket.record(SERVER_ERROR, probe=True)  # 探测失败，冷却加倍
+            self.assertEqual(bucket.cooldown, 0.1)
+            await asyncio.sleep(0.12)
+            self.assertTrue(bucket.probing)
+            self.assertTrue(await waiter)
+            bucket.record(OK, probe=True)
+            self.assertFalse(bucket.is_open)
+            self.assertFalse(bucket.probing)
+
+        asyncio.run(run())
+
+    def test_single_probe_with_waiters(self):
+        async def run():
+            bucket = AdaptiveTokenBucket(rate=1000, burst=10)
+            bucket.cooldown = 0.05
+            for _ in range(3):
+                bucket.record(THROTTLED)
+            self.assertTrue(bucket.is_open)
+            tasks = [asyncio.ensure_future(bucket.acquire())
+                     for _ in range(3)]
+            await asyncio.sleep(0.15)
+            # 冷却结束后只放行一个探测请求，其余请求等待且不再熔断
+            self.assertEqual(sum(t.done() for t in tasks), 1)
+            self.assertTrue(bucket.probing)
+            self.assertEqual(bucket.cooldown, 0.05)
+            bucket.record(OK, probe=True)
+            probes = await asyncio.wait_for(asyncio.gather(*tasks), 1)
+            self.assertEqual(sorted(probes), [False, False, True])
+            self.assertFalse(bucket.is_open)
+
+        asyncio.run(run())
+
+    def _trace_handlers(self, limiter):
+        trace = limiter.trace_config()
+        return (trace.on_request_start[0], trace.on_request_end[0],
+                trace.on_request_exception[0])
+
+    def test_cancelled_probe(self):
+        url = URL('https://weibo.cn/1/profile')
+
+        async def run():
+            limiter = RateLimiter({'weibo.cn': {'rate': 1000, 'burst': 10}})
+            bucket = limiter.buckets['weibo.cn']
+            bucket.cooldown = 0.01
+            for _ in range(3):
+                bucket.record(BANNED)
+            start, _, exception = self._trace_handlers(limiter)
+            ctx = SimpleNamespace()
+            await start(None, ctx, SimpleNamespace(url=url))
+            self.assertTrue(ctx.probe)
+            waiter = asyncio.ensure_future(bucket.acquire())
+            await asyncio.sleep(0.01)
+            # 探测请求被取消后，等待的请求立即成为新的探测请求
+            await exception(None, ctx, SimpleNamespace(
+                exception=asyncio.CancelledError()))
+            self.assertTrue(await asyncio.wait_for(waiter, 1))
+            self.assertEqual(bucket.cooldown, 0.01)
+
+        asyncio.run(run())
+
+    def test_page_result_recorded_after_content(self):
+        url = URL('https://weibo.cn/1/profile')
+
+        async def run():
+            limiter = RateLimiter({'weibo.cn': {'rate': 2, 'burst': 10}})
+            bucket = limiter.buckets['weibo.cn']
+            start, end, _ = self._trace_handlers(limiter)
+            with defer_record() as deferred:
+                ctx = SimpleNamespace()
+                await start(None, ctx, SimpleNamespace(url=url))
+                await end(None, ctx, SimpleNamespace(
+                    response=SimpleNamespace(status=200, url=url)))
+                self.assertEqual(bucket.rate, 2)
+                # 状态码为200的空页按空页记录，不算作正常响应
+                deferred.record(EMPTY)
+            return bucket
+
+        self.assertEqual(asyncio.run(run()).rate, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
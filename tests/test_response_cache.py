@@ -0,0 +1,92 @@
+import asyncio
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from weibo_spider.parser.util import handle_html_async
+from weibo_spider.response_cache import (READ_THROUGH, RECORD, REPLAY,
+                                         ResponseCache, url_class)
+
+from .test_parser.util import MockSession
+
+PROFILE_URL = 'https://weibo.cn/1669879400/profile'
+COMMENT_URL = 'https://weibo.cn/comment/J5cVGuUNq'
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    def test_url_class(self):
+        self.assertEqual(url_class(PROFILE_URL), 'profile')
+        self.assertEqual(url_class(PROFILE_URL + '?page=2'), 'profile')
+        self.assertEqual(url_class(COMMENT_URL), 'comment')
+        self.assertEqual(
+            url_class('https://weibo.cn/mblog/picAll/J6k49kbTc?rl=1'), 'picAll')
+        self.assertEqual(
+            url_class('https://m.weibo.cn/s/video/object?object_id=1'), 'video')
+        self.assertEqual(url_class('https://weibo.cn/'), 'other')
+
+    def test_read_through_ttl(self):
+        cache = ResponseCache(self.cache_dir, READ_THROUGH)
+        with patch('weibo_spider.response_cache.time.time', return_value=0):
+            cache.put(PROFILE_URL, b'profile')
+            cache.put(COMMENT_URL, b'comment')
+        with patch('weibo_spider.response_cache.time.time',
+                   return_value=3600):
+            self.assertIsNone(cache.get(PROFILE_URL))
+            self.assertEqual(cache.get(COMMENT_URL),
+                             (b'comment', 200, COMMENT_URL))
+        cache.close()
+
+    def test_index_reload_and_dedup(self):
+        cache = ResponseCache(self.cache_dir, RECORD)
+        cache.put(PROFILE_URL, b'same')
+        cache.put(COMMENT_URL, b'same')
+        cache.put(PROFILE_URL, b'new')
+        self.assertIsNone(cache.get(PROFILE_URL))  # record模式不读缓存
+        self.assertEqual(cache.total_size, len(b'same') + len(b'new'))
+        cache.close()
+
+        cache = ResponseCache(self.cache_dir, REPLAY)
+        self.assertEqual(cache.get(PROFILE_URL)[0], b'new')
+        self.assertEqual(cache.get(COMMENT_URL)[0], b'same')
+        self.assertEqual(len(cache.sizes), 2)
+        cache.close()
+
+    def test_eviction(self):
+        cache = ResponseCache(self.cache_dir, READ_THROUGH,
+                              max_size_mb=1.5 / 1024)
+        cache.put(PROFILE_URL, b'a' * 1024)
+        cache.put(COMMENT_URL, b'b' * 1024)
+        self.assertIsNone(cache.get(PROFILE_URL))
+        self.assertIsNotNone(cache.get(COMMENT_URL))
+        cache.close()
+
+        cache = ResponseCache(self.cache_dir, REPLAY)
+        self.assertEqual(list(cache.entries), [COMMENT_URL])
+        cache.close()
+
+    def test_record_and_replay(self):
+        async def crawl(session):
+            return await handle_html_async('', PROFILE_URL, session)
+
+        recorder = MockSession()
+        recorder.response_cache = ResponseCache(self.cache_dir, RECORD)
+        recorded = asyncio.run(crawl(recorder))
+        recorder.response_cache.close()
+
+        player = MockSession()
+        player.response_cache = ResponseCache(self.cache_dir, REPLAY)
+        replayed = asyncio.run(crawl(player))
+        missing = asyncio.run(
+            handle_html_async('', COMMENT_URL, player))
+        player.response_cache.close()
+
+        self.assertEqual(recorder.requested_urls, [PROFILE_URL])
+        self.assertEqual(player.requested_urls, [])
+        self.assertEqual(replayed.xpath('//title/text()'),
+                         recorded.xpath('//title/text()'))
+        self.assertIsNone(missing)
@@ -0,0 +1,106 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from weibo_spider.config import SpiderConfig
+from weibo_spider.crawl_context import UserCrawlContext
+from weibo_spider.seen_index import SeenIndex, weibo_mid
+from weibo_spider.spider import Spider
+
+
+class TestSeenIndex(unittest.TestCase):
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = self.dir / '1669879400.seen'
+
+    def test_weibo_mid(self):
+        self.assertEqual(weibo_mid('J4PGk4yMw'), 4511519801087016)
+        self.assertEqual(weibo_mid('4511519801087016'), 4511519801087016)
+        self.assertIsNone(weibo_mid('not-a-bid'))
+
+    def test_dedup_in_memory(self):
+        index = SeenIndex()
+        self.assertNotIn('J4PGk4yMw', index)
+        index.append('J4PGk4yMw')
+        index.append('not-a-bid')
+        self.assertIn('J4PGk4yMw', index)
+        self.assertIn('not-a-bid', index)
+        self.assertEqual(len(index), 2)
+        index.save()  # 没有路径时不写文件
+
+    def test_only_committed_ids_are_saved(self):
+        index = SeenIndex(self.path)
+        for weibo_id in ['J4PGk4yMw', 'J4EUStJKu', 'J4EUStJKv']:
+            index.append(weibo_id)
+        index.commit(['J4PGk4yMw', 'J4EUStJKu'])
+        index.save()
+        index.close()
+        self.assertEqual(self.path.stat().st_size, 16)
+
+        index = SeenIndex(self.path)
+        self.assertIn('J4PGk4yMw', index)
+        self.assertIn('J4EUStJKu', index)
+        self.assertNotIn('J4EUStJKv', index)
+        # 再次保存时与已有的id合并，结果仍然有序
+        index.append('J4EUStJKv')
+        index.append('J00000000')
+        index.commit(['J4EUStJKv', 'J00000000'])
+        index.save()
+        self.assertEqual(list(index._base), sorted(index._base))
+        self.assertEqual(len(index), 4)
+        index.close()
+
+    def test_ignore_partial_tail(self):
+        index = SeenIndex(self.path)
+        index.append('J4PGk4yMw')
+        index.commit(['J4PGk4yMw'])
+        index.save()
+        index.close()
+        with open(self.path, 'ab') as f:
+            f.write(b'\x01\x02\x03')
+        index = SeenIndex(self.path)
+        self.assertIn('J4PGk4yMw', index)
+        self.assertEqual(len(index), 1)
+        index.close()
+
+
+    @patch('weibo_spider.spider.FLAGS')
+    def test_skip_written_option(self, mock_flags):
+        mock_flags.user_id_list = None
+        mock_flags.u = None
+        mock_flags.cache_mode = None
+        mock_flags.output_dir = str(self.dir)
+
+        def open_index(skip_written):
+            spider = Spider(SpiderConfig(
+                user_id_list=['1669879400'], write_mode=['csv'],
+                cookie='cookie', skip_written=skip_written))
+            ctx = UserCrawlContext(spider.user_config_list[0])
+            ctx.user.id = ctx.user.nickname = '1669879400'
+            return spider._open_seen_index(ctx)
+
+        # 默认不跨运行去重，也不生成.seen文件
+        index = open_index(0)
+        index.append('J4PGk4yMw')
+        index.commit(['J4PGk4yMw'])
+        index.save()
+        self.assertIsNone(index.path)
+        self.assertEqual(list(self.dir.rglob('*.seen')), [])
+        self.assertNotIn('J4PGk4yMw', open_index(0))
+
+        index = open_index(1)
+        self.assertEqual(index.path,
+                         self.dir / '1669879400' / '1669879400.seen')
+        index.append('J4PGk4yMw')
+        index.commit(['J4PGk4yMw'])
+        index.save()
+        index.close()
+        index = open_index(1)
+        self.assertIn('J4PGk4yMw', index)
+        index.close()
+
+if __name__ == '__main__':
+    unittest.main()
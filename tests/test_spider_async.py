@@ -0,0 +1,130 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+from weibo_spider.config import SpiderConfig
+from weibo_spider.crawl_context import UserCrawlContext
+from weibo_spider.http_client import SingleFlight
+from weibo_spider.spider import Spider
+
+from .test_parser.util import MockSession
+
+
+class TestSpiderAsync(unittest.TestCase):
+    def setUp(self):
+        patcher = patch('weibo_spider.spider.FLAGS')
+        mock_flags = patcher.start()
+        mock_flags.user_id_list = None
+        mock_flags.u = None
+        mock_flags.cache_mode = None
+        mock_flags.output_dir = None
+        self.addCleanup(patcher.stop)
+
+    def _make_spider(self, **kwargs):
+        config_dict = {
+            'user_id_list': ['1669879400'],
+            'filter': 1,
+            'since_date': '2020-06-01',
+            'random_wait_pages': [200, 200],
+            'write_mode': ['csv'],
+            'cookie': 'cookie',
+        }
+        config_dict.update(kwargs)
+        return Spider(SpiderConfig(**config_dict))
+
+    async def _collect(self, spider):
+        ctx = UserCrawlContext(spider.user_config_list[0])
+        batches = []
+        async for weibos in spider.get_weibo_info(ctx):
+            batches.append(weibos)
+        return batches
+
+    def test_page_window_stops_and_cancels(self):
+        self._check_page_window_stops_and_cancels(single_flight=False)
+
+    def test_page_window_cancels_single_flight(self):
+        # 预取任务被取消时，合并请求中的页面请求也要被取消
+        self._check_page_window_stops_and_cancels(single_flight=True)
+
+    def _check_page_window_stops_and_cancels(self, single_flight):
+        spider = self._make_spider(page_concurrency=3)
+        spider.session = MockSession(delay=0.01)
+        if single_flight:
+            spider.session.single_flight = SingleFlight(60)
+
+        async def run():
+            batches = await self._collect(spider)
+            # 翻页结束后不应再有未完成的预取任务
+            pending = [
+                t for t in asyncio.all_tasks()
+                if t is not asyncio.current_task()
+            ]
+            return batches, pending
+
+        batches, pending = asyncio.run(run())
+        self.assertEqual(pending, [])
+        self.assertEqual([w.id for w in batches[-1]],
+                         ['J4PGk4yMw', 'J4EUStJKu'])
+        urls = spider.session.requested_urls
+        self.assertIn('https://weibo.cn/1669879400/profile?page=3', urls)
+        # 第2页已到达since_date，不会继续预取第5页
+        self.assertNotIn('https://weibo.cn/1669879400/profile?page=5', urls)
+
+    def test_date_windows(self):
+        spider = self._make_spider(date_windows=2, end_date='2020-06-10',
+                                   since_date='2020-06-01')
+        spider.session = MockSession()
+        asyncio.run(self._collect(spider))
+        urls = spider.session.requested_urls
+        self.assertIn(
+            'https://weibo.cn/1669879400/profile?starttime=20200601'
+            '&endtime=20200605&advancedfilter=1&page=1', urls)
+        self.assertIn(
+            'https://weibo.cn/1669879400/profile?starttime=20200606'
+            '&endtime=20200610&advancedfilter=1&page=1', urls)
+
+    def test_user_scheduler_concurrency(self):
+        spider = self._make_spider(user_id_list=['1', '2', '3', '4', '5'],
+                                   user_concurrency=2)
+        state = {'in_flight': 0, 'max_in_flight': 0, 'done': []}
+
+        async def fake_get_one_user(user_config):
+            state['in_flight'] += 1
+            state['max_in_flight'] = max(state['max_in_flight'],
+                                         state['in_flight'])
+            loop = asyncio.get_running_loop()
+            fut = loop.create_future()
+            loop.call_later(0.01, fut.set_result, None)
+            await fut
+            state['in_flight'] -= 1
+            state['done'].append(user_config['user_uri'])
+
+        spider.get_one_user = fake_get_one_user
+        with patch('asyncio.sleep', AsyncMock()):
+            asyncio.run(spider.start())
+        self.assertEqual(state['max_in_flight'], 2)
+        self.assertEqual(sorted(state['done']), ['1', '2', '3', '4', '5'])
+
+    def test_retry_downloads_uses_rate_limiter(self):
+        spider = self._make_spider(rate_limit={'weibo.cn': {'rate': 1}})
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir)
+        user_dir = os.path.join(output_dir, 'user')
+        os.makedirs(user_dir)
+        open(os.path.join(user_dir, '1.downloads'), 'w').close()
+        spider._output_dir = lambda: Path(output_dir)
+        with patch('weibo_spider.spider.HttpClient') as mock_client:
+            mock_client.return_value.__aenter__ = AsyncMock()
+            mock_client.return_value.__aexit__ = AsyncMock(return_value=None)
+            asyncio.run(spider.retry_downloads())
+        # 重新下载的请求与爬取时一样受限速器控制
+        trace_configs = mock_client.call_args[0][1]
+        self.assertEqual(len(trace_configs), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,6 +10,7 @@ class TestSpiderInit(unittest.TestCase):
         mock_flags.user_id_list = None
         mock_flags.u = None
         mock_flags.output_dir = None
+        mock_flags.cache_mode = None
 
         config_dict = {
             'user_id_list': ['123'],
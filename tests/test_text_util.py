@@ -0,0 +1,40 @@
+import io
+
+from lxml import etree
+
+from weibo_spider.parser.util import handle_garbled
+from weibo_spider.text_util import (TranslateTable, make_translate_table,
+                                    normalize, output_encoding)
+
+
+def test_output_encoding_keeps_chinese_capable_encoding():
+    stream = io.TextIOWrapper(io.BytesIO(), encoding='gbk')
+    assert output_encoding(stream) == 'gbk'
+
+
+def test_output_encoding_falls_back_to_utf8_for_ascii():
+    stream = io.TextIOWrapper(io.BytesIO(), encoding='ascii')
+    assert output_encoding(stream) == 'utf-8'
+
+
+def test_translate_table_drops_unencodable_characters():
+    table = make_translate_table('gbk')
+    assert isinstance(table, TranslateTable)
+    assert '微\u200b博\U0001f600'.translate(table) == '微博'
+
+
+def test_utf8_table_only_removes_zero_width():
+    table = make_translate_table('utf-8')
+    assert '微\u200b博\ufeff\U0001f600'.translate(table) == '微博\U0001f600'
+
+
+def test_utf8_table_keeps_zwj_emoji():
+    family = '\U0001f468\u200d\U0001f469\u200d\U0001f467'
+    table = make_translate_table('utf-8')
+    assert ('微博' + family + '\u200b').translate(table) == '微博' + family
+
+
+def test_handle_garbled():
+    div = etree.HTML('<div>微\u200b博<a>正文</a></div>').find('.//div')
+    assert handle_garbled(div) == normalize('微博正文') == '微博正文'
+    assert handle_garbled('赞[1]') == '赞[1]'
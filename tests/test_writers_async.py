@@ -12,6 +12,7 @@ sys.modules['aiofiles'] = MagicMock()
 from weibo_spider.writer.txt_writer import TxtWriter
 from weibo_spider.writer.csv_writer import CsvWriter
 from weibo_spider.writer.json_writer import JsonWriter
+from weibo_spider.writer.post_writer import PostWriter
 from weibo_spider.user import User
 from weibo_spider.weibo import Weibo
 
@@ -81,5 +82,24 @@ class TestWritersAsync(unittest.IsolatedAsyncioTestCase):
         args, _ = mock_f.write.call_args
         self.assertIn('test_user', args[0])
 
+    @patch('weibo_spider.writer.post_writer.HttpClient')
+    async def test_post_writer_reuses_client(self, mock_client):
+        response = MagicMock(status=200)
+        response.json = AsyncMock(return_value={})
+        session = mock_client.return_value
+        session.post.return_value.__aenter__ = AsyncMock(return_value=response)
+        session.post.return_value.__aexit__ = AsyncMock(return_value=None)
+        session.close = AsyncMock()
+        writer = PostWriter({'api_url': 'http://example.com/api'})
+
+        await writer.write_user(self.user)
+        await writer.write_weibo(self.weibos)
+        await writer.write_weibo(self.weibos)
+        await writer.close()
+
+        mock_client.assert_called_once()
+        self.assertEqual(session.post.call_count, 2)
+        session.close.assert_awaited_once()
+
 if __name__ == '__main__':
     unittest.main()
@@ -3,6 +3,11 @@ from pydantic import BaseModel, Field, field_validator, ConfigDict
 from pathlib import Path
 from datetime import datetime
 from .datetime_util import is_valid_date
+from .downloader.download_engine import (DEFAULT_DOWNLOAD_CONCURRENCY,
+                                         DEFAULT_LIMIT_PER_HOST)
+from .http_client import DEFAULT_HTTP_CONFIG, INT_KEYS, ZERO_ALLOWED
+from .page_archive import ARCHIVE_CODECS
+from .response_cache import CACHE_MODES, DEFAULT_MAX_SIZE_MB, DEFAULT_TTL, OFF
 
 
 class SpiderConfig(BaseModel):
@@ -12,7 +17,13 @@ class SpiderConfig(BaseModel):
     user_id_list: Union[List[Union[str, Dict[str, str]]], str] = Field(
         description="要爬取的微博用户ID列表，可以是ID列表，也可以是包含ID的字典列表，或txt文件路径。"
     )
-    cookie: str = Field(description="微博的Cookie，用于身份验证。")
+    cookie: Union[str, List[str]] = Field(
+        description="微博的Cookie，用于身份验证。可以是单个cookie、cookie列表或每行一个cookie的txt文件路径。"
+    )
+    cookie_rate_limit: Optional[Dict[str, float]] = Field(
+        default=None,
+        description="使用多个cookie时每个账号的请求额度 {'rate': 每秒请求数, 'burst': 突发请求数}。"
+    )
     filter: int = Field(default=0, description="过滤类型，0表示抓取全部微博，1表示只抓取原创微博。")
     since_date: Union[int, str] = Field(
         default=0, 
@@ -34,6 +45,10 @@ class SpiderConfig(BaseModel):
         default_factory=lambda: [[1000, 3600]], 
         description="全局等待配置 [[页数, 秒数], ...]，例如每爬取1000页等待3600秒。"
     )
+    rate_limit: Optional[Dict[str, Dict[str, float]]] = Field(
+        default=None,
+        description="按域名限速 {域名: {'rate': 每秒请求数, 'burst': 突发请求数}}，配置后取代random_wait和global_wait。"
+    )
     write_mode: List[str] = Field(
         default_factory=lambda: ["csv"], 
         description="结果保存类型列表，可包含 'txt', 'csv', 'json', 'mongo', 'mysql', 'sqlite', 'kafka', 'post'。"
@@ -44,14 +59,75 @@ class SpiderConfig(BaseModel):
         default_factory=lambda: [5, 5, 10], 
         description="文件下载超时设置 [重试次数, 连接超时, 读取超时]。"
     )
+    download_concurrency: int = Field(
+        default=DEFAULT_DOWNLOAD_CONCURRENCY,
+        description="同时下载的图片和视频文件数。"
+    )
+    download_limit_per_host: int = Field(
+        default=DEFAULT_LIMIT_PER_HOST,
+        description="同一域名同时下载的文件数。"
+    )
+    video_segments: int = Field(
+        default=1,
+        description="大视频分成几段并发下载，1表示不分段。"
+    )
     result_dir_name: int = Field(default=0, description="结果目录命名方式，0使用用户昵称，1使用用户ID。")
+    skip_written: int = Field(
+        default=0,
+        description="是否跳过之前运行中已写入的微博，1表示跨运行去重。"
+    )
+    incremental: int = Field(
+        default=0,
+        description="是否增量爬取，1表示翻页遇到上次已保存的微博即停止。"
+    )
+    detail_concurrency: int = Field(
+        default=5,
+        description="同一页微博中长微博全文、多图、视频等详情请求的最大并发数。"
+    )
+    page_concurrency: int = Field(
+        default=3,
+        description="同一用户微博页面的预取窗口大小，即最多同时请求的页数。"
+    )
+    user_concurrency: int = Field(
+        default=1,
+        description="同时爬取的用户数，每个用户使用独立的写入器和下载器。"
+    )
+    date_windows: int = Field(
+        default=1,
+        description="将since_date到end_date分成的时间窗口数，各窗口并发爬取，1表示不分窗口。"
+    )
+    parse_workers: int = Field(
+        default=0,
+        description="解析微博列表页的进程数，0表示在主进程中解析。"
+    )
     mysql_config: Optional[Dict[str, Any]] = Field(default=None, description="MySQL数据库连接配置字典。")
     sqlite_config: Optional[str] = Field(default=None, description="SQLite数据库连接路径。")
     kafka_config: Optional[Dict[str, Any]] = Field(default=None, description="Kafka配置字典。")
     mongo_config: Optional[Dict[str, Any]] = Field(default=None, description="MongoDB配置字典。")
     post_config: Optional[Dict[str, Any]] = Field(default=None, description="POST请求配置字典（用于数据推送）。")
+    http_config: Optional[Dict[str, Union[int, float]]] = Field(
+        default=None,
+        description="HTTP客户端配置字典，包括连接池大小、DNS缓存、超时时间和重试次数等。"
+    )
+    cache_config: Optional[Dict[str, Any]] = Field(
+        default=None,
+        description="响应缓存配置字典，包含mode(off/record/replay/read_through)、dir、ttl和max_size_mb。"
+    )
+    archive_config: Optional[Dict[str, str]] = Field(
+        default=None,
+        description="原始页面归档配置字典，包含dir和codec(zstd/zlib/lzma)。"
+    )
+    media_store_config: Optional[Dict[str, str]] = Field(
+        default=None,
+        description="图片和视频去重存储配置字典，包含dir。"
+    )
+    proxy_config: Optional[Dict[str, Any]] = Field(
+        default=None,
+        description="代理池配置字典，包含proxies(HTTP/SOCKS代理列表)、max_concurrency和max_failures。"
+    )
 
-    @field_validator('filter', 'pic_download', 'video_download')
+    @field_validator('filter', 'pic_download', 'video_download', 'incremental',
+                     'skip_written')
     @classmethod
     def check_binary(cls, v: int) -> int:
         if v not in (0, 1):
@@ -79,6 +155,22 @@ class SpiderConfig(BaseModel):
 
             raise ValueError(f'end_date值应为yyyy-mm-dd形式或"now",  得到: {v}')
 
+    @field_validator('detail_concurrency', 'page_concurrency', 'user_concurrency',
+                     'date_windows', 'download_concurrency',
+                     'download_limit_per_host', 'video_segments')
+    @classmethod
+    def check_positive(cls, v: int) -> int:
+        if v < 1:
+            raise ValueError(f'值应为大于0的整数, 得到: {v}')
+        return v
+
+    @field_validator('parse_workers')
+    @classmethod
+    def check_parse_workers(cls, v: int) -> int:
+        if v < 0:
+            raise ValueError(f'parse_workers应为非负整数, 得到: {v}')
+        return v
+
     @field_validator('random_wait_pages', 'random_wait_seconds')
     @classmethod
     def check_wait_range(cls, v: List[int]) -> List[int]:
@@ -102,6 +194,91 @@ class SpiderConfig(BaseModel):
                 raise ValueError('列表中的值应为大于0的整数')
         return v
 
+    @field_validator('rate_limit')
+    @classmethod
+    def check_rate_limit(cls, v: Optional[Dict[str, Dict[str, float]]]) -> Optional[Dict[str, Dict[str, float]]]:
+        if v is None:
+            return v
+        for domain, limit in v.items():
+            if limit.get('rate', 0) <= 0:
+                raise ValueError(f'{domain}的rate应为大于0的数')
+            if limit.get('burst', 1) < 1:
+                raise ValueError(f'{domain}的burst应不小于1')
+        return v
+
+    @field_validator('cookie_rate_limit')
+    @classmethod
+    def check_cookie_rate_limit(cls, v: Optional[Dict[str, float]]) -> Optional[Dict[str, float]]:
+        if v is None:
+            return v
+        if v.get('rate', 0) <= 0:
+            raise ValueError('cookie_rate_limit的rate应为大于0的数')
+        if v.get('burst', 1) < 1:
+            raise ValueError('cookie_rate_limit的burst应不小于1')
+        return v
+
+    @field_validator('cookie')
+    @classmethod
+    def check_cookie(cls, v: Union[str, List[str]]) -> Union[str, List[str]]:
+        if isinstance(v, list) and not v:
+            raise ValueError('cookie列表不能为空')
+        return v
+
+    @field_validator('http_config')
+    @classmethod
+    def check_http_config(
+            cls, v: Optional[Dict[str, Union[int, float]]]
+    ) -> Optional[Dict[str, Union[int, float]]]:
+        if v is None:
+            return v
+        for key, value in v.items():
+            if key not in DEFAULT_HTTP_CONFIG:
+                raise ValueError(f'http_config中的{key}不是有效的配置项')
+            if key in INT_KEYS and not isinstance(value, int):
+                raise ValueError(f'http_config中的{key}应为整数')
+            if value < 0 or (value == 0 and key not in ZERO_ALLOWED):
+                raise ValueError(f'http_config中的{key}应大于0')
+        return v
+
+    @field_validator('cache_config')
+    @classmethod
+    def check_cache_config(cls, v: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if v is None:
+            return v
+        if v.get('mode', OFF) not in CACHE_MODES:
+            raise ValueError(f'cache_config中的mode值应为{"、".join(CACHE_MODES)}之一')
+        for url_class, ttl in (v.get('ttl') or {}).items():
+            if url_class not in DEFAULT_TTL:
+                raise ValueError(f'cache_config的ttl中{url_class}不是有效的url类别')
+            if not isinstance(ttl, (int, float)) or ttl < 0:
+                raise ValueError('cache_config中的ttl应为非负数')
+        max_size_mb = v.get('max_size_mb', DEFAULT_MAX_SIZE_MB)
+        if not isinstance(max_size_mb, (int, float)) or max_size_mb <= 0:
+            raise ValueError('cache_config中的max_size_mb应大于0')
+        return v
+
+    @field_validator('archive_config')
+    @classmethod
+    def check_archive_config(cls, v: Optional[Dict[str, str]]) -> Optional[Dict[str, str]]:
+        if v is None:
+            return v
+        codec = v.get('codec')
+        if codec and codec not in ARCHIVE_CODECS:
+            raise ValueError(f'archive_config中的codec值应为{"、".join(ARCHIVE_CODECS)}之一')
+        return v
+
+    @field_validator('proxy_config')
+    @classmethod
+    def check_proxy_config(cls, v: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if v is None:
+            return v
+        if not isinstance(v.get('proxies'), list) or not v['proxies']:
+            raise ValueError('proxy_config中的proxies应为非空list')
+        for key in ('max_concurrency', 'max_failures'):
+            if key in v and (not isinstance(v[key], int) or v[key] < 1):
+                raise ValueError(f'proxy_config中的{key}应为大于0的整数')
+        return v
+
     @field_validator('write_mode')
     @classmethod
     def check_write_mode(cls, v: List[str]) -> List[str]:
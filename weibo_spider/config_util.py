@@ -37,6 +37,14 @@ def get_user_config_list(file_name, default_since_date):
     return user_config_list
 
 
+def get_cookie_list(file_name):
+    """获取文件中的cookie，每行一个"""
+    with open(file_name, 'rb') as f:
+        lines = f.read().splitlines()
+        lines = [line.decode('utf-8-sig').strip() for line in lines]
+    return [line for line in lines if line and not line.startswith('#')]
+
+
 def update_user_config_file(user_config_file_path, user_uri, nickname,
                             start_time):
     """更新用户配置文件"""
@@ -92,7 +100,10 @@ def update_cookie_config(cookie, user_config_file_path):
             config = json.load(f)
             
         cookie_string = '; '.join(f'{name}={value}' for name, value in cookie.items())
-        
+
+        if isinstance(config['cookie'], list) or config['cookie'].endswith('.txt'):
+            # 使用cookie池时不覆盖配置
+            return
         if config['cookie'] != cookie_string:
             config['cookie'] = cookie_string
             with codecs.open(user_config_file_path, 'w', encoding='utf-8') as f:
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import time
+
+from .rate_limiter import BANNED, EMPTY, LOGIN, OK, THROTTLED, TokenBucket
+
+logger = logging.getLogger('spider.cookie_pool')
+
+# 健康分低于HEALTH_THRESHOLD的账号会被隔离QUARANTINE_SECONDS秒，
+# cookie失效(跳转登录页)的账号隔离LOGIN_QUARANTINE_SECONDS秒
+HEALTH_THRESHOLD = 0.3
+QUARANTINE_SECONDS = 1800
+LOGIN_QUARANTINE_SECONDS = 6 * 3600
+PROBATION_HEALTH = 0.5
+HEALTH_REWARD = 0.05
+HEALTH_PENALTY = {EMPTY: 0.1, THROTTLED: 0.1, BANNED: 0.3}
+
+
+class CookieAccount:
+    """cookie池中的一个账号"""
+    def __init__(self, cookie, rate_limit=None):
+        self.cookie = cookie
+        self.bucket = None
+        if rate_limit:
+            self.bucket = TokenBucket(rate_limit['rate'],
+                                      rate_limit.get('burst', 1))
+        self.health = 1.0
+        self.quarantined_until = 0.0
+        self.pending = 0  # 已分配但尚未完成的请求数
+        self.requests = 0
+        self.proxy = None  # 使用代理池时该账号固定使用的代理
+
+    def is_available(self, now):
+        return self.quarantined_until <= now
+
+    def quarantine(self, seconds):
+        self.quarantined_until = time.monotonic() + seconds
+        logger.warning(f'cookie {self} 已被隔离{seconds}秒')
+
+    def __str__(self):
+        return self.cookie[:8] + '...'
+
+
+class CookiePool:
+    """在多个cookie(账号)之间分配请求
+
+    每个账号有独立的请求额度(cookie_rate_limit)和健康分：跳转登录页、
+    空页和403/418会降低健康分，健康分过低或cookie失效的账号会被暂时隔离。
+    配置了代理池时，每个账号固定通过同一个代理发出请求。
+    """
+    def __init__(self, cookies, rate_limit=None, proxy_pool=None):
+        self.accounts = [
+            CookieAccount(cookie, rate_limit) for cookie in cookies
+        ]
+        self.proxy_pool = proxy_pool
+
+    def __len__(self):
+        return len(self.accounts)
+
+    async def acquire(self):
+        """选出一个可用账号并等待其请求额度"""
+        while True:
+            now = time.monotonic()
+            available = [a for a in self.accounts if a.is_available(now)]
+            if available:
+                break
+            wait = min(a.quarantined_until for a in self.accounts) - now
+            logger.warning(f'所有cookie均被隔离，{int(wait)}秒后继续')
+            await asyncio.sleep(wait)
+        account = min(available,
+                      key=lambda a: (a.pending, -a.health, a.requests))
+        if account.health < PROBATION_HEALTH:
+            # 隔离期满的账号以试用分数重新加入
+            account.health = PROBATION_HEALTH
+        account.pending += 1
+        try:
+            if account.bucket is not None:
+                await account.bucket.acquire()
+        except BaseException:
+            account.pending -= 1
+            raise
+        account.requests += 1
+        if self.proxy_pool is not None:
+            account.proxy = self.proxy_pool.assign(account.cookie)
+        return account
+
+    def release(self, account):
+        """请求被取消时归还账号，不影响健康分"""
+        account.pending = max(0, account.pending - 1)
+
+    def record(self, account, signal):
+        """记录账号一次请求的结果"""
+        account.pending = max(0, account.pending - 1)
+        if self.proxy_pool is not None and account.proxy is not None:
+            self.proxy_pool.record(account.proxy, signal)
+        if signal == OK:
+            account.health = min(1.0, account.health + HEALTH_REWARD)
+        elif signal == LOGIN:
+            account.health = 0.0
+            account.quarantine(LOGIN_QUARANTINE_SECONDS)
+        elif signal in HEALTH_PENALTY:
+            account.health -= HEALTH_PENALTY[signal]
+            if account.health < HEALTH_THRESHOLD:
+                account.quarantine(QUARANTINE_SECONDS)
@@ -0,0 +1,46 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from .downloader import Downloader, DownloadManifest
+from .frontier import Frontier
+from .seen_index import SeenIndex
+from .user import User
+from .writer import Writer
+
+MAX_EMPTY_PAGES = 2  # 连续的空页面超过该数时停止翻页
+
+
+@dataclass(slots=True)
+class UserCrawlContext:
+    """单个用户一次爬取过程中的全部状态，使多个用户可以并发爬取"""
+    user_config: Dict[str, str]  # 用户配置,包含用户id、since_date和end_date
+    user: User = field(default_factory=User)  # 存储爬取到的用户信息
+    new_since_date: str = ''  # 完成该用户爬取后，自动生成对应用户新的since_date
+    got_num: int = 0  # 存储爬取到的微博数
+    seen_ids: SeenIndex = field(default_factory=SeenIndex)  # 已获取的微博id
+    writers: List[Writer] = field(default_factory=list)
+    downloaders: List[Downloader] = field(default_factory=list)
+    frontier: Optional[Frontier] = None  # 增量爬取的边界，不是增量爬取时为None
+    manifest: Optional[DownloadManifest] = None  # 图片和视频的下载记录，不下载时为None
+
+
+@dataclass(slots=True)
+class PageCrawlContext:
+    """按页爬取一个用户(或其中一个时间窗口)的状态，传给每一页的PageParser
+
+    空页面计数和停止信号属于本次爬取，多个用户或时间窗口并发爬取时互不影响。
+    """
+    user_config: Dict[str, str]  # 包含user_uri以及本次爬取的since_date和end_date
+    seen_ids: SeenIndex = field(default_factory=SeenIndex)  # 已获取的微博id，同一用户的各时间窗口共用
+    empty_count: int = 0  # 连续的空页面数
+    stopped: bool = False  # 是否停止翻页
+    frontier: Optional[Frontier] = None  # 增量爬取的边界，不是增量爬取时为None
+
+    def record_page(self, has_weibo: bool) -> None:
+        """记录一页是否有微博，连续的空页面过多时停止翻页"""
+        if has_weibo:
+            self.empty_count = 0
+            return
+        self.empty_count += 1
+        if self.empty_count > MAX_EMPTY_PAGES:
+            self.stopped = True
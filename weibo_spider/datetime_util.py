@@ -1,8 +1,24 @@
-from datetime import datetime
+import re
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import List, Optional, Tuple
 
+# 标准格式的时间，可以直接按固定位置切片解析
+MINUTE_FORMAT = re.compile(r'\d{4}-\d\d-\d\d \d\d:\d\d$')
+DAY_FORMAT = re.compile(r'\d{4}-\d\d-\d\d$')
 
+
+@lru_cache(maxsize=256)
 def str_to_time(text: str) -> datetime:
-    """将字符串转换成时间类型"""
+    """将字符串转换成时间类型
+
+    since_date、end_date等同一字符串会被反复转换，结果会被缓存。
+    """
+    if MINUTE_FORMAT.match(text):
+        return datetime(int(text[0:4]), int(text[5:7]), int(text[8:10]),
+                        int(text[11:13]), int(text[14:16]))
+    if DAY_FORMAT.match(text):
+        return datetime(int(text[0:4]), int(text[5:7]), int(text[8:10]))
     if ':' in text:
         result = datetime.strptime(text, '%Y-%m-%d %H:%M')
     else:
@@ -10,6 +26,36 @@ def str_to_time(text: str) -> datetime:
     return result
 
 
+def format_time(time: datetime) -> str:
+    """将时间转换成'%Y-%m-%d %H:%M'格式的字符串"""
+    return (f'{time.year:04d}-{time.month:02d}-{time.day:02d} '
+            f'{time.hour:02d}:{time.minute:02d}')
+
+
+def parse_publish_time(text: str, now: datetime) -> Optional[datetime]:
+    """解析微博列表页中的发布时间，如"刚刚"、"5分钟前"、"今天 12:30"、
+    "05月20日 12:30"和"2023-05-20 12:30:00"
+
+    now为解析整页时取一次的当前时间，相对时间都以它为准。无法解析时返回None。
+    """
+    try:
+        if '刚刚' in text:
+            return now.replace(second=0, microsecond=0)
+        if '分钟' in text:
+            minute = int(text[:text.find('分钟')])
+            return (now - timedelta(minutes=minute)).replace(second=0,
+                                                             microsecond=0)
+        if '今天' in text:
+            return now.replace(hour=int(text[3:5]), minute=int(text[6:8]),
+                               second=0, microsecond=0)
+        if '月' in text:
+            return datetime(now.year, int(text[0:2]), int(text[3:5]),
+                            int(text[7:9]), int(text[10:12]))
+        return str_to_time(text[:16])
+    except ValueError:
+        return None
+
+
 def is_valid_date(date_str: str) -> bool:
     """判断日期格式是否正确"""
     try:
@@ -17,3 +63,29 @@ def is_valid_date(date_str: str) -> bool:
         return True
     except ValueError:
         return False
+
+
+def split_date_range(since_date: str, end_date: str,
+                     n: int) -> List[Tuple[str, str]]:
+    """将[since_date, end_date]按天分成至多n个首尾相接的时间窗口
+
+    since_date晚于end_date时没有需要获取的时间段，返回空列表。
+    """
+    start = str_to_time(since_date).date()
+    if end_date == 'now':
+        end = datetime.now().date()
+    else:
+        end = str_to_time(end_date).date()
+    if start > end:
+        return []
+    days = (end - start).days + 1
+    n = max(1, min(n, days))
+    windows = []
+    for i in range(n):
+        window_start = start + timedelta(days=days * i // n)
+        window_end = start + timedelta(days=days * (i + 1) // n - 1)
+        windows.append((window_start.strftime('%Y-%m-%d'),
+                        window_end.strftime('%Y-%m-%d')))
+    # 第一个窗口保留since_date中的时分，保证起始边界与原来一致
+    windows[0] = (since_date, windows[0][1])
+    return windows
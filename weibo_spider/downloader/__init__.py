@@ -1,10 +1,14 @@
+from .download_engine import DownloadEngine, DownloadJob
 from .downloader import Downloader
+from .img_downloader import ImgDownloader
 from .origin_picture_downloader import OriginPictureDownloader
 from .retweet_picture_downloader import RetweetPictureDownloader
 from .avatar_picture_downloader import AvatarPictureDownloader
+from .manifest import DownloadManifest
+from .media_store import MediaStore
 from .video_downloader import VideoDownloader
 
 __all__ = [
-    Downloader, OriginPictureDownloader, RetweetPictureDownloader,
-    AvatarPictureDownloader, VideoDownloader
+    DownloadEngine, DownloadJob, Downloader, ImgDownloader, OriginPictureDownloader, RetweetPictureDownloader,
+    AvatarPictureDownloader, VideoDownloader, MediaStore, DownloadManifest
 ]
@@ -1,5 +1,4 @@
-from pathlib import Path
-
+from .download_engine import DownloadJob
 from .img_downloader import ImgDownloader
 
 
@@ -15,8 +14,9 @@ class AvatarPictureDownloader(ImgDownloader):
         if not file_dir.is_dir():
             file_dir.mkdir(parents=True, exist_ok=True)
 
-        for i, url in enumerate(urls):
+        jobs = []
+        for url in urls:
             index = url.rfind('/')
-            file_name = url[index:]
-            file_path = file_dir / file_name
-            await self.download_one_file(url, file_path, 'xxx', session)
\ No newline at end of file
+            file_name = url[index + 1:]
+            jobs.append(DownloadJob(url, file_dir / file_name))
+        await self.download_jobs(jobs, session)
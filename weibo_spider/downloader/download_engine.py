@@ -0,0 +1,59 @@
+import asyncio
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+DEFAULT_DOWNLOAD_CONCURRENCY = 8
+DEFAULT_LIMIT_PER_HOST = 4
+
+
+@dataclass(slots=True)
+class DownloadJob:
+    """一个待下载的文件"""
+    url: str
+    file_path: Path
+    weibo: Optional[Any] = None  # 文件所属的微博，头像等不属于微博的文件为None
+    media_key: str = ''  # 下载成功后记录在weibo.media中的键
+
+    @property
+    def weibo_id(self):
+        return self.weibo.id if self.weibo is not None else 'xxx'
+
+
+class DownloadEngine:
+    """有界并发的文件下载引擎
+
+    待下载的文件放入队列，由worker取出下载；同时下载的文件数不超过concurrency，
+    同一域名同时下载的文件数不超过limit_per_host。两个上限由引擎的信号量控制，
+    各下载器共用一个引擎时，多次并发调用run也共享这两个上限。
+    """
+    def __init__(self, concurrency=DEFAULT_DOWNLOAD_CONCURRENCY,
+                 limit_per_host=DEFAULT_LIMIT_PER_HOST):
+        self.concurrency = max(1, concurrency)
+        self.limit_per_host = max(1, limit_per_host)
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.host_semaphores = {}
+
+    def _host_semaphore(self, url):
+        host = urlsplit(url).hostname or ''
+        if host not in self.host_semaphores:
+            self.host_semaphores[host] = asyncio.Semaphore(self.limit_per_host)
+        return self.host_semaphores[host]
+
+    async def run(self, jobs, download):
+        """用download(job)下载jobs中的全部文件，按jobs的顺序返回各文件是否下载成功"""
+        queue = asyncio.Queue()
+        for i, job in enumerate(jobs):
+            queue.put_nowait((i, job))
+        results = [False] * len(jobs)
+
+        async def worker():
+            while not queue.empty():
+                i, job = queue.get_nowait()
+                async with self._host_semaphore(job.url), self.semaphore:
+                    results[i] = await download(job)
+
+        await asyncio.gather(
+            *[worker() for _ in range(min(self.concurrency, len(jobs)))])
+        return results
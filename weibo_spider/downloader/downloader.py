@@ -1,22 +1,49 @@
 # -*- coding: UTF-8 -*-
 import asyncio
 import logging
-import sys
+import os
 import random
+import re
 from abc import ABC, abstractmethod
 from pathlib import Path
 
 import aiohttp
 from tqdm import tqdm
 
+from ..text_util import OUTPUT_ENCODING
+from .download_engine import DownloadEngine
+from .media_store import file_sha256, sinaimg_key
+
 logger = logging.getLogger('spider.downloader')
 
+CHUNK_SIZE = 64 * 1024
+PART_SUFFIX = '.part'
+CONTENT_RANGE = re.compile(r'bytes\s+(?:(\d+)-\d+|\*)/(\d+|\*)')
+# _download_part的结果
+DONE = 'done'
+INTERRUPTED = 'interrupted'
+FAILED = 'failed'
+
+
+def parse_content_range(value):
+    """解析Content-Range响应头，返回(起始位置, 文件总大小)，未知的项为None"""
+    match = CONTENT_RANGE.match(value or '')
+    if not match:
+        return None, None
+    start = int(match.group(1)) if match.group(1) else None
+    total = int(match.group(2)) if match.group(2) != '*' else None
+    return start, total
+
 
 class Downloader(ABC):
     def __init__(self, file_dir, file_download_timeout):
         self.file_dir = Path(file_dir)
         self.describe = ''
         self.key = ''
+        self.random_wait = True  # 下载前随机等待；使用全局限速器时关闭
+        self.engine = DownloadEngine()  # 多个下载器可以共用一个引擎
+        self.media_store = None  # 配置media_store_config后为各用户共用的MediaStore
+        self.manifest = None  # 该用户的DownloadManifest
         self.file_download_timeout = [5, 5, 10]
         if (isinstance(file_download_timeout, list)
                 and len(file_download_timeout) == 3):
@@ -26,46 +53,145 @@ class Downloader(ABC):
                     self.file_download_timeout[i] = v
 
     @abstractmethod
-    async def handle_download(self, urls, w, session):
-        """下载 urls 里所指向的图片或视频文件，使用 w 里的信息来生成文件名"""
+    def get_jobs(self, urls, w):
+        """返回 urls 里所指向的图片或视频文件的DownloadJob列表，使用 w 里的信息来生成文件名"""
         pass
 
+    async def handle_download(self, urls, w, session):
+        """下载 urls 里所指向的图片或视频文件"""
+        await self.download_jobs(self.get_jobs(urls, w), session)
+
+    async def download_jobs(self, jobs, session, progress=None):
+        """并发下载jobs，全部完成后按jobs的顺序把下载成功的文件记录到weibo.media"""
+        async def download(job):
+            ok = await self.download_one_file(job.url, job.file_path,
+                                              job.weibo_id, session)
+            if progress is not None:
+                progress.update(1)
+            return ok
+
+        results = await self.engine.run(jobs, download)
+        for job, ok in zip(jobs, results):
+            if ok and job.weibo is not None:
+                job.weibo.media.setdefault(job.media_key, []).append({
+                    'url': job.url,
+                    'path': job.file_path
+                })
+        return results
+
+    def _timeout(self):
+        # 建立连接的重试由HttpClient完成，file_download_timeout为[重试次数, 连接超时, 读取超时]；
+        # 不限制总时间，大文件只要持续有数据就不会被中断
+        return aiohttp.ClientTimeout(total=None,
+                                     connect=self.file_download_timeout[1],
+                                     sock_read=self.file_download_timeout[2])
+
+    async def _download_part(self, url, part_path, session):
+        """把url下载到part_path，已有部分时用Range续传
+
+        返回DONE表示下载完成，INTERRUPTED表示中途断开、可以续传，FAILED表示下载失败。
+        """
+        offset = part_path.stat().st_size if part_path.is_file() else 0
+        headers = {'Range': f'bytes={offset}-'} if offset else None
+        async with session.get(url, timeout=self._timeout(), headers=headers,
+                               retries=self.file_download_timeout[0]) as response:
+            start, total = parse_content_range(
+                response.headers.get('Content-Range'))
+            if response.status == 416 and offset:
+                if total == offset:
+                    return DONE  # 已下载的部分就是完整文件
+                part_path.unlink()
+                return INTERRUPTED
+            if response.status == 206 and offset and start == offset:
+                mode = 'ab'
+            elif response.status == 206:
+                # 返回的范围与已下载的部分对不上，删除后从头下载
+                logger.warning(f'{url}返回的Content-Range与已下载的部分不符，重新下载')
+                if part_path.is_file():
+                    part_path.unlink()
+                return INTERRUPTED
+            elif response.status == 200:
+                mode = 'wb'  # 服务器不支持Range时从头下载
+            else:
+                return FAILED
+            expected = response.content_length
+            written = 0
+            try:
+                with open(part_path, mode) as f:
+                    async for chunk in response.content.iter_chunked(
+                            CHUNK_SIZE):
+                        f.write(chunk)
+                        written += len(chunk)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f'下载{url}中断: {e!r}，将从已下载的部分继续')
+                return INTERRUPTED
+            if expected is not None and written < expected:
+                return INTERRUPTED
+            return DONE
+
+    async def _fetch(self, url, file_path, session):
+        """把url下载到file_path，失败时file_path不存在"""
+        part_path = file_path.with_name(file_path.name + PART_SUFFIX)
+        for _ in range(self.file_download_timeout[0] + 1):
+            result = await self._download_part(url, part_path, session)
+            if result == DONE:
+                os.replace(part_path, file_path)
+            if result != INTERRUPTED:
+                break
+
+    async def _file_sha256(self, file_path):
+        """在线程池中计算文件的sha256，不阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, file_sha256, file_path)
+
     async def download_one_file(self, url, file_path, weibo_id, session):
-        """下载单个文件(图片/视频)"""
+        """下载单个文件(图片/视频)
+
+        边下载边写入.part文件，内存占用与文件大小无关；中断后用Range续传，
+        下载完成后才重命名为目标文件。有下载记录时，记录中已完成的文件直接跳过，
+        下载结果也写入记录。
+        """
         try:
             file_path = Path(file_path)
-            if not file_path.is_file():
-                # 随机延时，模拟人工操作
-                await asyncio.sleep(random.uniform(0.5, 1.5))
-                
-                # Retry logic
-                retries = self.file_download_timeout[0]
-                timeout = aiohttp.ClientTimeout(
-                    connect=self.file_download_timeout[1],
-                    total=self.file_download_timeout[2]
-                )
-                
-                last_exception = None
-                for _ in range(retries + 1):
-                    try:
-                        async with session.get(url, timeout=timeout) as response:
-                            if response.status == 200:
-                                content = await response.read()
-                                with open(file_path, 'wb') as f:
-                                    f.write(content)
-                                break
-                    except Exception as e:
-                        last_exception = e
-                else:
-                    if last_exception:
-                        raise last_exception
+            if self.manifest is not None and self.manifest.is_done(file_path):
+                return True
+            blob_path = (self.media_store.lookup(url)
+                         if self.media_store is not None else None)
+            sha256 = None  # 每个文件最多计算一次，存储和下载记录共用
+            if not file_path.is_file() and blob_path is not None:
+                # 其它用户或微博已经下载过同一文件
+                self.media_store.link(blob_path, file_path)
+                if sinaimg_key(url) is None:
+                    sha256 = blob_path.stem  # 以sha256命名
+            elif not file_path.is_file():
+                if self.random_wait:
+                    # 随机延时，模拟人工操作
+                    await asyncio.sleep(random.uniform(0.5, 1.5))
 
-            return file_path.is_file()
+                await self._fetch(url, file_path, session)
+                if self.media_store is not None and file_path.is_file():
+                    if self.manifest is not None or sinaimg_key(url) is None:
+                        sha256 = await self._file_sha256(file_path)
+                    self.media_store.add(url, file_path, sha256)
+
+            ok = file_path.is_file()
+            if self.manifest is not None:
+                if ok:
+                    if sha256 is None:
+                        sha256 = await self._file_sha256(file_path)
+                    self.manifest.record_done(url, file_path, sha256,
+                                              weibo_id)
+                else:
+                    self.manifest.record_failed(url, file_path, weibo_id)
+            return ok
         except Exception as e:
-            error_file = self.file_dir / 'not_downloaded.txt'
-            with open(error_file, 'ab') as f:
-                url = f'{weibo_id}:{file_path}:{url}\n'
-                f.write(url.encode(sys.stdout.encoding))
+            if self.manifest is not None:
+                self.manifest.record_failed(url, file_path, weibo_id)
+            else:
+                error_file = self.file_dir / 'not_downloaded.txt'
+                with open(error_file, 'ab') as f:
+                    url = f'{weibo_id}:{file_path}:{url}\n'
+                    f.write(url.encode(OUTPUT_ENCODING))
             logger.exception(e)
             return False
 
@@ -73,9 +199,12 @@ class Downloader(ABC):
         """下载文件(图片/视频)"""
         try:
             logger.info(f'即将进行{self.describe}下载')
-            for w in tqdm(weibos, desc='Download progress'):
+            jobs = []
+            for w in weibos:
                 if getattr(w, self.key) != '无':
-                    await self.handle_download(getattr(w, self.key), w, session)
+                    jobs.extend(self.get_jobs(getattr(w, self.key), w))
+            with tqdm(total=len(jobs), desc='Download progress') as progress:
+                await self.download_jobs(jobs, session, progress)
             logger.info(f'{self.describe}下载完毕,保存路径:')
             logger.info(self.file_dir)
         except Exception as e:
@@ -1,5 +1,4 @@
-from pathlib import Path
-
+from .download_engine import DownloadJob
 from .downloader import Downloader
 
 
@@ -9,13 +8,14 @@ class ImgDownloader(Downloader):
         self.describe = '图片'
         self.key = ''
 
-    async def handle_download(self, urls, w, session):
-        """处理下载相关操作"""
+    def get_jobs(self, urls, w):
+        """返回一条微博中各图片的下载任务"""
         file_prefix = f"{w.publish_time[:10].replace('-', '')}_{w.id}"
         file_dir = self.file_dir / self.describe
         if not file_dir.is_dir():
             file_dir.mkdir(parents=True, exist_ok=True)
         media_key = self.key or 'original_pictures'
+        jobs = []
         if ',' in urls:
             url_list = urls.split(',')
             for i, url in enumerate(url_list):
@@ -25,13 +25,8 @@ class ImgDownloader(Downloader):
                 else:
                     file_suffix = url[index:]
                 file_name = f"{file_prefix}_{i + 1}{file_suffix}"
-                file_path = file_dir / file_name
-                ok = await self.download_one_file(url, file_path, w.id, session)
-                if ok:
-                    w.media.setdefault(media_key, []).append({
-                        'url': url,
-                        'path': file_path
-                    })
+                jobs.append(DownloadJob(url, file_dir / file_name, w,
+                                        media_key))
         else:
             index = urls.rfind('.')
             if len(urls) - index > 5:
@@ -39,10 +34,5 @@ class ImgDownloader(Downloader):
             else:
                 file_suffix = urls[index:]
             file_name = f"{file_prefix}{file_suffix}"
-            file_path = file_dir / file_name
-            ok = await self.download_one_file(urls, file_path, w.id, session)
-            if ok:
-                w.media.setdefault(media_key, []).append({
-                    'url': urls,
-                    'path': file_path
-                })
+            jobs.append(DownloadJob(urls, file_dir / file_name, w, media_key))
+        return jobs
@@ -0,0 +1,113 @@
+import json
+import logging
+import os
+from pathlib import Path
+
+from .media_store import file_sha256
+
+logger = logging.getLogger('spider.manifest')
+
+DONE = 'done'
+FAILED = 'failed'
+
+
+class DownloadManifest:
+    """一个用户已下载和下载失败的图片、视频的记录
+
+    每个文件一行json，记录url、相对于记录文件所在目录的路径、大小、sha256和状态，
+    追加写入，同一路径以最后一行为准。爬取时按记录判断文件是否已下载，不需要逐个
+    检查文件；retry_downloads按记录核对文件并重新下载失败的文件。
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.base_dir = self.path.parent
+        self.entries = {}  # 相对路径 -> 记录
+        self.line_count = 0
+        if self.path.is_file():
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.entries[entry['path']] = entry
+                    self.line_count += 1
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def _key(self, file_path):
+        return Path(os.path.relpath(file_path, self.base_dir)).as_posix()
+
+    def file_path(self, entry):
+        return self.base_dir / entry['path']
+
+    def is_done(self, file_path):
+        entry = self.entries.get(self._key(file_path))
+        return entry is not None and entry['status'] == DONE
+
+    def failed(self):
+        return [e for e in self.entries.values() if e['status'] == FAILED]
+
+    def _write(self, entry):
+        self.entries[entry['path']] = entry
+        self.file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.file.flush()
+        self.line_count += 1
+
+    def record_done(self, url, file_path, sha256, weibo_id=''):
+        """记录下载完成的文件，sha256由调用者计算，避免同一文件重复计算"""
+        file_path = Path(file_path)
+        self._write({
+            'url': url,
+            'path': self._key(file_path),
+            'weibo_id': weibo_id,
+            'size': file_path.stat().st_size,
+            'sha256': sha256,
+            'status': DONE
+        })
+
+    def record_failed(self, url, file_path, weibo_id=''):
+        """记录下载失败的文件，之后可以用retry_downloads重新下载"""
+        self._write({
+            'url': url,
+            'path': self._key(file_path),
+            'weibo_id': weibo_id,
+            'size': None,
+            'sha256': None,
+            'status': FAILED
+        })
+
+    def verify(self, media_store=None, check_hash=True):
+        """核对已下载的文件，缺失或内容不符的改记为下载失败，返回其数量
+
+        使用media_store时，用户目录中的文件是存储中文件的硬链接，内容不符时
+        存储中的文件也一并删除，重新下载时不会再链接到损坏的文件。
+        """
+        count = 0
+        for entry in list(self.entries.values()):
+            if entry['status'] != DONE:
+                continue
+            file_path = self.file_path(entry)
+            ok = (file_path.is_file()
+                  and file_path.stat().st_size == entry['size']
+                  and (not check_hash or file_sha256(file_path) == entry['sha256']))
+            if not ok:
+                logger.warning(f'{file_path}缺失或不完整，将重新下载')
+                if media_store is not None:
+                    media_store.discard(entry['url'], entry['size'],
+                                        entry['sha256'])
+                if file_path.is_file():
+                    file_path.unlink()
+                self.record_failed(entry['url'], file_path,
+                                   entry.get('weibo_id', ''))
+                count += 1
+        return count
+
+    def close(self):
+        self.file.close()
+        # 重复的记录过多时只保留每个文件的最后一条
+        if self.line_count > 2 * len(self.entries):
+            tmp_path = self.path.with_name(self.path.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for entry in self.entries.values():
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            os.replace(tmp_path, self.path)
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+from pathlib import Path
+from urllib.parse import urlsplit
+
+logger = logging.getLogger('spider.media_store')
+
+BLOB_DIR = 'blobs'
+INDEX_FILE = 'index.jsonl'
+# 新浪图床的图片地址形如/large/<图片key>.jpg，wx1~wx4等域名返回相同的文件
+SINAIMG_PATH = re.compile(r'^/([\w.]+)/([0-9A-Za-z]+)(\.\w+)$')
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def sinaimg_key(url):
+    """返回新浪图床图片的key(尺寸_图片key.扩展名)，其它url返回None"""
+    parts = urlsplit(url)
+    if not (parts.hostname or '').endswith('sinaimg.cn'):
+        return None
+    match = SINAIMG_PATH.match(parts.path)
+    if not match:
+        return None
+    return f'{match.group(1)}_{match.group(2)}{match.group(3)}'
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class MediaStore:
+    """按内容寻址的图片和视频存储，所有用户共用
+
+    每个文件只在blobs中保存一份，新浪图床的图片以图片key命名，其它文件以内容的
+    sha256命名；各用户目录中的文件是指向它的硬链接，不支持硬链接时复制一份。
+    index.jsonl记录url对应的文件，再次遇到同一url或同一图片时直接链接，不发出请求。
+    """
+    def __init__(self, store_dir):
+        self.store_dir = Path(store_dir)
+        self.blob_dir = self.store_dir / BLOB_DIR
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.store_dir / INDEX_FILE
+        self.blobs = {}  # url -> blob名
+        if self.index_path.is_file():
+            with open(self.index_path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.blobs[entry['url']] = entry['blob']
+        self.index_file = open(self.index_path, 'a', encoding='utf-8')
+
+    def _blob_path(self, name):
+        # 新浪图床图片的文件名以尺寸开头，按其后的图片key分目录
+        return self.blob_dir / name.rsplit('_', 1)[-1][:2] / name
+
+    def lookup(self, url):
+        """返回url对应的已保存文件，没有时返回None"""
+        name = sinaimg_key(url) or self.blobs.get(url)
+        if name is None:
+            return None
+        path = self._blob_path(name)
+        return path if path.is_file() else None
+
+    def link(self, src, dst):
+        """在dst创建指向src的硬链接"""
+        tmp_path = dst.with_name(dst.name + '.link')
+        if tmp_path.exists():
+            tmp_path.unlink()
+        try:
+            os.link(src, tmp_path)
+        except OSError:
+            # 跨分区或文件系统不支持硬链接
+            shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dst)
+
+    def add(self, url, file_path, sha256=None):
+        """把刚下载的file_path保存到存储中，内容相同的文件只保存一份
+
+        不是新浪图床的图片时按sha256识别，在异步代码中调用时应先在线程池中
+        计算好sha256再传入，避免阻塞事件循环。
+        """
+        file_path = Path(file_path)
+        name = sinaimg_key(url)
+        if name is None:
+            name = (sha256 or file_sha256(file_path)) + file_path.suffix
+            if self.blobs.get(url) != name:
+                self.blobs[url] = name
+                self.index_file.write(json.dumps(
+                    {'url': url, 'blob': name}, ensure_ascii=False) + '\n')
+                self.index_file.flush()
+        blob_path = self._blob_path(name)
+        if blob_path.is_file():
+            self.link(blob_path, file_path)
+        else:
+            blob_path.parent.mkdir(exist_ok=True)
+            self.link(file_path, blob_path)
+
+    def discard(self, url, size, sha256):
+        """url对应的已保存文件与记录的大小或sha256不符时删除，返回是否删除"""
+        blob_path = self.lookup(url)
+        if blob_path is None:
+            return False
+        if (blob_path.stat().st_size == size
+                and file_sha256(blob_path) == sha256):
+            return False
+        logger.warning(f'{blob_path}内容不完整，已删除')
+        blob_path.unlink()
+        return True
+
+    def close(self):
+        self.index_file.close()
@@ -1,23 +1,144 @@
-from pathlib import Path
+import asyncio
+import json
+import logging
+import os
 
-from .downloader import Downloader
+import aiohttp
+
+from .download_engine import DownloadJob
+from .downloader import (CHUNK_SIZE, PART_SUFFIX, Downloader,
+                         parse_content_range)
+
+logger = logging.getLogger('spider.video_downloader')
+
+# 每段至少这么大，小于两段的视频仍用一个请求下载
+MIN_SEGMENT_SIZE = 16 * 1024 * 1024
+SEGMENT_SUFFIX = '.seg'
+STATE_SUFFIX = '.seg.json'  # 各段的下载进度
 
 
 class VideoDownloader(Downloader):
-    def __init__(self, file_dir, file_download_timeout):
+    def __init__(self, file_dir, file_download_timeout, segments=1):
         super().__init__(file_dir, file_download_timeout)
         self.describe = '视频'
         self.key = 'video_url'
+        self.segments = max(1, segments)  # 大视频分成几段并发下载，1表示不分段
 
-    async def handle_download(self, urls, w, session):
-        """处理下载相关操作"""
+    def get_jobs(self, urls, w):
+        """返回一条微博中视频的下载任务"""
         file_prefix = f"{w.publish_time[:10].replace('-', '')}_{w.id}"
         file_suffix = '.mp4'
         file_name = f"{file_prefix}{file_suffix}"
-        file_path = self.file_dir / file_name
-        ok = await self.download_one_file(urls, file_path, w.id, session)
-        if ok:
-            w.media.setdefault('video', []).append({
-                'url': urls,
-                'path': file_path
-            })
+        return [DownloadJob(urls, self.file_dir / file_name, w, 'video')]
+
+    async def _fetch(self, url, file_path, session):
+        """视频足够大且服务器支持Range时分段并发下载，否则用一个请求下载"""
+        if self.segments > 1:
+            size = await self._probe_size(url, session)
+            count = min(self.segments, (size or 0) // MIN_SEGMENT_SIZE)
+            if count > 1:
+                await self._fetch_segments(url, file_path, size, count,
+                                           session)
+                return
+        await super()._fetch(url, file_path, session)
+
+    async def _probe_size(self, url, session):
+        """请求第一个字节，返回文件大小；服务器不支持Range时返回None"""
+        try:
+            async with session.get(url, timeout=self._timeout(),
+                                   headers={'Range': 'bytes=0-0'},
+                                   retries=self.file_download_timeout[0]) as response:
+                if response.status != 206:
+                    return None
+                return parse_content_range(
+                    response.headers.get('Content-Range'))[1]
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f'获取{url}的大小失败: {e!r}')
+            return None
+
+    def _load_segments(self, seg_path, state_path, part_path, size, count):
+        """返回各段的[起始位置, 结束位置, 已下载到的位置]
+
+        上次分段下载中断时从.seg.json恢复各段的进度；只有单个请求下载的.part时，
+        把它作为.seg文件的开头，已下载的部分不再重新下载。
+        """
+        if seg_path.is_file() and state_path.is_file():
+            try:
+                with open(state_path, encoding='utf-8') as f:
+                    state = json.load(f)
+                if (state['size'] == size
+                        and seg_path.stat().st_size == size):
+                    return state['segments']
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logger.warning(f'读取分段下载进度{state_path}失败: {e!r}')
+        downloaded = 0
+        if part_path.is_file() and part_path.stat().st_size <= size:
+            downloaded = part_path.stat().st_size
+            part_path.replace(seg_path)
+        with open(seg_path, 'ab' if downloaded else 'wb') as f:
+            f.truncate(size)
+        bounds = [size * i // count for i in range(count + 1)]
+        return [[bounds[i], bounds[i + 1] - 1,
+                 min(max(downloaded, bounds[i]), bounds[i + 1])]
+                for i in range(count)]
+
+    async def _fetch_segments(self, url, file_path, size, count, session):
+        """把文件分成count段并发下载，写入预先分配好大小的文件的对应位置
+
+        各段的进度保存在.seg.json中，中断后下次运行只下载未完成的部分。
+        """
+        seg_path = file_path.with_name(file_path.name + SEGMENT_SUFFIX)
+        state_path = file_path.with_name(file_path.name + STATE_SUFFIX)
+        part_path = file_path.with_name(file_path.name + PART_SUFFIX)
+        segments = self._load_segments(seg_path, state_path, part_path, size,
+                                       count)
+        try:
+            results = await asyncio.gather(*[
+                self._download_segment(url, seg_path, segment, session)
+                for segment in segments
+            ])
+        finally:
+            # 被取消或出错时也保存已下载的进度
+            tmp_path = state_path.with_name(state_path.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'size': size, 'segments': segments}, f)
+            os.replace(tmp_path, state_path)
+        if all(results):
+            seg_path.replace(file_path)
+            state_path.unlink()
+            if part_path.is_file():
+                part_path.unlink()
+
+    async def _download_segment(self, url, seg_path, segment, session):
+        """下载segment中[起始位置, 结束位置]的字节，随下载更新segment中的已下载位置
+
+        中途断开时从已下载的位置继续；建立连接的重试由HttpClient完成，失败时不再重试。
+        返回是否下载完整。
+        """
+        start, end, _ = segment
+        for _ in range(self.file_download_timeout[0] + 1):
+            pos = segment[2]
+            if pos > end:
+                return True
+            try:
+                async with session.get(url, timeout=self._timeout(),
+                                       headers={'Range': f'bytes={pos}-{end}'},
+                                       retries=self.file_download_timeout[0]) as response:
+                    if (response.status != 206 or parse_content_range(
+                            response.headers.get('Content-Range'))[0] != pos):
+                        return False
+                    try:
+                        with open(seg_path, 'r+b') as f:
+                            f.seek(pos)
+                            async for chunk in response.content.iter_chunked(
+                                    CHUNK_SIZE):
+                                chunk = chunk[:end + 1 - segment[2]]
+                                f.write(chunk)
+                                segment[2] += len(chunk)
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        logger.warning(
+                            f'下载{url}的{start}-{end}字节中断: {e!r}，将从已下载的位置继续')
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f'下载{url}的{start}-{end}字节失败: {e!r}')
+                return False
+        return segment[2] > end
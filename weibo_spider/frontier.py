@@ -0,0 +1,65 @@
+import json
+import logging
+import os
+from pathlib import Path
+
+logger = logging.getLogger('spider.frontier')
+
+
+class Frontier:
+    """增量爬取的边界：上次成功爬取到的最新微博mid，以及置顶微博的mid
+
+    mid不大于newest_mid的微博已经保存过，翻页遇到它们即可停止；置顶微博发布时间早
+    却排在第一页最前面，是例外，遇到时跳过而不是停止。本次运行获取到的最新mid先记在
+    crawled_mid中，该用户爬取成功完成后save才会更新边界，中途失败时下次仍从原来的
+    边界继续。
+    """
+    def __init__(self, path=None):
+        self.path = Path(path) if path is not None else None
+        self.newest_mid = 0
+        self.pinned = set()
+        self.crawled_mid = 0
+        if self.path is not None and self.path.is_file():
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    data = json.load(f)
+                self.newest_mid = int(data.get('newest_mid', 0))
+                self.pinned = set(data.get('pinned', []))
+            except (OSError, ValueError, TypeError) as e:
+                logger.warning(f'读取增量爬取边界{self.path}失败: {e}')
+        self.crawled_mid = self.newest_mid
+        self.aborted = False
+
+    def is_known(self, mid):
+        """mid对应的微博是否在上次的边界以内"""
+        return mid is not None and mid <= self.newest_mid
+
+    def is_pinned(self, mid):
+        return mid in self.pinned
+
+    def observe(self, mid, pinned=False):
+        """记录本次获取到的微博"""
+        if mid is None:
+            return
+        if pinned:
+            self.pinned.add(mid)
+        elif mid > self.crawled_mid:
+            self.crawled_mid = mid
+
+    def abort(self):
+        """爬取中途出错或有页面获取失败，本次运行不更新边界"""
+        self.aborted = True
+
+    def save(self):
+        """爬取成功完成后更新并保存边界"""
+        if self.aborted:
+            logger.warning('本次爬取中途出错，不更新增量爬取的边界')
+            return
+        self.newest_mid = self.crawled_mid
+        if self.path is None:
+            return
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'newest_mid': self.newest_mid,
+                       'pinned': sorted(self.pinned)}, f)
+        os.replace(tmp_path, self.path)
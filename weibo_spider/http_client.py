@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import random
+import time
+
+import aiohttp
+
+logger = logging.getLogger('spider.http_client')
+
+# 需要重试的HTTP状态码
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+DEFAULT_HTTP_CONFIG = {
+    'limit': 100,  # 连接池总连接数
+    'limit_per_host': 10,  # 单个域名的连接数
+    'ttl_dns_cache': 300,  # DNS缓存时间(秒)
+    'keepalive_timeout': 30,  # 空闲连接保持时间(秒)
+    'connect_timeout': 10,  # 建立连接的超时时间(秒)
+    'read_timeout': 30,  # 两次读取数据之间的超时时间(秒)
+    'total_timeout': 60,  # 单次请求的总超时时间(秒)
+    'retries': 3,  # 网络错误、429和5xx的最大重试次数
+    'backoff_base': 1,  # 指数退避的初始等待时间(秒)
+    'backoff_max': 30,  # 指数退避的最大等待时间(秒)
+    'memo_ttl': 60,  # 同一页面在多长时间内直接复用上次的结果(秒)，0表示只合并并发请求
+}
+# 允许为0的配置项
+ZERO_ALLOWED = ('retries', 'memo_ttl')
+# 必须为整数的配置项
+INT_KEYS = ('limit', 'limit_per_host', 'retries')
+MAX_MEMO_ENTRIES = 256
+
+
+def backoff_delay(attempt, base, cap):
+    """第attempt次重试前的等待时间：指数退避加全抖动"""
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+class SingleFlight:
+    """合并对同一key的并发请求，并在ttl秒内复用成功的结果
+
+    同一时刻只有一个请求真正发出，其余调用者等待并共享它的结果。某个调用者被取消
+    时不影响其它调用者，所有调用者都被取消时请求本身也被取消。
+    """
+    def __init__(self, ttl, max_entries=MAX_MEMO_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.inflight = {}
+        self.waiters = {}  # 请求 -> 等待它的调用者数
+        self.memo = {}  # key -> (过期时间, 结果)
+
+    async def do(self, key, fn, cacheable=None):
+        """返回fn()的结果；cacheable(结果)为真时才缓存，默认缓存非None的结果"""
+        cached = self.memo.get(key)
+        if cached is not None:
+            if cached[0] > time.monotonic():
+                return cached[1]
+            del self.memo[key]
+        future = self.inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self.inflight[key] = future
+            future.add_done_callback(
+                lambda f: self._done(key, f, cacheable))
+        self.waiters[future] = self.waiters.get(future, 0) + 1
+        try:
+            # 某个调用者被取消时不影响其它等待同一请求的调用者
+            return await asyncio.shield(future)
+        finally:
+            self.waiters[future] -= 1
+            if not self.waiters[future]:
+                del self.waiters[future]
+                if not future.done():
+                    # 没有调用者在等待，取消请求并等它结束，不留下未完成的任务
+                    future.cancel()
+                    await asyncio.wait([future])
+
+    def _done(self, key, future, cacheable):
+        self.inflight.pop(key, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        result = future.result()
+        ok = cacheable(result) if cacheable else result is not None
+        if ok and self.ttl > 0:
+            self.memo[key] = (time.monotonic() + self.ttl, result)
+            while len(self.memo) > self.max_entries:
+                self.memo.pop(next(iter(self.memo)))
+
+
+class _RetryingRequest:
+    """session.get/post返回的异步上下文管理器，进入时按需重试"""
+    def __init__(self, client, method, url, retries, kwargs):
+        self.client = client
+        self.method = method
+        self.url = url
+        self.retries = retries
+        self.kwargs = kwargs
+        self.response = None
+
+    async def __aenter__(self):
+        config = self.client.config
+        for attempt in range(self.retries + 1):
+            try:
+                self.response = await self.client.session.request(
+                    self.method, self.url, **self.kwargs)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt >= self.retries:
+                    raise
+                logger.warning(f'请求{self.url}出错: {e!r}，准备重试')
+            else:
+                if (self.response.status not in RETRY_STATUSES
+                        or attempt >= self.retries):
+                    return self.response
+                logger.warning(
+                    f'请求{self.url}返回{self.response.status}，准备重试')
+                self.response.release()
+            await asyncio.sleep(
+                backoff_delay(attempt, config['backoff_base'],
+                              config['backoff_max']))
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.response is not None:
+            self.response.release()
+
+
+class HttpClient:
+    """统一的异步HTTP客户端
+
+    所有页面、接口和文件请求共用一个连接池，开启keep-alive和DNS缓存；
+    每个请求都有超时时间，网络错误、429和5xx按指数退避加随机抖动重试。
+    single_flight供页面请求合并重复的url，response_cache为页面和接口的磁盘缓存，
+    page_archive保存所有从网络获取的页面。
+    用法与aiohttp.ClientSession相同：async with client.get(url) as resp。
+    """
+    def __init__(self, http_config=None, trace_configs=None, connector=None,
+                 response_cache=None, page_archive=None):
+        self.config = dict(DEFAULT_HTTP_CONFIG)
+        if http_config:
+            self.config.update(http_config)
+        self.trace_configs = list(trace_configs or [])
+        self.single_flight = SingleFlight(self.config['memo_ttl'])
+        self.response_cache = response_cache
+        self.page_archive = page_archive
+        if connector is None:
+            connector = aiohttp.TCPConnector(
+                limit=self.config['limit'],
+                limit_per_host=self.config['limit_per_host'],
+                ttl_dns_cache=self.config['ttl_dns_cache'],
+                keepalive_timeout=self.config['keepalive_timeout'])
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(
+                total=self.config['total_timeout'],
+                connect=self.config['connect_timeout'],
+                sock_read=self.config['read_timeout']),
+            trace_configs=self.trace_configs)
+
+    def request(self, method, url, retries=None, **kwargs):
+        """发出请求，retries为None时使用配置的重试次数"""
+        if retries is None:
+            retries = self.config['retries']
+        return _RetryingRequest(self, method, url, retries, kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    async def close(self):
+        await self.session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
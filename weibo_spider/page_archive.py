@@ -0,0 +1,223 @@
+import json
+import logging
+import lzma
+import re
+import sys
+import time
+import zlib
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger('spider.page_archive')
+
+ARCHIVE_CODECS = ('zstd', 'zlib', 'lzma')
+DATA_FILE = 'pages.dat'
+INDEX_FILE = 'index.jsonl'
+# 用前DICT_SAMPLES个页面训练zstd字典，之后的页面都用该字典压缩
+DICT_SAMPLES = 100
+DICT_SIZE = 112640
+ZSTD_LEVEL = 10
+PROFILE_PATH = re.compile(r'^/([^/]+)/profile$')
+
+
+class ArchiveMiss(Exception):
+    """重新解析时归档中没有该url"""
+
+
+def _import_zstd():
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+
+def profile_page(url):
+    """返回微博列表页url对应的(user_uri, page)，主页的page为0，其它url返回None"""
+    parts = urlsplit(url)
+    match = PROFILE_PATH.match(parts.path)
+    if not match:
+        return None
+    page = parse_qs(parts.query).get('page', ['0'])[0]
+    return match.group(1), int(page) if page.isdigit() else 0
+
+
+class PageArchive:
+    """压缩保存爬取过的原始页面，用于不重新爬取而重新解析
+
+    页面压缩后追加写入pages.dat，index.jsonl记录每个url的位置，微博列表页
+    额外记录所属用户和页码。zstd需要安装zstandard，会用最先归档的页面训练
+    字典，微博页面结构高度重复，使用字典后压缩率明显提高；未安装时使用zlib。
+    """
+    def __init__(self, archive_dir, codec=None):
+        self.archive_dir = Path(archive_dir)
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        self.zstd = _import_zstd()
+        if codec is None:
+            codec = 'zstd' if self.zstd else 'zlib'
+        elif codec == 'zstd' and self.zstd is None:
+            logger.warning(
+                '系统中可能没有安装zstandard库，请先运行 pip install zstandard ，再运行程序')
+            sys.exit()
+        self.codec = codec
+        self.entries = {}  # url -> 索引记录
+        self.dicts = {}  # 字典id -> zstd字典
+        self.dict_id = None  # 当前用于压缩的字典id
+        self.samples = []
+        self.data_path = self.archive_dir / DATA_FILE
+        self.index_path = self.archive_dir / INDEX_FILE
+        self._load()
+        self.data_file = open(self.data_path, 'ab')
+        self.index_file = open(self.index_path, 'a', encoding='utf-8')
+
+    def _load(self):
+        data_size = (self.data_path.stat().st_size
+                     if self.data_path.is_file() else 0)
+        if self.index_path.is_file():
+            with open(self.index_path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    # 忽略数据没有完整写入的记录
+                    if entry['offset'] + entry['size'] <= data_size:
+                        self.entries.pop(entry['url'], None)
+                        self.entries[entry['url']] = entry
+        for path in sorted(self.archive_dir.glob('dict-*.zstd')):
+            self.dict_id = path.stem[len('dict-'):]
+        if self.dict_id is not None and self.zstd is None:
+            self.dict_id = None
+
+    def _get_dict(self, dict_id):
+        if dict_id not in self.dicts:
+            path = self.archive_dir / f'dict-{dict_id}.zstd'
+            self.dicts[dict_id] = self.zstd.ZstdCompressionDict(
+                path.read_bytes())
+        return self.dicts[dict_id]
+
+    def _train_dict(self):
+        """用已收集的页面训练zstd字典"""
+        try:
+            zstd_dict = self.zstd.train_dictionary(DICT_SIZE, self.samples)
+        except Exception as e:
+            logger.warning(f'训练zstd字典失败: {e}')
+            self.samples = []
+            return
+        dict_id = str(zstd_dict.dict_id())
+        (self.archive_dir / f'dict-{dict_id}.zstd').write_bytes(
+            zstd_dict.as_bytes())
+        self.dicts[dict_id] = zstd_dict
+        self.dict_id = dict_id
+        self.samples = []
+        logger.info(f'已训练页面压缩字典{dict_id}')
+
+    def _compress(self, content):
+        if self.codec == 'zstd':
+            if self.dict_id is None:
+                self.samples.append(content)
+                if len(self.samples) >= DICT_SAMPLES:
+                    self._train_dict()
+            if self.dict_id is not None:
+                compressor = self.zstd.ZstdCompressor(
+                    level=ZSTD_LEVEL, dict_data=self._get_dict(self.dict_id))
+                return compressor.compress(content), self.dict_id
+            return self.zstd.ZstdCompressor(
+                level=ZSTD_LEVEL).compress(content), None
+        if self.codec == 'lzma':
+            return lzma.compress(content), None
+        return zlib.compress(content, 9), None
+
+    def _decompress(self, entry, data):
+        codec = entry['codec']
+        if codec == 'zstd':
+            if self.zstd is None:
+                raise RuntimeError('读取zstd压缩的页面需要安装zstandard')
+            if entry.get('dict'):
+                decompressor = self.zstd.ZstdDecompressor(
+                    dict_data=self._get_dict(entry['dict']))
+            else:
+                decompressor = self.zstd.ZstdDecompressor()
+            return decompressor.decompress(data)
+        if codec == 'lzma':
+            return lzma.decompress(data)
+        return zlib.decompress(data)
+
+    def add(self, url, content):
+        """归档url的页面"""
+        data, dict_id = self._compress(content)
+        offset = self.data_file.tell()
+        self.data_file.write(data)
+        self.data_file.flush()
+        entry = {
+            'url': url,
+            'codec': self.codec,
+            'dict': dict_id,
+            'offset': offset,
+            'size': len(data),
+            'time': time.time(),
+        }
+        page = profile_page(url)
+        if page is not None:
+            entry['user'], entry['page'] = page
+        self.entries.pop(url, None)
+        self.entries[url] = entry
+        self.index_file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.index_file.flush()
+
+    def read(self, url):
+        """返回url归档的页面，没有时返回None"""
+        entry = self.entries.get(url)
+        if entry is None:
+            return None
+        with open(self.data_path, 'rb') as f:
+            f.seek(entry['offset'])
+            data = f.read(entry['size'])
+        return self._decompress(entry, data)
+
+    def users(self):
+        """返回归档中有微博列表页的用户"""
+        return list(dict.fromkeys(
+            e['user'] for e in self.entries.values() if 'user' in e))
+
+    def pages(self, user_uri):
+        """返回用户归档的微博列表页url，按归档顺序排列，不含主页"""
+        return [
+            e['url'] for e in self.entries.values()
+            if e.get('user') == user_uri and e['page'] > 0
+        ]
+
+    def close(self):
+        self.data_file.close()
+        self.index_file.close()
+
+
+class _ArchiveResponse:
+    def __init__(self, url, content):
+        self.url = url
+        self.content = content
+        self.status = 200
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return None
+
+    async def read(self):
+        return self.content
+
+    async def json(self, content_type=None):
+        return json.loads(self.content)
+
+
+class ArchiveSession:
+    """从归档读取页面的session，供重新解析使用，不发出网络请求"""
+    def __init__(self, archive):
+        self.archive = archive
+
+    def get(self, url, **kwargs):
+        content = self.archive.read(url)
+        if content is None:
+            raise ArchiveMiss(url)
+        return _ArchiveResponse(url, content)
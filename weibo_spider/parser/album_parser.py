@@ -3,10 +3,12 @@ from .util import handle_html
 
 
 class AlbumParser(Parser):
-    def __init__(self, cookie, album_url):
+    def __init__(self, cookie, album_url, selector=None, defer_fetch=False):
         self.cookie = cookie
         self.url = album_url
-        self.selector = handle_html(self.cookie, self.url)
+        self.selector = selector
+        if self.selector is None and not defer_fetch:
+            self.selector = handle_html(self.cookie, self.url)
 
     def extract_pic_urls(self):
         # <img src="http://wx2.sinaimg.cn/wap180/76102133ly8fwr33wpn8fj20v90v9tbw.jpg" alt="" class="c">
@@ -16,3 +18,8 @@ class AlbumParser(Parser):
                 pic = pic[:pic.index("?")]
             pic_list[i] = pic
         return pic_list
+
+    async def extract_pic_urls_async(self, session):
+        if self.selector is None:
+            await self.fetch_async(session)
+        return self.extract_pic_urls()
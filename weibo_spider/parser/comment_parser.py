@@ -1,11 +1,9 @@
 import logging
-import random
-import requests
 import re
 from time import sleep
-from lxml.html import tostring
 from lxml.html import fromstring
 from lxml import etree
+from ..http_client import DEFAULT_HTTP_CONFIG, backoff_delay
 from .parser import Parser
 from .util import handle_garbled, handle_html
 
@@ -13,31 +11,64 @@ logger = logging.getLogger('spider.comment_parser')
 
 
 class CommentParser(Parser):
-    def __init__(self, cookie, weibo_id):
+    def __init__(self, cookie, weibo_id, selector=None, defer_fetch=False):
         self.cookie = cookie
         self.url = 'https://weibo.cn/comment/' + weibo_id
-        self.selector = handle_html(self.cookie, self.url)
+        self.selector = selector
+        if self.selector is None and not defer_fetch:
+            self.selector = handle_html(self.cookie, self.url)
+
+    def _extract_long_weibo(self):
+        """从评论页中提取长微博内容"""
+        info_div = self.selector.xpath("//div[@class='c' and @id='M_']")[0]
+        info_span = info_div.xpath("//span[@class='ctt']")[0]
+        # 1. 获取 info_span 中的所有 HTML 代码作为字符串
+        html_string = etree.tostring(info_span, encoding='unicode', method='html')
+        # 2. 将 <br> 替换为 \n
+        html_string = html_string.replace('<br>', '\n')
+        # 3. 去掉所有 HTML 标签，但保留标签内的有效文本
+        new_content = fromstring(html_string).text_content()
+        # 4. 替换多个连续的 \n 为一个 \n
+        new_content = re.sub(r'\n+\s*', '\n', new_content)
+        return handle_garbled(new_content)
+
+    def _extract_video_page_url(self):
+        """从评论页中提取微博视频页面的链接"""
+        video_url = ''
+        # 来自微博视频号的格式与普通格式不一致，不加 span 层级
+        links = self.selector.xpath("body/div[@class='c' and @id][1]/div//a")
+        for a in links:
+            if 'm.weibo.cn/s/video/show?object_id=' in a.xpath('@href')[0]:
+                video_url = a.xpath('@href')[0]
+                break
+        return video_url
 
     def get_long_weibo(self):
         """获取长原创微博"""
         try:
-            for i in range(5):
+            # 与异步请求使用相同的重试次数和指数退避
+            retries = DEFAULT_HTTP_CONFIG['retries']
+            for attempt in range(retries + 1):
                 self.selector = handle_html(self.cookie, self.url)
                 if self.selector is not None:
-                    info_div = self.selector.xpath("//div[@class='c' and @id='M_']")[0]
-                    info_span = info_div.xpath("//span[@class='ctt']")[0]
-                    # 1. 获取 info_span 中的所有 HTML 代码作为字符串
-                    html_string = etree.tostring(info_span, encoding='unicode', method='html')
-                    # 2. 将 <br> 替换为 \n
-                    html_string = html_string.replace('<br>', '\n')
-                    # 3. 去掉所有 HTML 标签，但保留标签内的有效文本
-                    new_content = fromstring(html_string).text_content()
-                    # 4. 替换多个连续的 \n 为一个 \n
-                    new_content = re.sub(r'\n+\s*', '\n', new_content)
-                    weibo_content = handle_garbled(new_content)
+                    weibo_content = self._extract_long_weibo()
                     if weibo_content is not None:
                         return weibo_content
-                sleep(random.randint(6, 10))
+                if attempt < retries:
+                    sleep(backoff_delay(attempt,
+                                        DEFAULT_HTTP_CONFIG['backoff_base'],
+                                        DEFAULT_HTTP_CONFIG['backoff_max']))
+        except Exception:
+            logger.exception(u'网络出错')
+
+    async def get_long_weibo_async(self, session):
+        """异步获取长原创微博"""
+        try:
+            # 网络错误由session重试
+            if self.selector is None:
+                await self.fetch_async(session)
+            if self.selector is not None:
+                return self._extract_long_weibo()
         except Exception:
             logger.exception(u'网络出错')
 
@@ -45,19 +76,30 @@ class CommentParser(Parser):
         """获取长转发微博"""
         return self.get_long_weibo()
 
+    async def get_long_retweet_async(self, session):
+        """异步获取长转发微博"""
+        return await self.get_long_weibo_async(session)
+
     def get_video_page_url(self):
         """获取微博视频页面的链接"""
         video_url = ''
         try:
             self.selector = handle_html(self.cookie, self.url)
             if self.selector is not None:
-                # 来自微博视频号的格式与普通格式不一致，不加 span 层级
-                links = self.selector.xpath("body/div[@class='c' and @id][1]/div//a")
-                for a in links:
-                    if 'm.weibo.cn/s/video/show?object_id=' in a.xpath(
-                            '@href')[0]:
-                        video_url = a.xpath('@href')[0]
-                        break
+                video_url = self._extract_video_page_url()
+        except Exception:
+            logger.exception(u'网络出错')
+
+        return video_url
+
+    async def get_video_page_url_async(self, session):
+        """异步获取微博视频页面的链接"""
+        video_url = ''
+        try:
+            if self.selector is None:
+                await self.fetch_async(session)
+            if self.selector is not None:
+                video_url = self._extract_video_page_url()
         except Exception:
             logger.exception(u'网络出错')
 
@@ -1,5 +1,4 @@
 import logging
-import sys
 
 from ..user import User
 from .parser import Parser
@@ -9,10 +8,12 @@ logger = logging.getLogger('spider.info_parser')
 
 
 class InfoParser(Parser):
-    def __init__(self, cookie, user_id, selector=None):
+    def __init__(self, cookie, user_id, selector=None, defer_fetch=False):
         self.cookie = cookie
         self.url = f'https://weibo.cn/{user_id}/info'
-        self.selector = selector if selector is not None else handle_html(self.cookie, self.url)
+        self.selector = selector
+        if self.selector is None and not defer_fetch:
+            self.selector = handle_html(self.cookie, self.url)
 
     def extract_user_info(self):
         """提取用户信息"""
@@ -22,7 +23,7 @@ class InfoParser(Parser):
             nickname = nickname[:-3]
             if nickname == '登录 - 新' or nickname == '新浪':
                 logger.warning('cookie错误或已过期,请按照README中方法重新获取')
-                sys.exit()
+                return None
             user.nickname = nickname
 
             basic_info = self.selector.xpath("//div[@class='c'][3]/text()")
@@ -53,3 +54,9 @@ class InfoParser(Parser):
             return user
         except Exception as e:
             logger.exception(e)
+
+    async def extract_user_info_async(self, session):
+        """异步提取用户信息"""
+        if self.selector is None:
+            await self.fetch_async(session)
+        return self.extract_user_info()
@@ -3,10 +3,17 @@ from .util import handle_html
 
 
 class MblogPicAllParser(Parser):
-    def __init__(self, cookie, weibo_id):
+    def __init__(self, cookie, weibo_id, selector=None, defer_fetch=False):
         self.cookie = cookie
         self.url = 'https://weibo.cn/mblog/picAll/' + weibo_id + '?rl=1'
-        self.selector = handle_html(self.cookie, self.url)
+        self.selector = selector
+        if self.selector is None and not defer_fetch:
+            self.selector = handle_html(self.cookie, self.url)
 
     def extract_preview_picture_list(self):
         return self.selector.xpath('//img/@src')
+
+    async def extract_preview_picture_list_async(self, session):
+        if self.selector is None:
+            await self.fetch_async(session)
+        return self.extract_preview_picture_list()
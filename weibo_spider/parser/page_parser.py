@@ -1,28 +1,96 @@
+import asyncio
 import logging
 import re
 import sys
-from datetime import datetime, timedelta
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from lxml import etree
 
 from .. import datetime_util
+from ..crawl_context import PageCrawlContext
+from ..seen_index import weibo_mid
 from ..weibo import Weibo
 from .comment_parser import CommentParser
 from .mblog_picAll_parser import MblogPicAllParser
 from .parser import Parser
-from .util import handle_garbled, handle_html, to_video_download_url
+from .util import (handle_garbled, handle_html, has_weibo_list,
+                   to_video_download_url, to_video_download_url_async)
 
 MAX_PINNED_COUNT = 2
+DEFAULT_DETAIL_CONCURRENCY = 5
 
 logger = logging.getLogger('spider.page_parser')
 
+# 预编译的XPath，解析每条微博时复用
+XP_WEIBO_LIST = etree.XPath("//div[@class='c']")
+XP_CTT = etree.XPath("div/span[@class='ctt']")
+XP_CMT = etree.XPath("div/span[@class='cmt']")
+XP_CMT_USER = etree.XPath("div/span[@class='cmt']/a/text()")
+XP_CT = etree.XPath("div/span[@class='ct']")
+XP_ID = etree.XPath('@id')
+XP_DIVS = etree.XPath('div')
+XP_DIV_LINKS = etree.XPath('div/a')
+XP_DIV_LINK_TEXTS = etree.XPath('div//a/text()')
+XP_RETWEET_HREF = etree.XPath("div/a[@class='cc']/@href")
+XP_ALL_HREFS = etree.XPath('.//a/@href')
+XP_IMG_SRCS = etree.XPath('.//img/@src')
+XP_LINKS = etree.XPath('a')
+XP_LINK_HREFS = etree.XPath('a/@href')
+XP_LINK_IMG_SRCS = etree.XPath('img/@src')
+XP_DEEP_LINKS = etree.XPath('.//a')
+XP_DEEP_LINK_TEXTS = etree.XPath('.//a/text()')
+XP_CTT_LINKS = etree.XPath("span[@class='ctt']/a")
+XP_CTT_LINK_TEXTS = etree.XPath("span[@class='ctt']/a/text()")
+# 在工作进程中解析页面时使用的user_config，只解析不翻页，不需要真实日期
+WORKER_USER_CONFIG = {'user_uri': '', 'since_date': '1900-01-01',
+                      'end_date': 'now'}
 
-class PageParser(Parser):
-    empty_count = 0
 
-    def __init__(self, cookie, user_config, page, filter, selector=None, defer_fetch=False):
+@dataclass(slots=True)
+class WeiboDraft:
+    """从微博列表页中提取出的一条微博
+
+    weibo已填充不需要额外请求的字段，其余字段是获取全文、多图和视频所需的信息。
+    只包含普通数据，可以在进程间传递。
+    """
+    weibo: Weibo
+    publish_time: datetime  # 发布时间，与since_date比较时不需要再解析字符串
+    text: Optional[str] = None  # 列表页中的微博正文
+    is_long: bool = False  # 是否需要到评论页获取全文
+    retweet_reason: Optional[str] = None  # 转发理由，原创微博为None
+    original_user: str = ''  # 转发微博的原始用户
+    picture_id: str = ''  # 图片所属微博的id
+    pictures: Optional[str] = '无'  # 图片url，None表示需要请求picAll页面
+    original_picture: str = '无'  # 转发微博中转发者自己发的图片
+    video_in_comment: bool = False  # 视频链接是否需要到评论页获取
+    video_page_url: str = ''
+
+
+def extract_page_drafts(content, filter):
+    """解析微博列表页的原始内容，返回WeiboDraft列表，页面无效时返回None
+
+    供进程池调用：参数和返回值都是普通数据，lxml对象不会跨进程传递。
+    """
+    selector = etree.HTML(content)
+    if selector is None:
+        return None
+    parser = PageParser('', WORKER_USER_CONFIG, 0, filter,
+                        selector=selector, defer_fetch=True)
+    return parser.extract_drafts()
+
+
+class PageParser(Parser):
+    def __init__(self, cookie, user_config, page, filter, selector=None, defer_fetch=False,
+                 detail_concurrency=DEFAULT_DETAIL_CONCURRENCY, content=None,
+                 crawl=None):
         self.cookie = cookie
-        if hasattr(PageParser,
-                   'user_uri') and self.user_uri != user_config['user_uri']:
-            PageParser.empty_count = 0
+        self.content = content  # 页面原始内容，使用进程池解析时不在本进程中构建selector
+        # 本页所属的爬取过程，同一用户或时间窗口的各页共用，记录空页面数和停止信号
+        self.crawl = crawl if crawl is not None else PageCrawlContext(
+            user_config)
+        self.defer_fetch = defer_fetch
         self.user_uri = user_config['user_uri']
         self.since_date = user_config['since_date']
         self.end_date = user_config['end_date']
@@ -39,148 +107,200 @@ class PageParser(Parser):
             endtime = ''.join(end_date)
             self.url = f'https://weibo.cn/{self.user_uri}/profile?starttime={starttime}&endtime={endtime}&advancedfilter=1&page={page}'
         self.selector = selector
-        self.to_continue = True
+        self.now = datetime.now()  # 本页所有相对发布时间都以此为准
         is_exist = ''
-        if self.selector:
-            info = self.selector.xpath("//div[@class='c']")
+        if self.selector is not None:
+            info = XP_WEIBO_LIST(self.selector)
             if info and len(info) > 0:
-                is_exist = info[0].xpath("div/span[@class='ctt']")
+                is_exist = XP_CTT(info[0])
         elif not defer_fetch:
             for i in range(3):
                 self.selector = handle_html(self.cookie, self.url)
-                if self.selector:
-                    info = self.selector.xpath("//div[@class='c']")
+                if self.selector is not None:
+                    info = XP_WEIBO_LIST(self.selector)
                     if info is None or len(info) == 0:
                         continue
-                    is_exist = info[0].xpath("div/span[@class='ctt']")
+                    is_exist = XP_CTT(info[0])
                 if is_exist:
-                    PageParser.empty_count = 0
                     break
         if not defer_fetch:
-            if not is_exist:
-                PageParser.empty_count += 1
-            if PageParser.empty_count > 2:
-                self.to_continue = False
-                PageParser.empty_count = 0
+            self.crawl.record_page(bool(is_exist))
         self.filter = filter
+        self.detail_concurrency = max(1, detail_concurrency)
+
+    def _check_weibo(self, draft, weibo_id_list, since_date, state):
+        """判断微博是否应保留；返回'skip'、'stop'或'keep'"""
+        frontier = self.crawl.frontier
+        if frontier is not None:
+            # 增量爬取：遇到上次已保存的微博即停止翻页，置顶微博除外
+            mid = weibo_mid(draft.weibo.id)
+            if mid in state['pinned_mids'] or frontier.is_pinned(mid):
+                frontier.observe(mid, pinned=True)
+            elif frontier.is_known(mid):
+                return 'stop'
+            else:
+                frontier.observe(mid)
+        if draft.weibo.id in weibo_id_list:
+            return 'skip'
+        if draft.publish_time < since_date:
+            # As of 2023.05, there can be at most 2 pinned weibo.
+            # We will continue for at most 2 times before return.
+            if self.page == 1 and state['pinned'] < MAX_PINNED_COUNT:
+                state['pinned'] += 1
+                return 'skip'
+            return 'stop'
+        return 'keep'
+
+    def _find_pinned(self, drafts):
+        """返回第一页中置顶微博的mid：排在最前面、却比后面的微博旧"""
+        if self.page != 1:
+            return set()
+        mids = [weibo_mid(draft.weibo.id) for draft in drafts]
+        pinned = set()
+        for i in range(min(MAX_PINNED_COUNT, len(mids) - 1)):
+            later = [mid for mid in mids[i + 1:] if mid is not None]
+            if mids[i] is not None and later and mids[i] < max(later):
+                pinned.add(mids[i])
+        return pinned
+
+    def _select_drafts(self, drafts, weibo_id_list):
+        """按页面顺序确定要保留的微博，遇到应停止翻页的微博时设置停止信号"""
+        state = {'pinned': 0, 'pinned_mids': set()}
+        if self.crawl.frontier is not None:
+            state['pinned_mids'] = self._find_pinned(drafts)
+        since_date = datetime_util.str_to_time(self.since_date)
+        kept = []
+        for draft in drafts:
+            action = self._check_weibo(draft, weibo_id_list, since_date,
+                                       state)
+            if action == 'skip':
+                continue
+            if action == 'stop':
+                self.crawl.stopped = True
+                break
+            kept.append(draft)
+            weibo_id_list.append(draft.weibo.id)
+        return kept
+
+    def _has_weibo_list(self):
+        """本页是否有微博"""
+        if self.content is not None:
+            return has_weibo_list(self.content)
+        if self.selector is None:
+            return False
+        info = XP_WEIBO_LIST(self.selector)
+        return bool(info) and bool(XP_CTT(info[0]))
 
     def get_one_page(self, weibo_id_list):
         """获取第page页的全部微博"""
-        cur_pinned_count = 0
         try:
-            info = self.selector.xpath("//div[@class='c']")
-            is_exist = info[0].xpath("div/span[@class='ctt']")
             weibos = []
-            if is_exist:
-                since_date = datetime_util.str_to_time(self.since_date)
-                for i in range(0, len(info) - 1):
-                    weibo = self.get_one_weibo(info[i])
-                    if weibo:
-                        if weibo.id in weibo_id_list:
-                            continue
-                        publish_time = datetime_util.str_to_time(
-                            weibo.publish_time)
-
-                        if publish_time < since_date:
-                            # As of 2023.05, there can be at most 2 pinned weibo.
-                            # We will continue for at most 2 times before return.
-                            if self.page == 1 and cur_pinned_count < MAX_PINNED_COUNT:
-                                cur_pinned_count += 1
-                                continue
-                            else:
-                                return weibos, weibo_id_list, False
-                        logger.info(weibo)
-                        logger.info('-' * 100)
-                        weibos.append(weibo)
-                        weibo_id_list.append(weibo.id)
-            return weibos, weibo_id_list, self.to_continue
+            for draft in self._select_drafts(self.extract_drafts(),
+                                             weibo_id_list):
+                weibo = self.complete_weibo(draft)
+                logger.info(weibo)
+                logger.info('-' * 100)
+                weibos.append(weibo)
+            return weibos, weibo_id_list, not self.crawl.stopped
         except Exception as e:
             logger.exception(e)
 
-    def is_original(self, info):
-        """判断微博是否为原创微博"""
-        is_original = info.xpath("div/span[@class='cmt']")
-        if len(is_original) > 3:
-            return False
-        else:
-            return True
+    def extract_drafts(self):
+        """提取本页所有微博中不需要额外请求的信息，返回WeiboDraft列表"""
+        info = XP_WEIBO_LIST(self.selector)
+        if not info or not XP_CTT(info[0]):
+            return []
+        drafts = []
+        for i in range(0, len(info) - 1):
+            draft = self.get_weibo_draft(info[i])
+            if draft:
+                drafts.append(draft)
+        return drafts
 
-    def get_original_weibo(self, info, weibo_id):
-        """获取原创微博"""
-        try:
-            weibo_content = handle_garbled(info)
-            weibo_content = weibo_content[:weibo_content.rfind('赞')]
-            a_text = info.xpath('div//a/text()')
-            if '全文' in a_text:
-                wb_content = CommentParser(self.cookie,
-                                           weibo_id).get_long_weibo()
-                if wb_content:
-                    weibo_content = wb_content
-            return weibo_content
-        except Exception as e:
-            logger.exception(e)
+    async def _get_drafts_async(self, executor):
+        """获取本页的WeiboDraft列表；给定进程池且有原始内容时在进程池中解析"""
+        if executor is not None and self.content is not None:
+            return await asyncio.get_running_loop().run_in_executor(
+                executor, extract_page_drafts, self.content, self.filter)
+        if self.selector is None and self.content:
+            self.selector = etree.HTML(self.content)
+        if self.selector is None:
+            return None
+        return self.extract_drafts()
 
-    def get_retweet(self, info, weibo_id):
-        """获取转发微博"""
-        try:
-            weibo_content = handle_garbled(info)
-            weibo_content = weibo_content[weibo_content.find(':') +
-                                          1:weibo_content.rfind('赞')]
-            weibo_content = weibo_content[:weibo_content.rfind('赞')]
-            a_text = info.xpath('div//a/text()')
-            if '全文' in a_text:
-                wb_content = CommentParser(self.cookie,
-                                           weibo_id).get_long_retweet()
-                if wb_content:
-                    weibo_content = wb_content
-            retweet_reason = handle_garbled(info.xpath('div')[-1])
-            retweet_reason = retweet_reason[:retweet_reason.rindex('赞')]
-            original_user = info.xpath("div/span[@class='cmt']/a/text()")
-            if original_user:
-                original_user = original_user[0]
-                weibo_content = (f'{retweet_reason}\n原始用户: {original_user}\n转发内容: {weibo_content}')
-            else:
-                weibo_content = (f'{retweet_reason}\n转发内容: {weibo_content}')
-            return weibo_content
-        except Exception as e:
-            logger.exception(e)
+    async def get_one_page_async(self, weibo_id_list, session, executor=None):
+        """异步获取第page页的全部微博
 
-    def get_weibo_content(self, info, is_original):
-        """获取微博内容"""
+        先提取本页所有微博中不需要额外请求的字段并确定要保留的微博，
+        再并发获取长微博全文、多图和视频等详情，最后按页面顺序返回。
+        executor为进程池时，第一步在进程池中完成。
+        """
         try:
-            weibo_id = info.xpath('@id')[0][2:]
-            if is_original:
-                weibo_content = self.get_original_weibo(info, weibo_id)
-            else:
-                weibo_content = self.get_retweet(info, weibo_id)
-            return weibo_content
+            drafts = await self._get_drafts_async(executor)
+            if self.defer_fetch:
+                self.crawl.record_page(drafts is not None
+                                       and self._has_weibo_list())
+            if drafts is None:
+                logger.warning(f'第{self.page}页获取失败，跳过该页')
+                if self.crawl.frontier is not None:
+                    self.crawl.frontier.abort()
+                return [], weibo_id_list, not self.crawl.stopped
+            kept = self._select_drafts(drafts, weibo_id_list)
+            semaphore = asyncio.Semaphore(self.detail_concurrency)
+            weibos = await asyncio.gather(*[
+                self.complete_weibo_async(draft, session, semaphore)
+                for draft in kept
+            ])
+            for weibo in weibos:
+                logger.info(weibo)
+                logger.info('-' * 100)
+            return weibos, weibo_id_list, not self.crawl.stopped
         except Exception as e:
             logger.exception(e)
 
-    def get_article_url(self, info):
+    def is_original(self, info):
+        """判断微博是否为原创微博"""
+        return len(XP_CMT(info)) <= 3
+
+    def _get_original_text(self, text):
+        return text[:text.rfind('赞')]
+
+    def _get_retweet_text(self, text):
+        text = text[text.find(':') + 1:text.rfind('赞')]
+        return text[:text.rfind('赞')]
+
+    def _get_retweet_header(self, info, footer_text):
+        """返回(转发理由, 原始用户)"""
+        retweet_reason = footer_text[:footer_text.rindex('赞')]
+        original_user = XP_CMT_USER(info)
+        return retweet_reason, original_user[0] if original_user else ''
+
+    def _join_retweet(self, retweet_reason, original_user, weibo_content):
+        """拼接转发理由、原始用户和转发内容"""
+        if original_user:
+            return (f'{retweet_reason}\n原始用户: {original_user}\n转发内容: {weibo_content}')
+        return f'{retweet_reason}\n转发内容: {weibo_content}'
+
+    def _get_article_url(self, info, text):
         """获取微博头条文章的url"""
         article_url = ''
-        text = handle_garbled(info)
         if text.startswith('发布了头条文章') or text.startswith('我发表了头条文章'):
-            url = info.xpath('.//a/@href')
+            url = XP_ALL_HREFS(info)
             if url and url[0].startswith('https://weibo.com/ttarticle'):
                 article_url = url[0]
         return article_url
 
-    def get_publish_place(self, info):
+    def _get_publish_place(self, div_first):
         """获取微博发布位置"""
         try:
-            div_first = info.xpath('div')[0]
-            a_list = div_first.xpath('a')
             publish_place = '无'
-            for a in a_list:
-                if ('place.weibo.com' in a.xpath('@href')[0]
-                        and a.xpath('text()')[0] == '显示地图'):
-                    weibo_a = div_first.xpath("span[@class='ctt']/a")
+            for a in XP_LINKS(div_first):
+                if ('place.weibo.com' in a.get('href', '')
+                        and a.text == '显示地图'):
+                    weibo_a = XP_CTT_LINKS(div_first)
                     if len(weibo_a) >= 1:
                         publish_place = weibo_a[-1]
-                        if ('视频' == div_first.xpath(
-                                "span[@class='ctt']/a/text()")[-1][-2:]):
+                        if '视频' == XP_CTT_LINK_TEXTS(div_first)[-1][-2:]:
                             if len(weibo_a) >= 2:
                                 publish_place = weibo_a[-2]
                             else:
@@ -191,202 +311,304 @@ class PageParser(Parser):
         except Exception as e:
             logger.exception(e)
 
-    def get_publish_time(self, info):
-        """获取微博发布时间"""
+    def _get_publish_tool(self, str_time):
+        """获取微博发布工具"""
+        parts = str_time.split('来自')
+        return parts[1] if len(parts) > 1 else '无'
+
+    def _get_weibo_footer(self, footer_text):
+        """返回(点赞数, 转发数, 评论数)"""
+        footer_text = footer_text[footer_text.rfind('赞'):]
+        weibo_footer = re.findall(r'\d+', footer_text, re.M)
+        return (int(weibo_footer[0]), int(weibo_footer[1]),
+                int(weibo_footer[2]))
+
+    def _get_picture_id(self, info, weibo_id, is_original):
+        """返回图片所属微博的id，转发微博为被转发微博的id"""
+        if is_original:
+            return weibo_id
+        retweet_url = XP_RETWEET_HREF(info)[0]
+        return retweet_url.split('/')[-1].split('?')[0]
+
+    def _get_original_picture(self, div_last):
+        """获取转发微博中转发者自己发的图片"""
+        for a in XP_LINK_HREFS(div_last):
+            if a.endswith(('.gif', '.jpeg', '.jpg', '.png')):
+                return a
+        return '无'
+
+    def _build_picture_urls(self, is_original, pictures, original_picture):
+        """根据提取到的图片url组装picture_urls字典"""
+        picture_urls = {}
+        if is_original:
+            picture_urls['original_pictures'] = pictures
+            if not self.filter:
+                picture_urls['retweet_pictures'] = '无'
+        else:
+            picture_urls['retweet_pictures'] = pictures
+            picture_urls['original_pictures'] = original_picture
+        return picture_urls
+
+    def _get_inline_video_page_url(self, div_first):
+        """从微博本身提取视频页面链接"""
+        # 来自微博视频号的格式与普通格式不一致，不加 span 层级
+        for a in XP_DEEP_LINKS(div_first):
+            href = a.get('href', '')
+            if 'm.weibo.cn/s/video/show?object_id=' in href:
+                return href
+        return ''
+
+    def _set_picture_urls(self, weibo, picture_urls):
+        weibo.original_pictures = picture_urls[
+            'original_pictures']  # 原创图片url
+        if weibo.original_pictures != '无':
+            weibo.original_pictures_list = [
+                u.strip() for u in weibo.original_pictures.split(',')
+                if u.strip()
+            ]
+        if not self.filter:
+            weibo.retweet_pictures = picture_urls[
+                'retweet_pictures']  # 转发图片url
+            if weibo.retweet_pictures != '无':
+                weibo.retweet_pictures_list = [
+                    u.strip()
+                    for u in weibo.retweet_pictures.split(',')
+                    if u.strip()
+                ]
+
+    def get_weibo_draft(self, info):
+        """提取一条微博中不需要额外请求的信息，以及获取其余信息所需的数据
+
+        每个节点只查询一次，全文、最后一个div和发布时间的文本也只各处理一次，
+        各字段共用这些结果。
+        """
         try:
-            str_time = info.xpath("div/span[@class='ct']")
-            str_time = handle_garbled(str_time[0])
-            publish_time = str_time.split('来自')[0]
-            if '刚刚' in publish_time:
-                publish_time = datetime.now().strftime('%Y-%m-%d %H:%M')
-            elif '分钟' in publish_time:
-                minute = publish_time[:publish_time.find('分钟')]
-                minute = timedelta(minutes=int(minute))
-                publish_time = (datetime.now() -
-                                minute).strftime('%Y-%m-%d %H:%M')
-            elif '今天' in publish_time:
-                today = datetime.now().strftime('%Y-%m-%d')
-                time = publish_time[3:]
-                publish_time = f'{today} {time}'
-                if len(publish_time) > 16:
-                    publish_time = publish_time[:16]
-            elif '月' in publish_time:
-                year = datetime.now().strftime('%Y')
-                month = publish_time[0:2]
-                day = publish_time[3:5]
-                time = publish_time[7:12]
-                publish_time = f'{year}-{month}-{day} {time}'
-            else:
-                publish_time = publish_time[:16]
-            return publish_time
+            is_original = self.is_original(info)
+            if self.filter and not is_original:
+                logger.info('正在过滤转发微博')
+                return None
+            weibo = Weibo()
+            weibo.original = is_original  # 是否原创微博
+            weibo.id = XP_ID(info)[0][2:]
+            divs = XP_DIVS(info)
+            div_first, div_last = divs[0], divs[-1]
+            text = handle_garbled(info)
+            footer_text = handle_garbled(div_last)
+            str_time = handle_garbled(XP_CT(info)[0])
+            weibo.article_url = self._get_article_url(info, text)  # 头条文章url
+            weibo.publish_place = self._get_publish_place(div_first)  # 微博发布位置
+            publish_time = datetime_util.parse_publish_time(
+                str_time.split('来自')[0], self.now)
+            if publish_time is None:
+                raise ValueError(f'无法解析微博发布时间: {str_time}')
+            # 微博发布时间
+            weibo.publish_time = datetime_util.format_time(publish_time)
+            weibo.publish_tool = self._get_publish_tool(str_time)  # 微博发布工具
+            (weibo.up_num, weibo.retweet_num,
+             weibo.comment_num) = self._get_weibo_footer(footer_text)
         except Exception as e:
             logger.exception(e)
-
-    def get_publish_tool(self, info):
-        """获取微博发布工具"""
+            return None
+        draft = WeiboDraft(weibo, publish_time)
         try:
-            str_time = info.xpath("div/span[@class='ct']")
-            str_time = handle_garbled(str_time[0])
-            if len(str_time.split('来自')) > 1:
-                publish_tool = str_time.split('来自')[1]
+            draft.is_long = '全文' in XP_DIV_LINK_TEXTS(info)
+            if is_original:
+                draft.text = self._get_original_text(text)
             else:
-                publish_tool = '无'
-            return publish_tool
+                draft.text = self._get_retweet_text(text)
+                draft.retweet_reason, draft.original_user = (
+                    self._get_retweet_header(info, footer_text))
         except Exception as e:
             logger.exception(e)
+        try:
+            draft.picture_id = self._get_picture_id(info, weibo.id,
+                                                    is_original)
+            draft.pictures = self._get_inline_picture_urls(info,
+                                                           draft.picture_id)
+            if not is_original:
+                draft.original_picture = self._get_original_picture(div_last)
+        except Exception as e:
+            logger.exception(e)
+        try:
+            draft.video_in_comment = '全文' in XP_DEEP_LINK_TEXTS(div_first)
+            if not draft.video_in_comment:
+                draft.video_page_url = self._get_inline_video_page_url(
+                    div_first)
+        except Exception as e:
+            logger.exception(e)
+        return draft
 
-    def get_weibo_footer(self, info):
-        """获取微博点赞数、转发数、评论数"""
+    def _get_content(self, draft):
+        """获取微博内容，长微博到评论页获取全文"""
         try:
-            footer = {}
-            pattern = r'\d+'
-            str_footer = info.xpath('div')[-1]
-            str_footer = handle_garbled(str_footer)
-            str_footer = str_footer[str_footer.rfind('赞'):]
-            weibo_footer = re.findall(pattern, str_footer, re.M)
-
-            up_num = int(weibo_footer[0])
-            footer['up_num'] = up_num
-
-            retweet_num = int(weibo_footer[1])
-            footer['retweet_num'] = retweet_num
-
-            comment_num = int(weibo_footer[2])
-            footer['comment_num'] = comment_num
-            return footer
+            weibo_content = draft.text
+            if draft.is_long:
+                wb_content = CommentParser(self.cookie,
+                                           draft.weibo.id).get_long_weibo()
+                if wb_content:
+                    weibo_content = wb_content
+            if draft.retweet_reason is not None:
+                weibo_content = self._join_retweet(draft.retweet_reason,
+                                                   draft.original_user,
+                                                   weibo_content)
+            return weibo_content
         except Exception as e:
             logger.exception(e)
 
-    def get_picture_urls(self, info, is_original):
-        """获取微博原始图片url"""
+    def _get_picture_urls(self, draft):
+        """获取微博原始图片url，多图微博到picAll页面获取"""
         try:
-            weibo_id = info.xpath('@id')[0][2:]
-            picture_urls = {}
-            if is_original:
-                original_pictures = self.extract_picture_urls(info, weibo_id)
-                picture_urls['original_pictures'] = original_pictures
-                if not self.filter:
-                    picture_urls['retweet_pictures'] = '无'
-            else:
-                retweet_url = info.xpath("div/a[@class='cc']/@href")[0]
-                retweet_id = retweet_url.split('/')[-1].split('?')[0]
-                retweet_pictures = self.extract_picture_urls(info, retweet_id)
-                picture_urls['retweet_pictures'] = retweet_pictures
-                a_list = info.xpath('div[last()]/a/@href')
-                original_picture = '无'
-                for a in a_list:
-                    if a.endswith(('.gif', '.jpeg', '.jpg', '.png')):
-                        original_picture = a
-                        break
-                picture_urls['original_pictures'] = original_picture
-            return picture_urls
+            pictures = draft.pictures
+            if pictures is None:
+                preview_picture_list = MblogPicAllParser(
+                    self.cookie,
+                    draft.picture_id).extract_preview_picture_list()
+                pictures = self._join_preview_pictures(preview_picture_list)
         except Exception as e:
             logger.exception(e)
+            pictures = '无'
+        return self._build_picture_urls(draft.weibo.original, pictures,
+                                        draft.original_picture)
 
-    def get_video_url(self, info):
+    def _get_video_url(self, draft):
         """获取微博视频url"""
         video_url = '无'
-
-        weibo_id = info.xpath('@id')[0][2:]
         try:
-            video_page_url = ''
-            a_text = info.xpath('./div[1]//a/text()')
-            if '全文' in a_text:
-                video_page_url = CommentParser(self.cookie,
-                                               weibo_id).get_video_page_url()
-            else:
-                # 来自微博视频号的格式与普通格式不一致，不加 span 层级
-                a_list = info.xpath('./div[1]//a')
-                for a in a_list:
-                    if 'm.weibo.cn/s/video/show?object_id=' in a.xpath(
-                            '@href')[0]:
-                        video_page_url = a.xpath('@href')[0]
-                        break
-
+            video_page_url = draft.video_page_url
+            if draft.video_in_comment:
+                video_page_url = CommentParser(
+                    self.cookie, draft.weibo.id).get_video_page_url()
             if video_page_url != '':
                 video_url = to_video_download_url(self.cookie, video_page_url)
         except Exception as e:
             logger.exception(e)
-
         return video_url
 
+    def complete_weibo(self, draft):
+        """获取微博内容、图片和视频等可能需要额外请求的信息，返回完整的微博"""
+        weibo = draft.weibo
+        try:
+            weibo.content = self._get_content(draft)  # 微博内容
+            self._set_picture_urls(weibo, self._get_picture_urls(draft))
+            weibo.video_url = self._get_video_url(draft)  # 微博视频url
+        except Exception as e:
+            logger.exception(e)
+        return weibo
+
     def get_one_weibo(self, info):
         """获取一条微博的全部信息"""
+        draft = self.get_weibo_draft(info)
+        if draft is None:
+            return None
+        return self.complete_weibo(draft)
+
+    async def _get_content_async(self, draft, session):
+        """异步获取微博内容，长微博到评论页获取全文"""
         try:
-            weibo = Weibo()
-            is_original = self.is_original(info)
-            weibo.original = is_original  # 是否原创微博
-            if (not self.filter) or is_original:
-                weibo.id = info.xpath('@id')[0][2:]
-                weibo.content = self.get_weibo_content(info,
-                                                       is_original)  # 微博内容
-                weibo.article_url = self.get_article_url(info)  # 头条文章url
-                picture_urls = self.get_picture_urls(info, is_original)
-                weibo.original_pictures = picture_urls[
-                    'original_pictures']  # 原创图片url
-                if weibo.original_pictures != '无':
-                    weibo.original_pictures_list = [
-                        u.strip() for u in weibo.original_pictures.split(',')
-                        if u.strip()
-                    ]
-                if not self.filter:
-                    weibo.retweet_pictures = picture_urls[
-                        'retweet_pictures']  # 转发图片url
-                    if weibo.retweet_pictures != '无':
-                        weibo.retweet_pictures_list = [
-                            u.strip()
-                            for u in weibo.retweet_pictures.split(',')
-                            if u.strip()
-                        ]
-                weibo.video_url = self.get_video_url(info)  # 微博视频url
-                weibo.publish_place = self.get_publish_place(info)  # 微博发布位置
-                weibo.publish_time = self.get_publish_time(info)  # 微博发布时间
-                weibo.publish_tool = self.get_publish_tool(info)  # 微博发布工具
-                footer = self.get_weibo_footer(info)
-                weibo.up_num = footer['up_num']  # 微博点赞数
-                weibo.retweet_num = footer['retweet_num']  # 转发数
-                weibo.comment_num = footer['comment_num']  # 评论数
-            else:
-                weibo = None
-                logger.info('正在过滤转发微博')
-            return weibo
+            weibo_content = draft.text
+            if draft.is_long:
+                wb_content = await CommentParser(
+                    self.cookie, draft.weibo.id,
+                    defer_fetch=True).get_long_weibo_async(session)
+                if wb_content:
+                    weibo_content = wb_content
+            if draft.retweet_reason is not None:
+                weibo_content = self._join_retweet(draft.retweet_reason,
+                                                   draft.original_user,
+                                                   weibo_content)
+            return weibo_content
         except Exception as e:
             logger.exception(e)
 
-    def extract_picture_urls(self, info, weibo_id):
-        """提取微博原始图片url"""
+    async def _get_picture_urls_async(self, draft, session):
+        """异步获取微博原始图片url，多图微博到picAll页面获取"""
         try:
-            a_list = info.xpath('div/a/@href')
-            first_pic = f'https://weibo.cn/mblog/pic/{weibo_id}'
-            all_pic = f'https://weibo.cn/mblog/picAll/{weibo_id}'
-            picture_urls = '无'
-            if first_pic in ''.join(a_list):
-                if all_pic in ''.join(a_list):
-                    preview_picture_list = MblogPicAllParser(
-                        self.cookie, weibo_id).extract_preview_picture_list()
-                    picture_list = [
-                        p.replace('/thumb180/', '/large/')
-                        for p in preview_picture_list
-                    ]
-                    picture_urls = ','.join(picture_list)
-                else:
-                    if info.xpath('.//img/@src'):
-                        for link in info.xpath('div/a'):
-                            if len(link.xpath('@href')) > 0:
-                                if first_pic in link.xpath('@href')[0]:
-                                    if len(link.xpath('img/@src')) > 0:
-                                        preview_picture = link.xpath(
-                                            'img/@src')[0]
-                                        picture_urls = preview_picture.replace(
-                                            '/wap180/', '/large/')
-                                        break
-                    else:
-                        logger.warning(
-                            '爬虫微博可能被设置成了"不显示图片"，请前往'
-                            '"https://weibo.cn/account/customize/pic"，修改为"显示"'
-                        )
-                        sys.exit()
-            return picture_urls
+            pictures = draft.pictures
+            if pictures is None:
+                preview_picture_list = await MblogPicAllParser(
+                    self.cookie, draft.picture_id,
+                    defer_fetch=True).extract_preview_picture_list_async(
+                        session)
+                pictures = self._join_preview_pictures(preview_picture_list)
         except Exception as e:
             logger.exception(e)
-            return '无'
+            pictures = '无'
+        return self._build_picture_urls(draft.weibo.original, pictures,
+                                        draft.original_picture)
+
+    async def _get_video_url_async(self, draft, session):
+        """异步获取微博视频url"""
+        video_url = '无'
+        try:
+            video_page_url = draft.video_page_url
+            if draft.video_in_comment:
+                video_page_url = await CommentParser(
+                    self.cookie, draft.weibo.id,
+                    defer_fetch=True).get_video_page_url_async(session)
+            if video_page_url != '':
+                video_url = await to_video_download_url_async(
+                    self.cookie, video_page_url, session)
+        except Exception as e:
+            logger.exception(e)
+        return video_url
+
+    async def complete_weibo_async(self, draft, session, semaphore=None):
+        """异步获取微博内容、图片和视频等可能需要额外请求的信息，返回完整的微博"""
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.detail_concurrency)
+
+        async def limited(coro):
+            async with semaphore:
+                return await coro
+
+        weibo = draft.weibo
+        try:
+            content, picture_urls, video_url = await asyncio.gather(
+                limited(self._get_content_async(draft, session)),
+                limited(self._get_picture_urls_async(draft, session)),
+                limited(self._get_video_url_async(draft, session)))
+            weibo.content = content  # 微博内容
+            self._set_picture_urls(weibo, picture_urls)
+            weibo.video_url = video_url  # 微博视频url
+        except Exception as e:
+            logger.exception(e)
+        return weibo
+
+    async def get_one_weibo_async(self, info, session):
+        """异步获取一条微博的全部信息"""
+        draft = self.get_weibo_draft(info)
+        if draft is None:
+            return None
+        return await self.complete_weibo_async(draft, session)
+
+    def _get_inline_picture_urls(self, info, weibo_id):
+        """提取单图微博的图片url；返回None表示需要请求picAll页面"""
+        links = XP_DIV_LINKS(info)
+        a_list = ''.join(link.get('href', '') for link in links)
+        first_pic = f'https://weibo.cn/mblog/pic/{weibo_id}'
+        all_pic = f'https://weibo.cn/mblog/picAll/{weibo_id}'
+        picture_urls = '无'
+        if first_pic in a_list:
+            if all_pic in a_list:
+                return None
+            if XP_IMG_SRCS(info):
+                for link in links:
+                    if first_pic in link.get('href', ''):
+                        preview_picture = XP_LINK_IMG_SRCS(link)
+                        if preview_picture:
+                            picture_urls = preview_picture[0].replace(
+                                '/wap180/', '/large/')
+                            break
+            else:
+                logger.warning(
+                    '爬虫微博可能被设置成了"不显示图片"，请前往'
+                    '"https://weibo.cn/account/customize/pic"，修改为"显示"'
+                )
+                sys.exit()
+        return picture_urls
+
+    def _join_preview_pictures(self, preview_picture_list):
+        picture_list = [
+            p.replace('/thumb180/', '/large/') for p in preview_picture_list
+        ]
+        return ','.join(picture_list)
@@ -1,5 +1,13 @@
+from .util import handle_html_async
+
+
 class Parser:
     def __init__(self, cookie):
         self.cookie = cookie
         self.url = ''
         self.selector = None
+
+    async def fetch_async(self, session):
+        """异步获取self.url对应的页面，结果保存在self.selector中"""
+        self.selector = await handle_html_async(self.cookie, self.url, session)
+        return self
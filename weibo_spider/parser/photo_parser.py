@@ -3,10 +3,12 @@ from .util import handle_html
 
 
 class PhotoParser(Parser):
-    def __init__(self, cookie, user_id):
+    def __init__(self, cookie, user_id, selector=None, defer_fetch=False):
         self.cookie = cookie
         self.url = "https://weibo.cn/" + str(user_id) + "/photo?tf=6_008"
-        self.selector = handle_html(self.cookie, self.url)
+        self.selector = selector
+        if self.selector is None and not defer_fetch:
+            self.selector = handle_html(self.cookie, self.url)
         self.user_id = user_id
 
     def extract_avatar_album_url(self):
@@ -17,3 +19,8 @@ class PhotoParser(Parser):
             return "https://weibo.cn" + result[0]
         else:
             return "https://weibo.cn/" + str(self.user_id) + "/avatar?rl=0"
+
+    async def extract_avatar_album_url_async(self, session):
+        if self.selector is None:
+            await self.fetch_async(session)
+        return self.extract_avatar_album_url()
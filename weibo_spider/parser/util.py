@@ -1,73 +1,163 @@
-import hashlib
+import asyncio
 import json
 import logging
-import sys
-from pathlib import Path
+import re
+from contextlib import asynccontextmanager
 
 import aiohttp
 import requests
 from lxml import etree
 
-# Set GENERATE_TEST_DATA to True when generating test data.
-GENERATE_TEST_DATA = False
+from ..cookie_pool import CookiePool
+from ..page_archive import ArchiveMiss
+from ..rate_limiter import (EMPTY, LOGIN, NETWORK_ERROR, OK,
+                            classify_response, defer_record)
+from ..response_cache import REPLAY, CacheMiss
+from ..text_util import normalize
+
+# 单元测试数据所在目录；录制和回放真实请求请使用response_cache
 TEST_DATA_DIR = 'tests/testdata'
 URL_MAP_FILE = 'url_map.json'
 logger = logging.getLogger('spider.util')
+SYNC_TIMEOUT = (10, 30)  # 同步请求的(连接, 读取)超时时间(秒)
+LOGIN_TITLE = re.compile('<title>\\s*登录'.encode('utf-8'))
+WEIBO_LIST = re.compile(rb'<div class="c"[\s>]')
+XP_STRING = etree.XPath('string(.)')
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/86.0.4240.111 Safari/537.36'
+
+
+def has_weibo_list(content):
+    """页面中是否有微博列表(div.c)，直接在原始内容上判断，不需要解析"""
+    return WEIBO_LIST.search(content) is not None
 
 
-def hash_url(url):
-    return hashlib.sha224(url.encode('utf8')).hexdigest()
+def classify_page(status, url, content):
+    """判断一次页面请求的结果，见rate_limiter中的分类"""
+    signal = classify_response(status, url)
+    if signal != OK or not content:
+        return signal
+    if LOGIN_TITLE.search(content):
+        return LOGIN
+    if '/profile' in str(url) and not has_weibo_list(content):
+        return EMPTY
+    return OK
+
+
+async def _select_account(cookie):
+    """返回(账号, 请求头)；cookie为字符串时账号为None"""
+    account = None
+    cookie_str = cookie
+    if isinstance(cookie, CookiePool):
+        account = await cookie.acquire()
+        cookie_str = account.cookie
+    return account, {'User-Agent': USER_AGENT, 'Cookie': cookie_str}
+
+
+@asynccontextmanager
+async def _get(cookie, account, session, url, headers):
+    """发出GET请求，账号绑定了代理时经由该代理"""
+    proxy = account.proxy if account is not None else None
+    if proxy is None:
+        async with session.get(url, headers=headers) as resp:
+            yield resp
+        return
+    async with cookie.proxy_pool.slot(proxy):
+        async with proxy.get(session, url, headers=headers) as resp:
+            yield resp
 
 
 async def handle_html_async(cookie, url, session):
     """异步处理html"""
+    content = await fetch_page_async(cookie, url, session)
+    if content is None:
+        return None
     try:
-        user_agent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/86.0.4240.111 Safari/537.36'
-        headers = {'User-Agent': user_agent, 'Cookie': cookie}
-        async with session.get(url, headers=headers) as resp:
-            content = await resp.read()
+        return etree.HTML(content)
+    except Exception as e:
+        logger.exception(e)
 
-        if GENERATE_TEST_DATA:
-            import io
 
-            resp_file = str(Path(TEST_DATA_DIR) / f'{hash_url(url)}.html')
-            with io.open(resp_file, 'wb') as f:
-                f.write(content)
+async def fetch_page_async(cookie, url, session):
+    """异步获取页面的原始内容，失败时返回None
 
-            with io.open(Path(TEST_DATA_DIR) / URL_MAP_FILE, 'r+') as f:
-                url_map = json.loads(f.read())
-                url_map[url] = resp_file
-                f.seek(0)
-                f.write(json.dumps(url_map, indent=4, ensure_ascii=False))
-                f.truncate()
+    cookie可以是cookie字符串，也可以是CookiePool，此时每次请求从池中选取账号。
+    session带有single_flight时，同一url的并发请求只发出一次，正常页面短时间内复用。
+    """
+    single_flight = getattr(session, 'single_flight', None)
+    if single_flight is None:
+        content, _ = await _fetch_page(cookie, url, session)
+    else:
+        content, _ = await single_flight.do(
+            url, lambda: _fetch_page(cookie, url, session),
+            cacheable=lambda result: result[0] and result[1] == OK)
+    return content
 
-        selector = etree.HTML(content)
-        return selector
-    except Exception as e:
-        logger.exception(e)
 
+async def _read(cookie, session, url):
+    """读取url的响应，返回(响应体, 状态码, 最终url, 账号, 是否来自缓存)
 
-def handle_html(cookie, url):
-    """处理html"""
+    session带有response_cache时先查缓存，命中时不占用账号。
+    """
+    cache = getattr(session, 'response_cache', None)
+    if cache is not None:
+        hit = cache.get(url)
+        if hit is not None:
+            return hit + (None, True)
+        if cache.mode == REPLAY:
+            raise CacheMiss(url)
+    account, headers = await _select_account(cookie)
     try:
-        user_agent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/86.0.4240.111 Safari/537.36'
-        headers = {'User-Agent': user_agent, 'Cookie': cookie}
-        resp = requests.get(url, headers=headers)
+        async with _get(cookie, account, session, url, headers) as resp:
+            return await resp.read(), resp.status, resp.url, account, False
+    except asyncio.CancelledError:
+        # 预取任务和合并的请求常被取消，此时只归还账号
+        if account is not None:
+            cookie.release(account)
+        raise
+    except Exception:
+        if account is not None:
+            cookie.record(account, NETWORK_ERROR)
+        raise
 
-        if GENERATE_TEST_DATA:
-            import io
 
-            resp_file = str(Path(TEST_DATA_DIR) / f'{hash_url(url)}.html')
-            with io.open(resp_file, 'w', encoding='utf-8') as f:
-                f.write(resp.text)
+def _store(session, url, content, status, final_url):
+    """把从网络获取的正常响应写入缓存和页面归档"""
+    cache = getattr(session, 'response_cache', None)
+    if cache is not None:
+        cache.put(url, content, status, final_url)
+    archive = getattr(session, 'page_archive', None)
+    if archive is not None:
+        archive.add(url, content)
+
+
+async def _fetch_page(cookie, url, session):
+    """请求url，返回(原始内容, 请求结果分类)"""
+    try:
+        # 空页和登录页的状态码也是200，按页面内容判断后再记录到限速器
+        with defer_record() as deferred:
+            content, status, resp_url, account, from_cache = await _read(
+                cookie, session, url)
+            signal = classify_page(status, resp_url, content)
+            deferred.record(signal)
+        if account is not None:
+            cookie.record(account, signal)
+        if not from_cache and signal == OK and content:
+            _store(session, url, content, status, resp_url)
+        return content, signal
+    except CacheMiss:
+        logger.warning(f'缓存中没有{url}')
+    except ArchiveMiss:
+        logger.warning(f'归档中没有{url}，跳过')
+    except Exception as e:
+        logger.exception(e)
+    return None, NETWORK_ERROR
 
-            with io.open(Path(TEST_DATA_DIR) / URL_MAP_FILE, 'r+') as f:
-                url_map = json.loads(f.read())
-                url_map[url] = resp_file
-                f.seek(0)
-                f.write(json.dumps(url_map, indent=4, ensure_ascii=False))
-                f.truncate()
 
+def handle_html(cookie, url):
+    """处理html"""
+    try:
+        headers = {'User-Agent': USER_AGENT, 'Cookie': cookie}
+        resp = requests.get(url, headers=headers, timeout=SYNC_TIMEOUT)
         selector = etree.HTML(resp.content)
         return selector
     except Exception as e:
@@ -78,13 +168,10 @@ def handle_garbled(info):
     """处理乱码"""
     try:
         if hasattr(info, 'xpath'): # 检查 info 是否具有 xpath 方法
-            info_str = info.xpath('string(.)')  # 提取字符串内容
+            info_str = XP_STRING(info)  # 提取字符串内容
         else:
             info_str = str(info) # 若不支持 xpath，将其转换为字符串
-
-        info = info_str.replace('\u200b', '').encode(
-            sys.stdout.encoding, 'ignore').decode(sys.stdout.encoding)
-        return info
+        return normalize(info_str)
     except Exception as e:
         logger.exception(e)
         return '无'
@@ -117,27 +204,64 @@ def bid2mid(bid):
     return mid
 
 
+def _to_video_object_url(video_page_url):
+    return video_page_url.replace('m.weibo.cn/s/video/show',
+                                  'm.weibo.cn/s/video/object')
+
+
+def _extract_video_url(wb_info):
+    """从视频object接口返回的数据中提取视频url"""
+    video_url = wb_info['data']['object']['stream'].get('hd_url')
+    if not video_url:
+        video_url = wb_info['data']['object']['stream']['url']
+        if not video_url:  # 说明该视频为直播
+            video_url = ''
+    return video_url
+
+
 def to_video_download_url(cookie, video_page_url):
     if video_page_url == '':
         return ''
 
-    video_object_url = video_page_url.replace('m.weibo.cn/s/video/show',
-                                              'm.weibo.cn/s/video/object')
+    video_object_url = _to_video_object_url(video_page_url)
     try:
-        user_agent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/86.0.4240.111 Safari/537.36'
-        headers = {'User_Agent': user_agent, 'Cookie': cookie}
-        wb_info = requests.get(video_object_url, headers=headers).json()
-        video_url = wb_info['data']['object']['stream'].get('hd_url')
-        if not video_url:
-            video_url = wb_info['data']['object']['stream']['url']
-            if not video_url:  # 说明该视频为直播
-                video_url = ''
+        headers = {'User_Agent': USER_AGENT, 'Cookie': cookie}
+        wb_info = requests.get(video_object_url, headers=headers,
+                               timeout=SYNC_TIMEOUT).json()
+        video_url = _extract_video_url(wb_info)
     except json.decoder.JSONDecodeError:
         logger.warning('当前账号没有浏览该视频的权限')
 
     return video_url
 
 
+async def to_video_download_url_async(cookie, video_page_url, session):
+    """异步获取视频下载url"""
+    if video_page_url == '':
+        return ''
+
+    video_object_url = _to_video_object_url(video_page_url)
+    video_url = ''
+    try:
+        content, status, resp_url, account, from_cache = await _read(
+            cookie, session, video_object_url)
+        if account is not None:
+            cookie.record(account, classify_response(status, resp_url))
+        video_url = _extract_video_url(json.loads(content))
+        if not from_cache:
+            _store(session, video_object_url, content, status, resp_url)
+    except json.decoder.JSONDecodeError:
+        logger.warning('当前账号没有浏览该视频的权限')
+    except CacheMiss:
+        logger.warning(f'缓存中没有{video_object_url}')
+    except ArchiveMiss:
+        logger.warning(f'归档中没有视频信息{video_object_url}，跳过')
+    except Exception as e:
+        logger.exception(e)
+
+    return video_url
+
+
 def string_to_int(string):
     """字符串转换为整数"""
     if len(string) == 0:
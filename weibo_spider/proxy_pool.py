@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import sys
+import time
+from contextlib import asynccontextmanager
+
+from .http_client import HttpClient
+from .rate_limiter import BANNED, NETWORK_ERROR, OK
+
+logger = logging.getLogger('spider.proxy_pool')
+
+LATENCY_ALPHA = 0.3  # 延迟指数滑动平均的权重
+PROXY_FAILURE_SIGNALS = (BANNED, NETWORK_ERROR)
+
+
+class Proxy:
+    """代理池中的一个代理"""
+    def __init__(self, url, max_concurrency):
+        self.url = url
+        self.is_socks = url.lower().startswith('socks')
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.latency = 0.0
+        self.failures = 0
+        self.evicted = False
+        self.session = None  # socks代理使用单独的session
+
+    def get(self, session, url, **kwargs):
+        """通过该代理发出GET请求"""
+        if self.is_socks:
+            if self.session is None:
+                try:
+                    from aiohttp_socks import ProxyConnector
+                except ImportError:
+                    logger.warning(
+                        '系统中可能没有安装aiohttp_socks库，请先运行 pip install aiohttp_socks ，再运行程序')
+                    sys.exit()
+                self.session = HttpClient(
+                    getattr(session, 'config', None),
+                    getattr(session, 'trace_configs', None),
+                    connector=ProxyConnector.from_url(self.url))
+            return self.session.get(url, **kwargs)
+        return session.get(url, proxy=self.url, **kwargs)
+
+    def __str__(self):
+        return self.url
+
+
+class ProxyPool:
+    """HTTP/SOCKS代理池
+
+    每个代理有并发上限和延迟统计，连续失败max_failures次的代理会被剔除。
+    同一个key(cookie)固定使用同一个代理，代理被剔除后再分配新的代理。
+    """
+    def __init__(self, proxies, max_concurrency=4, max_failures=3):
+        self.proxies = [Proxy(url, max_concurrency) for url in proxies]
+        self.max_failures = max_failures
+        self.assignments = {}
+
+    def assign(self, key):
+        """返回key固定使用的代理，没有可用代理时返回None"""
+        proxy = self.assignments.get(key)
+        if proxy is not None and not proxy.evicted:
+            return proxy
+        alive = [p for p in self.proxies if not p.evicted]
+        if not alive:
+            logger.warning('代理均不可用，直接连接')
+            return None
+        load = {id(p): 0 for p in alive}
+        for assigned in self.assignments.values():
+            if id(assigned) in load:
+                load[id(assigned)] += 1
+        proxy = min(alive, key=lambda p: (load[id(p)], p.latency))
+        self.assignments[key] = proxy
+        return proxy
+
+    @asynccontextmanager
+    async def slot(self, proxy):
+        """占用代理的一个并发名额，并统计请求延迟"""
+        async with proxy.semaphore:
+            start = time.monotonic()
+            yield
+            latency = time.monotonic() - start
+            proxy.latency = (latency if not proxy.latency else
+                             LATENCY_ALPHA * latency +
+                             (1 - LATENCY_ALPHA) * proxy.latency)
+
+    def record(self, proxy, signal):
+        """记录代理一次请求的结果"""
+        if signal == OK:
+            proxy.failures = 0
+        elif signal in PROXY_FAILURE_SIGNALS:
+            proxy.failures += 1
+            if proxy.failures >= self.max_failures and not proxy.evicted:
+                proxy.evicted = True
+                logger.warning(f'代理{proxy}连续失败{proxy.failures}次，已剔除')
+
+    async def close(self):
+        for proxy in self.proxies:
+            if proxy.session is not None:
+                await proxy.session.close()
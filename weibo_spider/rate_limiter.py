@@ -0,0 +1,285 @@
+import asyncio
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import aiohttp
+
+logger = logging.getLogger('spider.rate_limiter')
+
+# 请求结果分类
+OK = 'ok'
+EMPTY = 'empty'  # 页面正常返回但没有微博，常见于被限制时
+LOGIN = 'login'  # 被重定向到登录页，cookie失效或被封
+BANNED = 'banned'  # HTTP 403/418
+THROTTLED = 'throttled'  # HTTP 429
+SERVER_ERROR = 'server_error'  # HTTP 5xx
+NETWORK_ERROR = 'network_error'
+
+LOGIN_HOSTS = ('passport.weibo.cn', 'passport.weibo.com', 'login.sina.com.cn')
+
+# 触发熔断的连续失败次数，以及熔断时长(秒)的初始值和上限
+BREAKER_THRESHOLD = 3
+BREAKER_COOLDOWN = 60
+MAX_BREAKER_COOLDOWN = 3600
+PROBE_TIMEOUT = 120
+
+# 当前任务中等待按页面内容记录结果的请求，见defer_record
+_deferred = contextvars.ContextVar('deferred_record', default=None)
+
+
+def classify_response(status, url):
+    """根据HTTP状态码和最终url判断请求结果"""
+    host = (urlsplit(str(url)).hostname or '').lower()
+    if host in LOGIN_HOSTS:
+        return LOGIN
+    if status in (403, 418):
+        return BANNED
+    if status == 429:
+        return THROTTLED
+    if status >= 500:
+        return SERVER_ERROR
+    return OK
+
+
+class TokenBucket:
+    """令牌桶：平均每秒产生rate个令牌，最多积攒burst个"""
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def _take(self):
+        """取走一个令牌，调用前需持有_lock"""
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    async def acquire(self):
+        """取走一个令牌，令牌不足时等待"""
+        async with self._lock:
+            await self._take()
+
+
+class AdaptiveTokenBucket(TokenBucket):
+    """根据请求结果自动调整速率的令牌桶，并带有熔断器
+
+    正常响应时速率加性增加，直到配置的rate；出现空页、登录跳转、403/418、429、
+    5xx等信号时速率乘性减小，直到min_rate。连续BREAKER_THRESHOLD次失败后
+    熔断，暂停全部请求，冷却结束后只放行一个探测请求：探测成功则恢复，
+    失败则冷却时间加倍后继续熔断。
+    """
+    def __init__(self, rate, burst, min_rate=None):
+        super().__init__(rate, burst)
+        self.max_rate = self.rate
+        self.min_rate = float(min_rate) if min_rate else self.max_rate / 16
+        self.increase = self.max_rate / 20
+        self.failures = 0
+        self.open_until = 0.0
+        self.cooldown = BREAKER_COOLDOWN
+        self.probing = False
+        self._probe_done = asyncio.Event()
+
+    @property
+    def is_open(self):
+        return self.open_until > 0
+
+    async def acquire(self):
+        """取走一个令牌，返回本次请求是否为熔断后的探测请求"""
+        while True:
+            async with self._lock:
+                if not self.probing:
+                    probe = False
+                    wait = self.open_until - time.monotonic()
+                    if self.is_open:
+                        if wait > 0:
+                            logger.warning(f'请求被限制，暂停{int(wait)}秒后再试')
+                            await asyncio.sleep(wait)
+                        self.probing = True
+                        self._probe_done.clear()
+                        probe = True
+                    # 探测请求在释放锁之前取走令牌，不会被等待的请求挡住
+                    try:
+                        await self._take()
+                    except asyncio.CancelledError:
+                        if probe:
+                            self.abort_probe()
+                        raise
+                    return probe
+            # 在锁外等待探测请求的结果
+            try:
+                await asyncio.wait_for(self._probe_done.wait(), PROBE_TIMEOUT)
+            except asyncio.TimeoutError:
+                # 多个请求同时超时时只熔断一次
+                if self.probing:
+                    self._trip()
+
+    def _trip(self):
+        """打开熔断器"""
+        if self.is_open:
+            self.cooldown = min(self.cooldown * 2, MAX_BREAKER_COOLDOWN)
+        self.open_until = time.monotonic() + self.cooldown
+        self.probing = False
+        self._probe_done.set()
+
+    def abort_probe(self):
+        """探测请求被取消，由下一个请求重新探测"""
+        if self.probing:
+            self.probing = False
+            self._probe_done.set()
+
+    def record(self, signal, probe=False):
+        """记录一次请求结果，probe表示该请求是否为探测请求"""
+        if self.probing or self.is_open:
+            if probe:
+                self._record_probe(signal)
+            # 熔断前发出的请求的结果不影响熔断器
+            return
+        if signal == OK:
+            self.failures = 0
+            self.rate = min(self.max_rate, self.rate + self.increase)
+            return
+        if signal != NETWORK_ERROR:
+            self.rate = max(self.min_rate, self.rate / 2)
+        if signal == EMPTY:
+            return
+        self.failures += 1
+        if self.failures >= BREAKER_THRESHOLD:
+            self._trip()
+
+    def _record_probe(self, signal):
+        if signal == OK:
+            logger.info('探测请求成功，恢复请求')
+            self.failures = 0
+            self.open_until = 0.0
+            self.cooldown = BREAKER_COOLDOWN
+            self.probing = False
+            self._probe_done.set()
+            return
+        if signal != NETWORK_ERROR:
+            self.rate = max(self.min_rate, self.rate / 2)
+        self._trip()
+
+
+class RateLimiter:
+    """按域名分配请求额度的全局限速器
+
+    rate_limit形如{"weibo.cn": {"rate": 1, "burst": 3}, "sinaimg.cn": {...}}，
+    域名本身及其子域名共用一个令牌桶，未配置的域名不限速。
+    """
+    def __init__(self, rate_limit):
+        self.buckets = {}
+        for domain, limit in rate_limit.items():
+            self.buckets[domain.lower()] = AdaptiveTokenBucket(
+                limit['rate'], limit.get('burst', 1), limit.get('min_rate'))
+
+    def get_bucket(self, host):
+        host = (host or '').lower()
+        while host:
+            if host in self.buckets:
+                return self.buckets[host]
+            if '.' not in host:
+                break
+            host = host.split('.', 1)[1]
+        return None
+
+    async def acquire(self, url):
+        """请求url前调用，按其域名的额度等待，返回该请求是否为探测请求"""
+        bucket = self.get_bucket(urlsplit(str(url)).hostname)
+        if bucket is not None:
+            return await bucket.acquire()
+        return False
+
+    def record(self, url, signal, probe=False):
+        """记录请求url的结果，用于调整该域名的速率"""
+        bucket = self.get_bucket(urlsplit(str(url)).hostname)
+        if bucket is not None:
+            if signal != OK:
+                logger.warning(f'{url}请求异常: {signal}')
+            bucket.record(signal, probe)
+
+    def cancel(self, url, probe):
+        """请求url被取消，是探测请求时让其它请求重新探测"""
+        bucket = self.get_bucket(urlsplit(str(url)).hostname)
+        if bucket is not None and probe:
+            bucket.abort_probe()
+
+    def trace_config(self):
+        """返回aiohttp.TraceConfig，使session发出的每个请求都先经过限速器，
+        并根据响应结果调整速率"""
+        async def on_request_start(session, trace_config_ctx, params):
+            trace_config_ctx.url = params.url
+            trace_config_ctx.probe = await self.acquire(params.url)
+
+        async def on_request_end(session, trace_config_ctx, params):
+            signal = classify_response(params.response.status,
+                                       params.response.url)
+            deferred = _deferred.get()
+            if signal == OK and deferred is not None:
+                # 页面可能是空页或登录页，读取内容后再记录
+                deferred.pending.append(
+                    (self, trace_config_ctx.url, trace_config_ctx.probe))
+            else:
+                self.record(trace_config_ctx.url, signal,
+                            trace_config_ctx.probe)
+
+        async def on_request_exception(session, trace_config_ctx, params):
+            # 在acquire中被取消时还没有probe，acquire已自行处理
+            probe = getattr(trace_config_ctx, 'probe', False)
+            if isinstance(params.exception, asyncio.CancelledError):
+                self.cancel(trace_config_ctx.url, probe)
+            else:
+                self.record(trace_config_ctx.url, NETWORK_ERROR, probe)
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_request_exception.append(on_request_exception)
+        return trace_config
+
+
+class DeferredRecord:
+    """页面请求的结果，HTTP层面正常的响应等判断完页面内容后再记录"""
+    def __init__(self):
+        self.pending = []  # (限速器, url, 是否为探测请求)
+
+    def record(self, signal):
+        for limiter, url, probe in self.pending:
+            limiter.record(url, signal, probe)
+        self.pending = []
+
+    def cancel(self):
+        for limiter, url, probe in self.pending:
+            limiter.cancel(url, probe)
+        self.pending = []
+
+
+@contextmanager
+def defer_record():
+    """在with块中发出的请求，正常响应由返回的DeferredRecord按页面的真实结果记录
+
+    块内没有记录就结束时(如读取内容出错)记为网络错误，被取消时不记录。
+    """
+    deferred = DeferredRecord()
+    token = _deferred.set(deferred)
+    try:
+        yield deferred
+    except asyncio.CancelledError:
+        deferred.cancel()
+        raise
+    finally:
+        _deferred.reset(token)
+        deferred.record(NETWORK_ERROR)
@@ -0,0 +1,189 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+logger = logging.getLogger('spider.response_cache')
+
+# 缓存模式
+OFF = 'off'  # 不使用缓存
+RECORD = 'record'  # 总是请求网络，并把响应写入缓存
+REPLAY = 'replay'  # 只读缓存，不请求网络，忽略过期时间
+READ_THROUGH = 'read_through'  # 优先读未过期的缓存，未命中时请求网络并写入缓存
+CACHE_MODES = (OFF, RECORD, REPLAY, READ_THROUGH)
+
+# 各类url的默认缓存时间(秒)：主页和微博列表变化快，评论页和图片页基本不变
+DEFAULT_TTL = {
+    'profile': 600,
+    'info': 86400,
+    'comment': 30 * 86400,
+    'picAll': 30 * 86400,
+    'photo': 86400,
+    'album': 86400,
+    'video': 7 * 86400,
+    'other': 86400,
+}
+DEFAULT_MAX_SIZE_MB = 1024
+INDEX_FILE = 'index.jsonl'
+
+
+class CacheMiss(Exception):
+    """replay模式下缓存中没有该url"""
+
+
+def url_class(url):
+    """返回url所属的类别，用于选择缓存时间"""
+    parts = urlsplit(url)
+    path = parts.path
+    if parts.hostname == 'm.weibo.cn' and path.startswith('/s/video'):
+        return 'video'
+    if path.startswith('/comment/'):
+        return 'comment'
+    if path.startswith('/mblog/picAll/'):
+        return 'picAll'
+    if path.startswith('/album/'):
+        return 'album'
+    if path.endswith('/profile'):
+        return 'profile'
+    if path.endswith('/info'):
+        return 'info'
+    if path.endswith('/photo'):
+        return 'photo'
+    return 'other'
+
+
+class ResponseCache:
+    """按内容寻址的磁盘响应缓存
+
+    响应体保存在objects目录下，文件名为其sha256；index.jsonl是只追加的索引，
+    每行记录一个url对应的响应，同一url以最后一行为准。缓存总大小超过上限时，
+    按写入时间从旧到新淘汰。
+    """
+    def __init__(self, cache_dir, mode=READ_THROUGH, ttl=None,
+                 max_size_mb=DEFAULT_MAX_SIZE_MB):
+        self.cache_dir = Path(cache_dir)
+        self.object_dir = self.cache_dir / 'objects'
+        self.object_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.cache_dir / INDEX_FILE
+        self.mode = mode
+        self.ttl = dict(DEFAULT_TTL)
+        if ttl:
+            self.ttl.update(ttl)
+        self.max_size = max_size_mb * 1024 * 1024
+        self.entries = {}  # url -> 索引记录，按写入时间排序
+        self.sizes = {}  # sha -> 响应体大小
+        self.refs = {}  # sha -> 引用该响应体的url数
+        self.total_size = 0
+        self._load_index()
+        self.index_file = open(self.index_path, 'a', encoding='utf-8')
+
+    def _load_index(self):
+        lines = 0
+        if self.index_path.is_file():
+            with open(self.index_path, encoding='utf-8') as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # 上次运行中断时写了一半的行
+                    self.entries.pop(entry['url'], None)
+                    if entry.get('sha'):
+                        self.entries[entry['url']] = entry
+        for url, entry in list(self.entries.items()):
+            sha = entry['sha']
+            if sha not in self.sizes:
+                path = self._object_path(sha)
+                if not path.is_file():
+                    del self.entries[url]
+                    continue
+                self.sizes[sha] = path.stat().st_size
+                self.total_size += self.sizes[sha]
+            self.refs[sha] = self.refs.get(sha, 0) + 1
+        if lines > 2 * len(self.entries) + 100:
+            self._compact_index()
+
+    def _compact_index(self):
+        """用当前有效的记录重写索引文件"""
+        tmp_path = self.index_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self.index_path)
+
+    def _object_path(self, sha):
+        return self.object_dir / sha[:2] / sha
+
+    def _append(self, entry):
+        self.index_file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.index_file.flush()
+
+    def get(self, url):
+        """返回(响应体, 状态码, 最终url)，未命中或已过期时返回None"""
+        if self.mode in (OFF, RECORD):
+            return None
+        entry = self.entries.get(url)
+        if entry is None:
+            return None
+        if (self.mode != REPLAY and
+                time.time() - entry['time'] > self.ttl[url_class(url)]):
+            return None
+        try:
+            with open(self._object_path(entry['sha']), 'rb') as f:
+                content = f.read()
+        except OSError:
+            return None
+        return content, entry['status'], entry['final_url']
+
+    def put(self, url, content, status=200, final_url=None):
+        """保存url的响应"""
+        if self.mode not in (RECORD, READ_THROUGH):
+            return
+        sha = hashlib.sha256(content).hexdigest()
+        old = self.entries.pop(url, None)
+        if sha not in self.sizes:
+            path = self._object_path(sha)
+            path.parent.mkdir(exist_ok=True)
+            tmp_path = path.with_suffix('.tmp')
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+            self.sizes[sha] = len(content)
+            self.total_size += len(content)
+        self.refs[sha] = self.refs.get(sha, 0) + 1
+        if old is not None:
+            self._release(old['sha'])
+        entry = {
+            'url': url,
+            'sha': sha,
+            'status': status,
+            'final_url': str(final_url or url),
+            'time': time.time(),
+        }
+        self.entries[url] = entry
+        self._append(entry)
+        self._evict()
+
+    def _release(self, sha):
+        """url不再引用sha，没有url引用时删除响应体"""
+        self.refs[sha] -= 1
+        if self.refs[sha] <= 0:
+            del self.refs[sha]
+            self.total_size -= self.sizes.pop(sha)
+            try:
+                self._object_path(sha).unlink()
+            except OSError:
+                pass
+
+    def _evict(self):
+        while self.total_size > self.max_size and len(self.entries) > 1:
+            url = next(iter(self.entries))
+            entry = self.entries.pop(url)
+            self._release(entry['sha'])
+            self._append({'url': url, 'sha': None})
+
+    def close(self):
+        self.index_file.close()
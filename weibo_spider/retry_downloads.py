@@ -0,0 +1,8 @@
+import sys
+from pathlib import Path
+
+from absl import app
+sys.path.append(str(Path.cwd().parent.absolute()))
+from weibo_spider.spider import retry_downloads
+
+app.run(retry_downloads)
@@ -0,0 +1,110 @@
+import bisect
+import heapq
+import logging
+import mmap
+import os
+from array import array
+from pathlib import Path
+
+logger = logging.getLogger('spider.seen_index')
+
+# 已写入但未保存的mid达到该数量时自动保存，程序中断时不至于全部丢失
+AUTO_SAVE_COUNT = 1000
+
+
+def weibo_mid(weibo_id):
+    """把微博id转换成数字mid，无法转换时返回None"""
+    # 在函数内导入，避免crawl_context与parser之间循环导入
+    from .parser.util import bid2mid
+    try:
+        mid = int(weibo_id) if weibo_id.isdigit() else int(bid2mid(weibo_id))
+    except (ValueError, AttributeError):
+        return None
+    return mid if 0 <= mid < 2**64 else None
+
+
+class SeenIndex:
+    """已获取微博的去重索引
+
+    微博id转换为数字mid后按uint64升序保存在文件中，通过mmap二分查找，每条只占8字节；
+    本次运行新获取的mid放在内存集合中，写入结果文件后由commit标记为已保存，save时
+    合并写回文件，之后的运行也能据此去重。path为None时只在内存中去重。
+    用法与list相同：weibo_id in index、index.append(weibo_id)。
+    """
+    def __init__(self, path=None):
+        self.path = Path(path) if path is not None else None
+        self.pending = set()  # 本次获取但还没有写入结果文件的mid
+        self.delta = set()  # 已写入结果文件、还没有合并到索引文件的mid
+        self.others = set()  # 无法转换为mid的id，只在内存中去重
+        self._file = None
+        self._mmap = None
+        self._base = ()
+        self._open()
+
+    def _open(self):
+        if self.path is None or not self.path.is_file():
+            return
+        size = self.path.stat().st_size
+        if size < 8:
+            return
+        self._file = open(self.path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        # 忽略上次写到一半的末尾
+        self._base = memoryview(self._mmap)[:size - size % 8].cast('Q')
+
+    def _close_mmap(self):
+        if self._mmap is not None:
+            self._base.release()
+            self._base = ()
+            self._mmap.close()
+            self._file.close()
+            self._mmap = self._file = None
+
+    def _in_base(self, mid):
+        i = bisect.bisect_left(self._base, mid)
+        return i < len(self._base) and self._base[i] == mid
+
+    def __contains__(self, weibo_id):
+        mid = weibo_mid(weibo_id)
+        if mid is None:
+            return weibo_id in self.others
+        return mid in self.pending or mid in self.delta or self._in_base(mid)
+
+    def __len__(self):
+        return (len(self._base) + len(self.pending) + len(self.delta) +
+                len(self.others))
+
+    def append(self, weibo_id):
+        """记录本次获取到的微博"""
+        mid = weibo_mid(weibo_id)
+        if mid is None:
+            self.others.add(weibo_id)
+        elif not self._in_base(mid):
+            self.pending.add(mid)
+
+    def commit(self, weibo_ids):
+        """标记微博已写入结果文件，save时会保存到索引文件"""
+        for weibo_id in weibo_ids:
+            mid = weibo_mid(weibo_id)
+            if mid in self.pending:
+                self.pending.remove(mid)
+                self.delta.add(mid)
+        if len(self.delta) >= AUTO_SAVE_COUNT:
+            self.save()
+
+    def save(self):
+        """把已写入结果文件的mid合并到索引文件"""
+        if self.path is None or not self.delta:
+            return
+        merged = array('Q', heapq.merge(self._base, sorted(self.delta)))
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            merged.tofile(f)
+        self._close_mmap()
+        os.replace(tmp_path, self.path)
+        self.delta = set()
+        self._open()
+        logger.info(f'已保存{len(merged)}条微博id到{self.path}')
+
+    def close(self):
+        self._close_mmap()
@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: UTF-8 -*-
 
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Union
 from pydantic import ValidationError
 import json
 import logging
@@ -11,21 +11,34 @@ import random
 import shutil
 import sys
 import asyncio
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import date, datetime, timedelta
 from time import sleep
 
 import aiohttp
 from absl import app, flags
+from lxml import etree
 from tqdm import tqdm
 
 from . import config_util, datetime_util
 from .config import SpiderConfig
-from .downloader import AvatarPictureDownloader, Downloader
+from .cookie_pool import CookiePool
+from .crawl_context import PageCrawlContext, UserCrawlContext
+from .downloader import (AvatarPictureDownloader, DownloadEngine, DownloadJob,
+                         DownloadManifest, ImgDownloader, MediaStore,
+                         VideoDownloader)
+from .frontier import Frontier
+from .http_client import HttpClient, backoff_delay
 from .parser import AlbumParser, IndexParser, PageParser, PhotoParser
-from .parser.util import handle_html_async
-from .user import User
-from .writer import Writer
+from .parser.util import fetch_page_async, handle_html_async, has_weibo_list
+from .page_archive import ArchiveSession, PageArchive, profile_page
+from .proxy_pool import ProxyPool
+from .rate_limiter import RateLimiter
+from .seen_index import SeenIndex
+from .response_cache import (CACHE_MODES, DEFAULT_MAX_SIZE_MB, OFF,
+                             ResponseCache)
+from .text_util import setup_console
 
 FLAGS = flags.FLAGS
 
@@ -33,6 +46,11 @@ flags.DEFINE_string('config_path', None, 'The path to config.json.')
 flags.DEFINE_string('u', None, 'The user_id we want to input.')
 flags.DEFINE_string('user_id_list', None, 'The path to user_id_list.txt.')
 flags.DEFINE_string('output_dir', None, 'The dir path to store results.')
+flags.DEFINE_enum('cache_mode', None, CACHE_MODES,
+                  'Override the response cache mode in config.json.')
+
+REPARSE_SINCE_DATE = '1900-01-01'
+RETRY_ROUNDS = 3  # retry_downloads重新下载失败文件的轮数
 
 logging_path = Path(__file__).parent / 'logging.conf'
 logging.config.fileConfig(logging_path)
@@ -60,18 +78,74 @@ class Spider:
             max(config.random_wait_seconds)
         ]
         self.global_wait: List[List[int]] = config.global_wait
+        self.rate_limiter: Optional[RateLimiter] = None  # 配置rate_limit后取代上述固定等待
+        if config.rate_limit:
+            self.rate_limiter = RateLimiter(config.rate_limit)
         self.page_count: int = 0
         self.write_mode: List[str] = config.write_mode
         self.pic_download: int = config.pic_download
         self.video_download: int = config.video_download
         self.file_download_timeout: List[int] = config.file_download_timeout
+        self.video_segments: int = config.video_segments
+        # 所有用户的图片和视频下载共用一个引擎，并发上限对整个程序生效
+        self.download_engine = DownloadEngine(config.download_concurrency,
+                                              config.download_limit_per_host)
         self.result_dir_name: int = config.result_dir_name
-        self.cookie: str = config.cookie
+        self.incremental: int = config.incremental
+        self.skip_written: int = config.skip_written
+        self.detail_concurrency: int = config.detail_concurrency
+        self.page_concurrency: int = config.page_concurrency
+        self.date_windows: int = config.date_windows
+        self.parse_workers: int = config.parse_workers
+        self.parse_executor: Optional[ProcessPoolExecutor] = None  # 解析微博列表页的进程池
+        self.cookie: Union[str, CookiePool] = config.cookie
+        cookie_list = None
+        if isinstance(config.cookie, list):
+            cookie_list = config.cookie
+        elif config.cookie.endswith('.txt'):
+            cookie_path = Path(config.cookie)
+            if not cookie_path.is_absolute():
+                cookie_path = Path.cwd() / cookie_path
+            if not cookie_path.is_file():
+                logger.warning(f'不存在{cookie_path}文件')
+                sys.exit()
+            cookie_list = config_util.get_cookie_list(cookie_path)
+        self.proxy_pool: Optional[ProxyPool] = None
+        if config.proxy_config:
+            self.proxy_pool = ProxyPool(
+                config.proxy_config['proxies'],
+                config.proxy_config.get('max_concurrency', 4),
+                config.proxy_config.get('max_failures', 3))
+            if cookie_list is None:
+                # 代理与账号绑定，单个cookie也放入cookie池
+                cookie_list = [config.cookie]
+        if cookie_list is not None:
+            self.cookie = CookiePool(cookie_list, config.cookie_rate_limit,
+                                     self.proxy_pool)
+            logger.info(f'使用{len(self.cookie)}个cookie爬取')
         self.mysql_config: Optional[Dict[str, Any]] = config.mysql_config
         self.sqlite_config: Optional[str] = config.sqlite_config
         self.kafka_config: Optional[Dict[str, Any]] = config.kafka_config
         self.mongo_config: Optional[Dict[str, Any]] = config.mongo_config
         self.post_config: Optional[Dict[str, Any]] = config.post_config
+        self.http_config: Optional[Dict[str, Any]] = config.http_config
+        self.response_cache: Optional[ResponseCache] = None
+        cache_config = dict(config.cache_config or {})
+        if FLAGS.cache_mode:
+            cache_config['mode'] = FLAGS.cache_mode
+        if cache_config.get('mode', OFF) != OFF:
+            cache_dir = cache_config.get('dir')
+            if not cache_dir:
+                output_dir = (Path(FLAGS.output_dir) if FLAGS.output_dir
+                              is not None else Path.cwd() / 'weibo')
+                cache_dir = output_dir / '.cache'
+            self.response_cache = ResponseCache(
+                cache_dir, cache_config['mode'], cache_config.get('ttl'),
+                cache_config.get('max_size_mb', DEFAULT_MAX_SIZE_MB))
+            logger.info(f'响应缓存模式: {cache_config["mode"]}，缓存目录: {cache_dir}')
+        self.archive_config: Optional[Dict[str, str]] = config.archive_config
+        self.media_store_config: Optional[Dict[str, str]] = config.media_store_config
+        self.media_store: Optional[MediaStore] = None  # 所有用户共用的图片和视频存储
         
         self.user_config_file_path: str = ''
         user_id_list = config.user_id_list
@@ -117,128 +191,241 @@ class Spider:
             for user_config in user_config_list:
                 user_config['end_date'] = self.end_date
         self.user_config_list: List[Dict[str, str]] = user_config_list  # 要爬取的微博用户的user_config列表
-        self.user_config: Dict[str, str] = {}  # 用户配置,包含用户id和since_date
-        self.new_since_date: str = ''  # 完成某用户爬取后，自动生成对应用户新的since_date
-        self.user: User = User()  # 存储爬取到的用户信息
-        self.got_num: int = 0  # 存储爬取到的微博数
-        self.weibo_id_list: List[str] = []  # 存储爬取到的所有微博id
-        self.session: Optional[aiohttp.ClientSession] = None # aiohttp session
-        
-        self.writers: List[Writer] = []
-        self.downloaders: List[Downloader] = []
+        self.user_concurrency: int = config.user_concurrency  # 同时爬取的用户数
+        self.session: Optional[HttpClient] = None  # 共用的HTTP客户端
 
-    async def write_weibo(self, weibos: List[Any]) -> None:
+    async def write_weibo(self, ctx: UserCrawlContext, weibos: List[Any]) -> None:
         """将爬取到的信息写入文件或数据库"""
-        for downloader in self.downloaders:
+        for downloader in ctx.downloaders:
             await downloader.download_files(weibos, self.session)
-        for writer in self.writers:
+        for writer in ctx.writers:
             await writer.write_weibo(weibos)
+        ctx.seen_ids.commit(w.id for w in weibos)
 
-    async def write_user(self, user: User) -> None:
+    async def write_user(self, ctx: UserCrawlContext) -> None:
         """将用户信息写入数据库"""
-        for writer in self.writers:
-            await writer.write_user(user)
+        for writer in ctx.writers:
+            await writer.write_user(ctx.user)
 
-    async def get_user_info(self, user_uri: str) -> None:
+    async def get_user_info(self, ctx: UserCrawlContext) -> None:
         """获取用户信息"""
+        user_uri = ctx.user_config['user_uri']
         url = f'https://weibo.cn/{user_uri}/profile'
         selector = await handle_html_async(self.cookie, url, self.session)
-        self.user = await IndexParser(self.cookie, user_uri, selector=selector).get_user_async(self.session)
+        ctx.user = await IndexParser(self.cookie, user_uri, selector=selector).get_user_async(self.session)
         self.page_count += 1
 
-    async def download_user_avatar(self, user_uri: str) -> None:
+    async def download_user_avatar(self, ctx: UserCrawlContext) -> None:
         """下载用户头像"""
-        # Note: This remains synchronous for now as it's a minor part of the flow
-        avatar_album_url = PhotoParser(self.cookie,
-                                       user_uri).extract_avatar_album_url()
-        pic_urls = AlbumParser(self.cookie,
-                               avatar_album_url).extract_pic_urls()
-        await AvatarPictureDownloader(
-            self._get_filepath('img'),
-            self.file_download_timeout).handle_download(pic_urls, self.session)
-
-    async def get_weibo_info(self):
+        avatar_album_url = await PhotoParser(
+            self.cookie, ctx.user_config['user_uri'],
+            defer_fetch=True).extract_avatar_album_url_async(self.session)
+        pic_urls = await AlbumParser(
+            self.cookie, avatar_album_url,
+            defer_fetch=True).extract_pic_urls_async(self.session)
+        downloader = AvatarPictureDownloader(self._get_filepath(ctx, 'img'),
+                                             self.file_download_timeout)
+        downloader.random_wait = self.rate_limiter is None
+        downloader.engine = self.download_engine
+        downloader.media_store = self.media_store
+        downloader.manifest = ctx.manifest
+        await downloader.handle_download(pic_urls, self.session)
+
+    async def get_weibo_info(self, ctx: UserCrawlContext):
         """获取微博信息"""
         try:
             since_date = datetime_util.str_to_time(
-                self.user_config['since_date'])
+                ctx.user_config['since_date'])
             now = datetime.now()
             if since_date <= now:
-                # Async fetch page num
-                user_uri = self.user_config['user_uri']
-                url = f'https://weibo.cn/{user_uri}/profile'
-                selector = await handle_html_async(self.cookie, url, self.session)
-                page_num = IndexParser(self.cookie, user_uri, selector=selector).get_page_num()
-                
-                self.page_count += 1
-                if self.page_count > 2 and (self.page_count +
-                                            page_num) > self.global_wait[0][0]:
-                    wait_seconds = int(
-                        self.global_wait[0][1] *
-                        min(1, self.page_count / self.global_wait[0][0]))
-                    logger.info(f'即将进入全局等待时间，{wait_seconds}秒后程序继续执行')
-                    for i in tqdm(range(wait_seconds)):
-                        await asyncio.sleep(1)
-                    self.page_count = 0
-                    self.global_wait.append(self.global_wait.pop(0))
-                page1 = 0
-                random_pages = random.randint(*self.random_wait_pages)
-                for page in tqdm(range(1, page_num + 1), desc='Progress'):
-                    # Get URL from parser without fetching
-                    parser_temp = PageParser(
-                        self.cookie,
-                        self.user_config, page, self.filter, defer_fetch=True)
-                    
-                    # Async fetch with retry
-                    selector = None
-                    for _ in range(3):
-                        selector = await handle_html_async(self.cookie, parser_temp.url, self.session)
-                        if selector is not None:
-                             info = selector.xpath("//div[@class='c']")
-                             if info and len(info) > 0:
-                                 break
-                    
-                    parser = PageParser(self.cookie, self.user_config, page, self.filter, selector=selector)
-                    
-                    weibos, self.weibo_id_list, to_continue = parser.get_one_page(self.weibo_id_list)
-                    
-                    logger.info(
-                        f"{'-' * 30}已获取{self.user.nickname}({self.user.id})的第{page}页微博{'-' * 30}"
-                    )
-                    self.page_count += 1
-                    if weibos:
+                if self.date_windows > 1:
+                    async for weibos in self._get_weibo_info_by_windows(ctx):
                         yield weibos
-                    if not to_continue:
-                        break
-
-                    if (page - page1) % random_pages == 0 and page < page_num:
-                        await asyncio.sleep(random.randint(*self.random_wait_seconds))
-                        page1 = page
-                        random_pages = random.randint(*self.random_wait_pages)
+                else:
+                    # Async fetch page num
+                    user_uri = ctx.user_config['user_uri']
+                    url = f'https://weibo.cn/{user_uri}/profile'
+                    selector = await handle_html_async(self.cookie, url, self.session)
+                    page_num = IndexParser(self.cookie, user_uri, selector=selector).get_page_num()
 
-                    if self.page_count >= self.global_wait[0][0]:
-                        logger.info(f'即将进入全局等待时间，{self.global_wait[0][1]}秒后程序继续执行')
-                        for i in tqdm(range(self.global_wait[0][1])):
+                    self.page_count += 1
+                    if (self.rate_limiter is None and self.page_count > 2 and
+                            (self.page_count + page_num) > self.global_wait[0][0]):
+                        wait_seconds = int(
+                            self.global_wait[0][1] *
+                            min(1, self.page_count / self.global_wait[0][0]))
+                        logger.info(f'即将进入全局等待时间，{wait_seconds}秒后程序继续执行')
+                        for i in tqdm(range(wait_seconds)):
                             await asyncio.sleep(1)
                         self.page_count = 0
                         self.global_wait.append(self.global_wait.pop(0))
+                    async for weibos in self._get_pages(ctx, ctx.user_config,
+                                                        page_num):
+                        yield weibos
 
                 if self.user_config_file_path or FLAGS.u:
                     config_util.update_user_config_file(
                         self.user_config_file_path,
-                        self.user_config['user_uri'],
-                        self.user.nickname,
-                        self.new_since_date,
+                        ctx.user_config['user_uri'],
+                        ctx.user.nickname,
+                        ctx.new_since_date,
                     )
         except Exception as e:
             logger.exception(e)
+            if ctx.frontier is not None:
+                ctx.frontier.abort()
+
+    async def _get_pages(self, ctx: UserCrawlContext,
+                         user_config: Dict[str, str], page_num: int,
+                         first_content: Optional[bytes] = None):
+        """按顺序获取user_config对应的第1到page_num页微博"""
+        crawl = PageCrawlContext(user_config, ctx.seen_ids,
+                                 frontier=ctx.frontier)
+        page1 = 0
+        random_pages = random.randint(*self.random_wait_pages)
+        # 预取窗口：解析第page页时，后续若干页已在请求中
+        page_tasks = {}
+        next_page = 1
+        if first_content is not None:
+            page_tasks[1] = asyncio.get_running_loop().create_future()
+            page_tasks[1].set_result(first_content)
+            next_page = 2
+        try:
+            for page in tqdm(range(1, page_num + 1), desc='Progress'):
+                # 增量爬取时多数用户只需要第1页，看到第1页的结果后再预取后续页面
+                page_concurrency = (1 if ctx.frontier is not None and page == 1
+                                    else self.page_concurrency)
+                while (next_page <= page_num and
+                       next_page < page + page_concurrency):
+                    page_tasks[next_page] = asyncio.create_task(
+                        self._get_page_content(user_config, next_page))
+                    next_page += 1
+                content = await page_tasks.pop(page)
+
+                parser = PageParser(self.cookie, user_config, page, self.filter,
+                                    defer_fetch=True, content=content,
+                                    detail_concurrency=self.detail_concurrency,
+                                    crawl=crawl)
+
+                weibos, _, _ = await parser.get_one_page_async(
+                    crawl.seen_ids, self.session, self.parse_executor)
 
-    def _get_filepath(self, type: str) -> Path:
+                logger.info(
+                    f"{'-' * 30}已获取{ctx.user.nickname}({ctx.user.id})的第{page}页微博{'-' * 30}"
+                )
+                self.page_count += 1
+                if weibos:
+                    yield weibos
+                if crawl.stopped:
+                    break
+
+                if self.rate_limiter is not None:
+                    # 已由限速器控制请求速率，无需固定等待
+                    continue
+
+                if (page - page1) % random_pages == 0 and page < page_num:
+                    await asyncio.sleep(random.randint(*self.random_wait_seconds))
+                    page1 = page
+                    random_pages = random.randint(*self.random_wait_pages)
+
+                if self.page_count >= self.global_wait[0][0]:
+                    logger.info(f'即将进入全局等待时间，{self.global_wait[0][1]}秒后程序继续执行')
+                    for i in tqdm(range(self.global_wait[0][1])):
+                        await asyncio.sleep(1)
+                    self.page_count = 0
+                    self.global_wait.append(self.global_wait.pop(0))
+        finally:
+            # 停止翻页时取消已发出但不再需要的页面请求
+            for task in page_tasks.values():
+                task.cancel()
+            await asyncio.gather(*page_tasks.values(),
+                                 return_exceptions=True)
+
+    async def _get_window_weibos(self, ctx: UserCrawlContext,
+                                 window_config: Dict[str, str]):
+        """获取一个时间窗口内的微博"""
+        content = await self._get_page_content(window_config, 1)
+        page_num = 1
+        if content:
+            page_num = IndexParser(self.cookie, window_config['user_uri'],
+                                   selector=etree.HTML(content)).get_page_num() or 1
+        self.page_count += 1
+        logger.info(f"时间窗口{window_config['since_date']}~"
+                    f"{window_config['end_date']}共{page_num}页")
+        async for weibos in self._get_pages(ctx, window_config, page_num,
+                                            first_content=content):
+            yield weibos
+
+    async def _get_weibo_info_by_windows(self, ctx: UserCrawlContext):
+        """将since_date到end_date分成多个时间窗口并发获取，结果按微博id去重"""
+        windows = datetime_util.split_date_range(
+            ctx.user_config['since_date'], ctx.user_config['end_date'],
+            self.date_windows)
+        if not windows:
+            logger.warning(f"since_date({ctx.user_config['since_date']})晚于"
+                           f"end_date({ctx.user_config['end_date']})，没有需要获取的微博")
+            return
+        queue = asyncio.Queue()
+
+        async def crawl(since_date, end_date):
+            window_config = dict(ctx.user_config,
+                                 since_date=since_date,
+                                 end_date=end_date)
+            try:
+                async for weibos in self._get_window_weibos(ctx, window_config):
+                    await queue.put(weibos)
+            except Exception as e:
+                logger.exception(e)
+                if ctx.frontier is not None:
+                    ctx.frontier.abort()
+            finally:
+                await queue.put(None)
+
+        tasks = [
+            asyncio.create_task(crawl(since_date, end_date))
+            for since_date, end_date in windows
+        ]
+        try:
+            finished = 0
+            while finished < len(tasks):
+                weibos = await queue.get()
+                if weibos is None:
+                    finished += 1
+                    continue
+                yield weibos
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _get_page_content(self, user_config: Dict[str, str],
+                                page: int) -> Optional[bytes]:
+        """异步获取第page页微博页面的原始内容，空页面最多尝试3次"""
+        # Get URL from parser without fetching
+        parser = PageParser(self.cookie, user_config, page, self.filter,
+                            defer_fetch=True)
+        content = None
+        for _ in range(3):
+            # 网络错误已由HttpClient重试，这里只重试没有微博的空页面
+            content = await fetch_page_async(self.cookie, parser.url,
+                                             self.session)
+            # 空页面已由fetch_page_async记录到限速器
+            if not content or has_weibo_list(content):
+                break
+        return content
+
+    def _open_seen_index(self, ctx: UserCrawlContext) -> SeenIndex:
+        """返回用户的去重索引，skip_written为1时之前运行中已写入的微博不再重复获取"""
+        if self.skip_written:
+            return SeenIndex(self._get_filepath(ctx, 'seen'))
+        return SeenIndex()
+
+    def _get_filepath(self, ctx: UserCrawlContext, type: str) -> Path:
         """获取结果文件路径"""
         try:
-            dir_name = self.user.nickname
+            dir_name = ctx.user.nickname
             if self.result_dir_name:
-                dir_name = self.user.id
+                dir_name = ctx.user.id
             if FLAGS.output_dir is not None:
                 file_dir = Path(FLAGS.output_dir) / dir_name
             else:
@@ -249,128 +436,332 @@ class Spider:
                 file_dir.mkdir(parents=True, exist_ok=True)
             if type == 'img' or type == 'video':
                 return file_dir
-            file_path = file_dir / f'{self.user.id}.{type}'
+            file_path = file_dir / f'{ctx.user.id}.{type}'
             return file_path
         except Exception as e:
             logger.exception(e)
             return Path() # Return empty path on error to match signature
 
-    def initialize_info(self, user_config: Dict[str, str]) -> None:
+    def initialize_info(self, ctx: UserCrawlContext) -> None:
         """初始化爬虫信息"""
-        self.got_num = 0
-        self.user_config = user_config
-        self.weibo_id_list = []
         if self.end_date == 'now':
-            self.new_since_date = datetime.now().strftime('%Y-%m-%d %H:%M')
+            ctx.new_since_date = datetime.now().strftime('%Y-%m-%d %H:%M')
         else:
-            self.new_since_date = self.end_date
-        self.writers = []
+            ctx.new_since_date = self.end_date
+        ctx.writers = []
         if 'csv' in self.write_mode:
             from .writer import CsvWriter
 
-            self.writers.append(
-                CsvWriter(self._get_filepath('csv'), self.filter))
+            ctx.writers.append(
+                CsvWriter(self._get_filepath(ctx, 'csv'), self.filter))
         if 'txt' in self.write_mode:
             from .writer import TxtWriter
 
-            self.writers.append(
-                TxtWriter(self._get_filepath('txt'), self.filter))
+            ctx.writers.append(
+                TxtWriter(self._get_filepath(ctx, 'txt'), self.filter))
         if 'json' in self.write_mode:
             from .writer import JsonWriter
 
-            self.writers.append(JsonWriter(self._get_filepath('json')))
+            ctx.writers.append(JsonWriter(self._get_filepath(ctx, 'json')))
         if 'mysql' in self.write_mode:
             from .writer import MySqlWriter
 
-            self.writers.append(MySqlWriter(self.mysql_config))
+            ctx.writers.append(MySqlWriter(self.mysql_config))
         if 'mongo' in self.write_mode:
             from .writer import MongoWriter
 
-            self.writers.append(MongoWriter(self.mongo_config))
+            ctx.writers.append(MongoWriter(self.mongo_config))
         if 'sqlite' in self.write_mode:
             from .writer import SqliteWriter
 
-            self.writers.append(SqliteWriter(self.sqlite_config))
+            ctx.writers.append(SqliteWriter(self.sqlite_config))
 
         if 'kafka' in self.write_mode:
             from .writer import KafkaWriter
 
-            self.writers.append(KafkaWriter(self.kafka_config))
+            ctx.writers.append(KafkaWriter(self.kafka_config))
 
         if 'post' in self.write_mode:
             from .writer import PostWriter
 
-            self.writers.append(PostWriter(self.post_config))
+            ctx.writers.append(PostWriter(self.post_config))
 
-        self.downloaders = []
+        ctx.downloaders = []
         if self.pic_download == 1:
             from .downloader import (
                 OriginPictureDownloader,
                 RetweetPictureDownloader)
 
-            self.downloaders.append(
-                OriginPictureDownloader(self._get_filepath('img'),
+            ctx.downloaders.append(
+                OriginPictureDownloader(self._get_filepath(ctx, 'img'),
                                         self.file_download_timeout))
         if self.pic_download and not self.filter:
-            self.downloaders.append(
-                RetweetPictureDownloader(self._get_filepath('img'),
+            ctx.downloaders.append(
+                RetweetPictureDownloader(self._get_filepath(ctx, 'img'),
                                          self.file_download_timeout))
         if self.video_download == 1:
             from .downloader import VideoDownloader
 
-            self.downloaders.append(
-                VideoDownloader(self._get_filepath('video'),
-                                self.file_download_timeout))
+            ctx.downloaders.append(
+                VideoDownloader(self._get_filepath(ctx, 'video'),
+                                self.file_download_timeout,
+                                self.video_segments))
+        for downloader in ctx.downloaders:
+            downloader.random_wait = self.rate_limiter is None
+            downloader.engine = self.download_engine
+            downloader.media_store = self.media_store
 
     async def get_one_user(self, user_config: Dict[str, str]) -> None:
         """获取一个用户的微博"""
+        ctx = None
         try:
-            await self.get_user_info(user_config['user_uri'])
-            logger.info(self.user)
+            ctx = UserCrawlContext(user_config)
+            await self.get_user_info(ctx)
+            if ctx.user is None:
+                logger.warning(f"无法获取用户{user_config['user_uri']}的信息，跳过该用户")
+                return
+            logger.info(ctx.user)
             logger.info('*' * 100)
 
-            self.initialize_info(user_config)
-            await self.write_user(self.user)
+            self.initialize_info(ctx)
+            ctx.seen_ids = self._open_seen_index(ctx)
+            if self.incremental:
+                ctx.frontier = Frontier(self._get_filepath(ctx, 'frontier'))
+            if self.pic_download or self.video_download:
+                # 下载记录中已完成的文件不再逐个检查
+                ctx.manifest = DownloadManifest(
+                    self._get_filepath(ctx, 'downloads'))
+                for downloader in ctx.downloaders:
+                    downloader.manifest = ctx.manifest
+            await self.write_user(ctx)
             logger.info('*' * 100)
 
             # 下载用户头像相册中的图片。
             if self.pic_download:
-                await self.download_user_avatar(user_config['user_uri'])
+                await self.download_user_avatar(ctx)
 
-            async for weibos in self.get_weibo_info():
-                await self.write_weibo(weibos)
-                self.got_num += len(weibos)
+            async for weibos in self.get_weibo_info(ctx):
+                await self.write_weibo(ctx, weibos)
+                ctx.got_num += len(weibos)
+            if ctx.frontier is not None:
+                ctx.frontier.save()
             if not self.filter:
-                logger.info(f'共爬取{self.got_num}条微博')
+                logger.info(f'{ctx.user.nickname}共爬取{ctx.got_num}条微博')
             else:
-                logger.info(f'共爬取{self.got_num}条原创微博')
+                logger.info(f'{ctx.user.nickname}共爬取{ctx.got_num}条原创微博')
             logger.info('信息抓取完毕')
             logger.info('*' * 100)
         except Exception as e:
             logger.exception(e)
+        finally:
+            if ctx is not None:
+                for writer in ctx.writers:
+                    await writer.close()
+                ctx.seen_ids.save()
+                ctx.seen_ids.close()
+                if ctx.manifest is not None:
+                    ctx.manifest.close()
 
     async def start(self) -> None:
         """运行爬虫"""
+        page_archive = None
         try:
             if not self.user_config_list:
                 logger.info(
                     '没有配置有效的user_id，请通过config.json或user_id_list.txt配置user_id')
                 return
             
-            async with aiohttp.ClientSession() as session:
+            page_archive = self._open_archive()
+            self.media_store = self._open_media_store()
+            if self.parse_workers > 0:
+                self.parse_executor = ProcessPoolExecutor(self.parse_workers)
+            async with HttpClient(
+                    self.http_config, self._trace_configs(),
+                    response_cache=self.response_cache,
+                    page_archive=page_archive) as session:
                 self.session = session
+                # 最多同时爬取user_concurrency个用户，每个用户有独立的UserCrawlContext
+                semaphore = asyncio.Semaphore(self.user_concurrency)
+
+                async def run(user_config):
+                    try:
+                        await self.get_one_user(user_config)
+                    finally:
+                        semaphore.release()
+
+                tasks = []
                 user_count = 0
                 user_count1 = random.randint(*self.random_wait_pages)
                 random_users = random.randint(*self.random_wait_pages)
                 for user_config in self.user_config_list:
-                    if (user_count - user_count1) % random_users == 0:
+                    await semaphore.acquire()
+                    if (self.rate_limiter is None and
+                            (user_count - user_count1) % random_users == 0):
                         await asyncio.sleep(random.randint(*self.random_wait_seconds))
                         user_count1 = user_count
                         random_users = random.randint(*self.random_wait_pages)
                     user_count += 1
-                    await self.get_one_user(user_config)
+                    tasks.append(asyncio.create_task(run(user_config)))
+                await asyncio.gather(*tasks)
         except Exception as e:
             logger.exception(e)
+        finally:
+            if self.proxy_pool is not None:
+                await self.proxy_pool.close()
+            if self.response_cache is not None:
+                self.response_cache.close()
+            if page_archive is not None:
+                page_archive.close()
+            if self.media_store is not None:
+                self.media_store.close()
+                self.media_store = None
+            if self.parse_executor is not None:
+                self.parse_executor.shutdown()
+                self.parse_executor = None
+
+    def _trace_configs(self) -> List[aiohttp.TraceConfig]:
+        """请求使用的TraceConfig，开启限速时由它记录每个请求的结果"""
+        trace_configs = []
+        if self.rate_limiter is not None:
+            trace_configs.append(self.rate_limiter.trace_config())
+        return trace_configs
+
+    def _open_archive(self) -> Optional[PageArchive]:
+        """按archive_config打开原始页面归档，未配置时返回None"""
+        if self.archive_config is None:
+            return None
+        archive_dir = self.archive_config.get('dir')
+        if not archive_dir:
+            archive_dir = self._output_dir() / '.archive'
+        return PageArchive(archive_dir, self.archive_config.get('codec'))
+
+    def _open_media_store(self) -> Optional[MediaStore]:
+        """按media_store_config打开图片和视频存储，未配置时返回None"""
+        if self.media_store_config is None:
+            return None
+        store_dir = self.media_store_config.get('dir')
+        if not store_dir:
+            store_dir = self._output_dir() / '.media'
+        return MediaStore(store_dir)
+
+    def _output_dir(self) -> Path:
+        """所有用户结果目录的上级目录"""
+        return (Path(FLAGS.output_dir) if FLAGS.output_dir is not None
+                else Path.cwd() / 'weibo')
+
+    async def reparse_one_user(self, archive: PageArchive,
+                               user_config: Dict[str, str]) -> None:
+        """重新解析一个用户归档的页面并写入"""
+        user_uri = user_config['user_uri']
+        ctx = UserCrawlContext(user_config)
+        selector = etree.HTML(
+            archive.read(f'https://weibo.cn/{user_uri}/profile') or b'<html/>')
+        ctx.user = await IndexParser(
+            '', user_uri, selector=selector).get_user_async(self.session)
+        if ctx.user is None:
+            logger.warning(f'归档中没有用户{user_uri}的信息，跳过该用户')
+            return
+        self.initialize_info(ctx)
+        ctx.downloaders = []
+        await self.write_user(ctx)
+        # 归档中的页面全部重新解析，不受since_date限制
+        page_config = dict(user_config, since_date=REPARSE_SINCE_DATE,
+                           end_date='now')
+        for url in archive.pages(user_uri):
+            selector = etree.HTML(archive.read(url))
+            parser = PageParser('', page_config, profile_page(url)[1],
+                                self.filter, selector=selector,
+                                detail_concurrency=self.detail_concurrency)
+            result = await parser.get_one_page_async(ctx.seen_ids,
+                                                     self.session)
+            if result is None:
+                continue
+            weibos, _, _ = result
+            if weibos:
+                await self.write_weibo(ctx, weibos)
+                ctx.got_num += len(weibos)
+        logger.info(f'{ctx.user.nickname}重新解析出{ctx.got_num}条微博')
+
+    async def reparse(self) -> None:
+        """不请求网络，重新解析归档中的页面并写入配置的文件或数据库"""
+        archive = self._open_archive()
+        if archive is None:
+            logger.error('没有配置archive_config，无法重新解析')
+            return
+        try:
+            self.session = ArchiveSession(archive)
+            archived = set(archive.users())
+            for user_config in self.user_config_list:
+                if user_config['user_uri'] not in archived:
+                    logger.warning(f"归档中没有用户{user_config['user_uri']}的页面")
+                    continue
+                await self.reparse_one_user(archive, user_config)
+        finally:
+            archive.close()
+
+    async def retry_one_manifest(self, manifest: DownloadManifest,
+                                 session: HttpClient) -> None:
+        """重新下载一个用户记录中失败的文件，每轮之间按指数退避等待"""
+        file_dir = manifest.base_dir
+        downloaders = {
+            'img': ImgDownloader(file_dir, self.file_download_timeout),
+            'video': VideoDownloader(file_dir, self.file_download_timeout,
+                                     self.video_segments)
+        }
+        for downloader in downloaders.values():
+            downloader.random_wait = self.rate_limiter is None
+            downloader.engine = self.download_engine
+            downloader.media_store = self.media_store
+            downloader.manifest = manifest
+        for attempt in range(RETRY_ROUNDS):
+            entries = {str(manifest.file_path(e)): e for e in manifest.failed()}
+            if not entries:
+                return
+            if attempt:
+                await asyncio.sleep(backoff_delay(
+                    attempt - 1, session.config['backoff_base'],
+                    session.config['backoff_max']))
+            logger.info(f'{file_dir.name}: 重新下载{len(entries)}个文件')
+
+            async def download(job):
+                entry = entries[str(job.file_path)]
+                downloader = downloaders[
+                    'video' if job.file_path.suffix == '.mp4' else 'img']
+                return await downloader.download_one_file(
+                    job.url, job.file_path, entry.get('weibo_id', ''),
+                    session)
+
+            await self.download_engine.run([
+                DownloadJob(e['url'], manifest.file_path(e))
+                for e in entries.values()
+            ], download)
+        failed = manifest.failed()
+        if failed:
+            logger.warning(f'{file_dir.name}: 仍有{len(failed)}个文件下载失败')
+
+    async def retry_downloads(self) -> None:
+        """核对各用户的下载记录，重新下载缺失、不完整和下载失败的图片和视频"""
+        paths = sorted(self._output_dir().glob('*/*.downloads'))
+        if not paths:
+            logger.info(f'{self._output_dir()}中没有下载记录')
+            return
+        self.media_store = self._open_media_store()
+        try:
+            async with HttpClient(self.http_config,
+                                  self._trace_configs()) as session:
+                for path in paths:
+                    manifest = DownloadManifest(path)
+                    try:
+                        # 核对需要读取全部文件，在线程池中进行
+                        await asyncio.get_running_loop().run_in_executor(
+                            None, manifest.verify, self.media_store)
+                        await self.retry_one_manifest(manifest, session)
+                    finally:
+                        manifest.close()
+        finally:
+            if self.media_store is not None:
+                self.media_store.close()
+                self.media_store = None
 
 
 def _get_config():
@@ -411,7 +802,40 @@ async def async_main(_):
         logger.exception(e)
 
 def main(_):
+    setup_console()
     asyncio.run(async_main(_))
 
+
+async def async_reparse(_):
+    try:
+        config = SpiderConfig(**_get_config())
+        await Spider(config).reparse()
+    except ValidationError as e:
+        logger.error(f"配置验证失败:\n{e}")
+        sys.exit(1)
+    except Exception as e:
+        logger.exception(e)
+
+
+def reparse(_):
+    setup_console()
+    asyncio.run(async_reparse(_))
+
+
+async def async_retry_downloads(_):
+    try:
+        config = SpiderConfig(**_get_config())
+        await Spider(config).retry_downloads()
+    except ValidationError as e:
+        logger.error(f"配置验证失败:\n{e}")
+        sys.exit(1)
+    except Exception as e:
+        logger.exception(e)
+
+
+def retry_downloads(_):
+    setup_console()
+    asyncio.run(async_retry_downloads(_))
+
 if __name__ == '__main__':
     app.run(main)
\ No newline at end of file
@@ -0,0 +1,66 @@
+import codecs
+import sys
+
+# 网页中常见的零宽字符，提取文本时删除；零宽连接符(U+200D)用于组合emoji，保留
+ZERO_WIDTH_CHARS = '\u200b\u200c\u2060\ufeff'
+# 用于判断编码能否表示中文
+CHINESE_SAMPLE = '微博'
+
+
+def output_encoding(stream=None):
+    """返回写入txt等文本文件使用的编码
+
+    沿用终端的编码，使Windows下生成的文件仍为gbk；终端编码无法表示中文时
+    (如在cron或守护进程中运行，编码为ascii)使用utf-8，避免中文被丢弃。
+    """
+    if stream is None:
+        stream = sys.stdout
+    encoding = getattr(stream, 'encoding', None) or 'utf-8'
+    try:
+        CHINESE_SAMPLE.encode(encoding)
+        return codecs.lookup(encoding).name
+    except (LookupError, UnicodeEncodeError):
+        return 'utf-8'
+
+
+class TranslateTable(dict):
+    """str.translate使用的映射表，删除零宽字符和encoding无法表示的字符
+
+    每个字符只在第一次出现时判断能否编码，结果保存在表中。
+    """
+    def __init__(self, encoding):
+        super().__init__(dict.fromkeys(map(ord, ZERO_WIDTH_CHARS)))
+        self.encoding = encoding
+
+    def __missing__(self, code):
+        try:
+            chr(code).encode(self.encoding)
+            value = code
+        except UnicodeEncodeError:
+            value = None
+        self[code] = value
+        return value
+
+
+def make_translate_table(encoding):
+    if codecs.lookup(encoding).name.startswith('utf-'):
+        # utf编码能表示所有字符，只需删除零宽字符
+        return dict.fromkeys(map(ord, ZERO_WIDTH_CHARS))
+    return TranslateTable(encoding)
+
+
+# 启动时确定一次，之后所有文本都按此编码处理
+OUTPUT_ENCODING = output_encoding()
+TRANSLATE_TABLE = make_translate_table(OUTPUT_ENCODING)
+
+
+def normalize(text):
+    """删除零宽字符和输出编码无法表示的字符"""
+    return text.translate(TRANSLATE_TABLE)
+
+
+def setup_console():
+    """终端编码无法表示的字符转义后输出，避免日志输出报错"""
+    for stream in (sys.stdout, sys.stderr):
+        if hasattr(stream, 'reconfigure'):
+            stream.reconfigure(errors='backslashreplace')
@@ -2,9 +2,7 @@ import codecs
 import json
 import logging
 import os
-import asyncio
-import aiohttp
-
+from ..http_client import HttpClient
 from .writer import Writer
 
 logger = logging.getLogger('spider.post_writer')
@@ -15,6 +13,7 @@ class PostWriter(Writer):
         self.api_url = post_config['api_url']
         self.api_token = post_config.get('api_token', None)
         self.dba_password = post_config.get('dba_password', None)
+        self.session = None  # 第一次发送时创建，整个写入过程共用
 
     async def write_user(self, user):
         self.user = user
@@ -33,25 +32,22 @@ class PostWriter(Writer):
             'Content-Type': 'application/json',
             'api-token': f'{token}',
         }
-        async with aiohttp.ClientSession() as session:
-            for attempt in range(max_retries + 1):
-                try:
-                    async with session.post(url, json=data, headers=headers) as response:
-                        if response.status == 200:
-                            return await response.json()
-                        else:
-                            # Continue to next attempt on non-200 status
-                            if attempt < max_retries:
-                                await asyncio.sleep(backoff_factor * (attempt + 1))
-                                continue
-                            logger.error(f"Unexpected response status: {response.status}")
-                            return None
-                except Exception as e:
-                    if attempt < max_retries:
-                        await asyncio.sleep(backoff_factor * (attempt + 1))  # 逐步增加等待时间，避免频繁重试
-                        continue
-                    else:
-                        logger.error(f"在尝试{max_retries}次发出POST连接后，请求失败：{e}")
+        if self.session is None:
+            self.session = HttpClient(
+                {'retries': max_retries, 'backoff_base': backoff_factor})
+        try:
+            async with self.session.post(url, json=data, headers=headers) as response:
+                if response.status == 200:
+                    return await response.json()
+                logger.error(f"Unexpected response status: {response.status}")
+                return None
+        except Exception as e:
+            logger.error(f"在尝试{max_retries}次发出POST连接后，请求失败：{e}")
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
 
     async def write_weibo(self, weibos):
         """将爬到的信息POST到API"""
@@ -1,7 +1,7 @@
 import logging
-import sys
 import aiofiles
 
+from ..text_util import OUTPUT_ENCODING
 from .writer import Writer
 
 logger = logging.getLogger('spider.txt_writer')
@@ -31,7 +31,7 @@ class TxtWriter(Writer):
 
         async with aiofiles.open(self.file_path, 'ab') as f:
             await f.write((self.user_header + '：\n' + user_info + '\n\n').encode(
-                sys.stdout.encoding))
+                OUTPUT_ENCODING))
         logger.info(f'{self.user.nickname}信息写入txt文件完毕，保存路径：{self.file_path}')
 
     async def write_weibo(self, weibo):
@@ -51,7 +51,7 @@ class TxtWriter(Writer):
             result = '\n\n'.join(temp_result) + '\n\n'
 
             async with aiofiles.open(self.file_path, 'ab') as f:
-                await f.write((weibo_header + result).encode(sys.stdout.encoding))
+                await f.write((weibo_header + result).encode(OUTPUT_ENCODING))
             logger.info(f'{len(weibo)}条微博写入txt文件完毕，保存路径：{self.file_path}')
         except Exception as e:
             logger.exception(e)
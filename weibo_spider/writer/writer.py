@@ -15,3 +15,7 @@ class Writer(ABC):
     async def write_user(self, user):
         """给定用户信息，写入对应文本或数据库"""
         pass
+
+    async def close(self):
+        """释放连接等资源"""
+        pass